@@ -1,7 +1,11 @@
 import os
 
-from django.core.asgi import get_asgi_application
+import django
+
+from core.handlers import ASGIHandler
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "app.settings")
+os.environ.setdefault("ASYNC_READ_VIEWS", "1")
 
-application = get_asgi_application()
+django.setup(set_prefix=False)
+application = ASGIHandler()
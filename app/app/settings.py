@@ -38,6 +38,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     "core",
     "rest_framework",
     "drf_spectacular",
@@ -52,6 +53,8 @@ AUTH_USER_MODEL = "core.User"
 
 
 MIDDLEWARE = [
+    # First, so its latency covers the other middleware too.
+    "core.metrics.MetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -61,7 +64,10 @@ MIDDLEWARE = [
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
 
-ROOT_URLCONF = "app.urls"
+# The ASGI entrypoint serves the recipe read paths from async views.
+ROOT_URLCONF = (
+    "app.urls_async" if os.environ.get("ASYNC_READ_VIEWS") == "1" else "app.urls"
+)
 
 TEMPLATES = [
     {
@@ -96,6 +102,24 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/3.2/topics/cache/
+
+# Data versions and cached users must be seen by every worker, so deployments
+# running several processes need a shared backend (check --deploy enforces it).
+CACHES = {
+    "default": {
+        "BACKEND": os.environ.get(
+            "CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"
+        ),
+        "LOCATION": os.environ.get("CACHE_LOCATION", "recipe-api"),
+    }
+}
+
+# Seconds a cached recipe list/detail response is kept
+RESPONSE_CACHE_TIMEOUT = 300
+
+
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
 
@@ -115,6 +139,27 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+# The preferred hasher ("pbkdf2", "argon2" or "bcrypt") hashes new passwords;
+# the others still verify existing hashes, which are upgraded on next login.
+# argon2 needs argon2-cffi and bcrypt needs bcrypt installed.
+_PASSWORD_HASHERS = {
+    "pbkdf2": "core.hashers.TunedPBKDF2PasswordHasher",
+    "argon2": "core.hashers.TunedArgon2PasswordHasher",
+    "bcrypt": "core.hashers.TunedBCryptSHA256PasswordHasher",
+}
+PASSWORD_HASHERS = list(
+    dict.fromkeys(
+        [
+            _PASSWORD_HASHERS[os.environ.get("PASSWORD_HASHER", "pbkdf2")],
+            *_PASSWORD_HASHERS.values(),
+            "django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher",
+        ]
+    )
+)
+PASSWORD_PBKDF2_ITERATIONS = int(os.environ.get("PASSWORD_PBKDF2_ITERATIONS", 260000))
+PASSWORD_ARGON2 = {"time_cost": 2, "memory_cost": 102400, "parallelism": 8}
+PASSWORD_BCRYPT_ROUNDS = 12
+
 # Internationalization
 # https://docs.djangoproject.com/en/3.2/topics/i18n/
 
@@ -153,9 +198,11 @@ SIMPLE_JWT = {
 
 REST_FRAMEWORK = {
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
-    "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
-    ),
+    "DEFAULT_RENDERER_CLASSES": [
+        "core.renderers.FastJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ],
+    "DEFAULT_AUTHENTICATION_CLASSES": ("core.authentication.CachedJWTAuthentication",),
     "DEFAULT_PERMISSION_CLASSES": [
         "rest_framework.permissions.IsAuthenticated",
     ],
@@ -184,3 +231,54 @@ SPECTACULAR_SETTINGS = {
     "LICENCE": {"name": "BSD License"},
     "CONTACT": {"name": "Sanusi Abubakr ", "email": "sanusiabubakr343@gmail.com"},
 }
+
+# Maximum number of items accepted by the recipe batch endpoint
+RECIPE_BATCH_MAX_SIZE = 1000
+
+# Recipes read, serialized and streamed per chunk by the export endpoint
+RECIPE_EXPORT_CHUNK_SIZE = 2000
+
+# Upper bounds of the ?facets= histogram buckets of the recipe list; the
+# last bucket holds everything from the final bound up.
+RECIPE_FACET_BUCKETS = {
+    "time_minutes": [15, 30, 60, 120],
+    "price": [5, 10, 20, 50],
+}
+
+# Typeahead suggestions: result cap and in-process cache of hot prefixes
+SUGGEST_MAX_RESULTS = 20
+SUGGEST_CACHE_SIZE = 1024
+SUGGEST_CACHE_TTL = 30
+
+# Uploaded recipe images are processed in the background: "thread" runs a
+# local worker pool, "sync" processes them right after the request commits.
+IMAGE_PROCESSING_MODE = os.environ.get("IMAGE_PROCESSING_MODE", "thread")
+IMAGE_PROCESSING_WORKERS = int(os.environ.get("IMAGE_PROCESSING_WORKERS", 2))
+# Store each distinct image once under its SHA-256, shared by every recipe
+# using it; otherwise every upload gets a fresh uuid4 name.
+RECIPE_IMAGE_CONTENT_ADDRESSED = (
+    os.environ.get("RECIPE_IMAGE_CONTENT_ADDRESSED", "1") == "1"
+)
+# Longest side, in pixels, of the stored original and of each variant
+RECIPE_IMAGE_MAX_DIMENSION = 2048
+RECIPE_IMAGE_VARIANTS = {"large": 1200, "medium": 600, "thumbnail": 200}
+# Uploads are rejected past this many bytes, or if their header declares more
+# than this many pixels.
+RECIPE_IMAGE_MAX_UPLOAD_SIZE = 20 * 1024 * 1024
+RECIPE_IMAGE_MAX_PIXELS = 50_000_000
+
+# Authenticated users are cached for this many seconds; with trusted claims
+# they are rebuilt from the access token without touching the database.
+AUTH_USER_CACHE_TTL = 60
+AUTH_TRUST_TOKEN_CLAIMS = os.environ.get("AUTH_TRUST_TOKEN_CLAIMS", "0") == "1"
+
+# Failed logins are throttled with token buckets per client IP and per email:
+# each holds `capacity` attempts and refills at `rate` attempts per second.
+LOGIN_THROTTLE_BUCKETS = {
+    "ip": {"capacity": 30, "rate": 0.5},
+    "email": {"capacity": 10, "rate": 0.05},
+}
+
+# Requests running more database queries than this are logged by
+# core.metrics.MetricsMiddleware; 0 disables the log.
+REQUEST_QUERY_BUDGET = int(os.environ.get("REQUEST_QUERY_BUDGET", 30))
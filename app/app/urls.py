@@ -7,6 +7,8 @@ from drf_spectacular.views import (
     SpectacularSwaggerView,
 )
 
+from core.views import metrics_view
+
 
 urlpatterns = [
     path("admin/", admin.site.urls),
@@ -18,6 +20,7 @@ urlpatterns = [
     ),
     path("api/v1/users/", include("user.urls")),
     path("api/v1/recipes/", include("recipe.urls")),
+    path("api/v1/metrics/", metrics_view, name="metrics"),
 ]
 
 if settings.DEBUG:
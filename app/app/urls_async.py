@@ -0,0 +1,18 @@
+"""
+URL configuration of the ASGI deployment
+
+Routes the read paths of the recipe API to recipe.async_views, ahead of the
+regular routes in app.urls.
+"""
+
+from django.urls import path
+
+from app.urls import urlpatterns as sync_urlpatterns
+from recipe import async_views
+
+urlpatterns = [
+    path("api/v1/recipes/", async_views.recipe_list),
+    path("api/v1/recipes/tags/", async_views.tag_list),
+    path("api/v1/recipes/<int:pk>/", async_views.recipe_detail),
+    *sync_urlpatterns,
+]
@@ -5,3 +5,16 @@ class CoreConfig(AppConfig):
 
     default_auto_field = "django.db.models.BigAutoField"
     name = "core"
+
+    def ready(self):
+        from core import (  # noqa: F401 registers receivers
+            authentication,
+            cache,
+            checks,
+            counters,
+            images,
+            metrics,
+            search,
+        )
+
+        metrics.instrument_serializers()
@@ -0,0 +1,98 @@
+"""
+JWT authentication that avoids loading the user row on every request
+
+Users are kept in the cache for AUTH_USER_CACHE_TTL seconds and evicted
+whenever they are saved or deleted, so changes to is_active, is_staff or the
+password take effect on the next request. Writes that bypass save(), such as
+queryset.update(), are only picked up once the entry expires.
+
+With AUTH_TRUST_TOKEN_CLAIMS the user is instead rebuilt from the claims
+minted at login and the database is never consulted. Such users are only
+as fresh as their token and must not be saved.
+"""
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+USER_KEY = "auth-user:{}"
+# Copied from the user into every token by tokens_for_user().
+USER_CLAIMS = ["email", "name", "is_staff", "is_superuser"]
+
+
+def tokens_for_user(user):
+    """Return a refresh/access token pair carrying the user's claims"""
+    refresh = RefreshToken.for_user(user)
+    for claim in USER_CLAIMS:
+        refresh[claim] = getattr(user, claim)
+
+    return {
+        "refresh": str(refresh),
+        "access": str(refresh.access_token),
+    }
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication resolving users from the cache or token claims"""
+
+    def get_user(self, validated_token):
+        user = self.get_cached_user(validated_token)
+        if user is None:
+            user = super().get_user(validated_token)
+            key = USER_KEY.format(validated_token[api_settings.USER_ID_CLAIM])
+            cache.set(key, user, settings.AUTH_USER_CACHE_TTL)
+        elif not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        return user
+
+    def get_cached_user(self, validated_token):
+        """Return the user of a token if it is known without a query, or None"""
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        if settings.AUTH_TRUST_TOKEN_CLAIMS and all(
+            claim in validated_token for claim in USER_CLAIMS
+        ):
+            return self.user_from_claims(user_id, validated_token)
+        return cache.get(USER_KEY.format(user_id))
+
+    def authenticate_without_database(self, request):
+        """Return the active user of a request if it is known without a query
+
+        Returns None whenever authentication would need the database or
+        fail, leaving those requests to the regular authenticate().
+        """
+        header = self.get_header(request)
+        try:
+            raw_token = header and self.get_raw_token(header)
+            if raw_token is None:
+                return None
+            user = self.get_cached_user(self.get_validated_token(raw_token))
+        except AuthenticationFailed:
+            # Includes InvalidToken, and malformed headers such as "Bearer a b".
+            return None
+        return user if user is not None and user.is_active else None
+
+    def user_from_claims(self, user_id, validated_token):
+        user = self.user_model(
+            **{api_settings.USER_ID_FIELD: user_id},
+            **{claim: validated_token[claim] for claim in USER_CLAIMS},
+        )
+        # Lets the instance stand in for the stored row in queries.
+        user._state.adding = False
+        return user
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def user_changed(sender, instance, **kwargs):
+    cache.delete(USER_KEY.format(getattr(instance, api_settings.USER_ID_FIELD)))
@@ -0,0 +1,144 @@
+"""
+Per-user data versions and the response cache built on them
+
+Every write to a user's recipes or tags bumps that user's version, which is
+part of every cached response key, so stale entries are never read again
+and simply expire. Versions are nanosecond timestamps of the last write and
+double as the validators of conditional requests. Versions live in the
+default cache, which every worker process must share (see core.checks).
+"""
+
+import hashlib
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete,
+)
+from django.dispatch import receiver
+from django.utils import timezone
+
+from core.models import Recipe, Tag
+from core.signals import post_bulk_create, recipes_changed
+
+VERSION_KEY = "data-version:{}"
+
+_stats = Counter()
+_stats_lock = threading.Lock()
+
+
+def get_version(user_id):
+    """Return the current data version of a user, creating one if needed"""
+    key = VERSION_KEY.format(user_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+
+def _new_version(user_id):
+    key = VERSION_KEY.format(user_id)
+    previous = cache.get(key) or 0
+    cache.set(key, max(time.time_ns(), previous + 1), None)
+
+
+def bump_version(user_id):
+    """Invalidate everything cached for a user"""
+    _new_version(user_id)
+    if connection.in_atomic_block:
+        # Readers may re-cache pre-commit data under the new version until the
+        # transaction commits, so bump once more afterwards.
+        transaction.on_commit(lambda: _new_version(user_id))
+
+
+def touch_recipes(**filters):
+    """Mark recipes as modified when a change bypassed their save()"""
+    Recipe.objects.filter(**filters).update(updated_at=timezone.now())
+
+
+def response_key(request, scope):
+    """Return the cache key of a response for request within scope"""
+    url = hashlib.md5(request.build_absolute_uri().encode()).hexdigest()
+    return f"response:{request.user.id}:{get_version(request.user.id)}:{scope}:{url}"
+
+
+def get_response(key, count_miss=True):
+    data = cache.get(key)
+    if data is not None or count_miss:
+        record("hits" if data is not None else "misses")
+    return data
+
+
+def set_response(key, data):
+    cache.set(key, data, settings.RESPONSE_CACHE_TIMEOUT)
+
+
+def record(name):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def stats():
+    """Return the response cache hit and miss counters of this process"""
+    with _stats_lock:
+        return {"hits": _stats["hits"], "misses": _stats["misses"]}
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def user_created(sender, instance, created, **kwargs):
+    # Primary keys can be reused, so a new user must not inherit a version.
+    if created:
+        bump_version(instance.pk)
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=Tag)
+def user_data_changed(sender, instance, **kwargs):
+    bump_version(instance.user_id)
+
+
+@receiver(post_save, sender=Tag)
+def tag_renamed(sender, instance, created, **kwargs):
+    if not created:
+        touch_recipes(tags=instance)
+
+
+@receiver(pre_delete, sender=Tag)
+def tag_deleted(sender, instance, **kwargs):
+    touch_recipes(tags=instance)
+
+
+@receiver(post_bulk_create, sender=Recipe)
+@receiver(post_bulk_create, sender=Tag)
+def user_data_bulk_created(sender, instances, **kwargs):
+    for user_id in {instance.user_id for instance in instances}:
+        bump_version(user_id)
+
+
+@receiver(recipes_changed, sender=Recipe)
+def recipes_changed_in_bulk(sender, recipes, **kwargs):
+    for user_id in {recipe.user_id for recipe in recipes}:
+        bump_version(user_id)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_tags_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == "pre_clear" and reverse:
+        # The affected recipes are unknown once the links are gone.
+        touch_recipes(tags=instance)
+    if action in ("post_add", "post_remove", "post_clear"):
+        bump_version(instance.user_id)
+        if not reverse:
+            touch_recipes(pk=instance.pk)
+        elif pk_set:
+            touch_recipes(pk__in=pk_set)
@@ -0,0 +1,34 @@
+"""
+System checks of the core app
+"""
+
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+
+# Backends that keep entries inside one process, or not at all.
+PROCESS_LOCAL_CACHES = {
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+}
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    """Require a cache every worker process shares
+
+    Per-user data versions and cached users live in the default cache. With
+    a process-local cache a write handled by one worker never invalidates
+    the responses, ETags and users the other workers keep serving.
+    """
+    backend = settings.CACHES["default"]["BACKEND"]
+    if backend not in PROCESS_LOCAL_CACHES:
+        return []
+    return [
+        Error(
+            f"The default cache backend {backend} is not shared between "
+            "processes, so cached responses go stale across workers.",
+            hint="Set CACHE_BACKEND and CACHE_LOCATION to a shared cache, "
+            "such as memcached.",
+            id="core.E001",
+        )
+    ]
@@ -0,0 +1,94 @@
+"""
+Per-user recipe and tag counters backing pagination totals
+"""
+
+from collections import Counter
+
+from django.conf import settings
+from django.db.models import Count, F
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from core.models import Recipe, Tag, UserCounter
+from core.signals import post_bulk_create
+
+COUNTED_FIELDS = {Recipe: "recipes", Tag: "tags"}
+
+
+def count(user_ids=None, models=tuple(COUNTED_FIELDS)):
+    """Return {user_id: {field: total}} computed from the source tables"""
+    fields = [COUNTED_FIELDS[model] for model in models]
+    totals = {}
+    for model, field in zip(models, fields):
+        rows = model.objects.all()
+        if user_ids is not None:
+            rows = rows.filter(user_id__in=user_ids)
+        rows = rows.order_by().values("user_id").annotate(total=Count("id"))
+        for user_id, total in rows.values_list("user_id", "total"):
+            totals.setdefault(user_id, dict.fromkeys(fields, 0))[field] = total
+    return totals
+
+
+def recount(user_ids, models=tuple(COUNTED_FIELDS)):
+    """Reset the counters of the given users from the source tables"""
+    totals = count(user_ids, models)
+    zeros = {COUNTED_FIELDS[model]: 0 for model in models}
+    missing = [
+        user_id
+        for user_id in user_ids
+        if not UserCounter.objects.filter(user_id=user_id).update(
+            **totals.get(user_id, zeros)
+        )
+    ]
+    if missing:
+        totals = count(missing)
+        for user_id in missing:
+            UserCounter.objects.get_or_create(
+                user_id=user_id, defaults=totals.get(user_id, {})
+            )
+
+
+def adjust(model, deltas, heal=True):
+    """Apply {user_id: delta} to the counter of model, recounting missing rows"""
+    field = COUNTED_FIELDS[model]
+    missing = [
+        user_id
+        for user_id, delta in deltas.items()
+        if delta
+        and not UserCounter.objects.filter(user_id=user_id).update(
+            **{field: F(field) + delta}
+        )
+    ]
+    if missing and heal:
+        recount(missing)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def create_user_counter(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        UserCounter.objects.get_or_create(user=instance)
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=Tag)
+def count_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        adjust(sender, {instance.user_id: 1})
+
+
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=Tag)
+def count_deleted(sender, instance, **kwargs):
+    # Never recreate rows here: the user may be going away in the same cascade.
+    adjust(sender, {instance.user_id: -1}, heal=False)
+
+
+@receiver(post_bulk_create, sender=Recipe)
+@receiver(post_bulk_create, sender=Tag)
+def count_bulk_created(sender, instances, ignore_conflicts=False, **kwargs):
+    deltas = Counter(instance.user_id for instance in instances)
+    if ignore_conflicts:
+        # Conflicting rows were skipped silently, so the deltas are unknown.
+        recount(list(deltas), models=[sender])
+    else:
+        adjust(sender, deltas)
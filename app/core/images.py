@@ -0,0 +1,235 @@
+"""
+Background processing of uploaded recipe images
+
+Uploads are stored as received and marked pending. A local worker pool then
+strips their metadata, bounds the size of the original and renders the
+variants listed in settings.RECIPE_IMAGE_VARIANTS. The image_status column
+doubles as the job queue: anything left pending by a restart is picked up by
+the process_images command.
+
+Derived files are named after their source, `<source>_<label>.<ext>`, so with
+content-addressed uploads identical images share all their files. Files are
+only deleted once no recipe references them any more.
+"""
+
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connections, transaction
+from django.db.models import Q
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+from PIL import Image, ImageOps, features
+
+from core.models import Recipe
+
+logger = logging.getLogger(__name__)
+
+# Pillow save() arguments per output format, by file extension.
+FORMATS = {
+    "jpg": ("JPEG", {"quality": 85, "optimize": True, "progressive": True}),
+    "webp": ("WEBP", {"quality": 80, "method": 4}),
+}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def output_formats():
+    """Return the extensions of the variant formats this Pillow can write"""
+    return [ext for ext in FORMATS if ext != "webp" or features.check("webp")]
+
+
+def schedule(recipe, stale=()):
+    """Process the image of recipe once the current transaction commits
+
+    The stale files it replaced are released at the same time.
+    """
+    storage = recipe.image.storage
+    transaction.on_commit(lambda: release(storage, stale))
+    transaction.on_commit(lambda: submit(recipe.pk))
+
+
+def submit(recipe_id):
+    if settings.IMAGE_PROCESSING_MODE == "sync":
+        process(recipe_id)
+    else:
+        get_executor().submit(_process_in_worker, recipe_id)
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.IMAGE_PROCESSING_WORKERS,
+                thread_name_prefix="recipe-images",
+            )
+        return _executor
+
+
+def _process_in_worker(recipe_id):
+    try:
+        process(recipe_id)
+    except Exception:
+        logger.exception("Processing the image of recipe %s failed", recipe_id)
+    finally:
+        connections.close_all()
+
+
+def process(recipe_id):
+    """Sanitize the image of a recipe and render its variants"""
+    recipe = Recipe.objects.filter(pk=recipe_id).only("id", "image").first()
+    if recipe is None or not recipe.image:
+        return
+    storage, name = recipe.image.storage, recipe.image.name
+
+    # Another recipe may already have processed the same content.
+    done = (
+        Recipe.objects.filter(
+            image__startswith=f"{source_of(name)}_original.",
+            image_status=Recipe.ImageStatus.READY,
+        )
+        .values_list("image", "image_variants")
+        .first()
+    )
+    status = Recipe.ImageStatus.READY
+    if done:
+        original, variants = done
+    else:
+        try:
+            original, variants = render(recipe.image)
+        except Exception:
+            # Whatever the cause, a pending image would otherwise stay pending.
+            logger.exception("Cannot process image %s", name)
+            original, variants = name, {}
+            status = Recipe.ImageStatus.FAILED
+
+    with transaction.atomic():
+        current = Recipe.objects.select_for_update().filter(pk=recipe_id).first()
+        if current is not None and current.image.name == name:
+            current.image.name = original
+            current.image_status = status
+            current.image_variants = variants
+            current.save(
+                update_fields=["image", "image_status", "image_variants", "updated_at"]
+            )
+    # Drops the raw upload, or everything if the recipe was deleted or its
+    # image replaced while we were working.
+    release(storage, [name, original, *variant_names(variants)])
+
+
+def render(field):
+    """Store a sanitized original and its variants next to the upload
+
+    Returns the name of the new original and a mapping of variant label to
+    {extension: name}.
+    """
+    bound = settings.RECIPE_IMAGE_MAX_DIMENSION
+    with field.open("rb") as upload:
+        image = Image.open(upload)
+        source_format = image.format
+        # JPEGs can be decoded at a reduced scale, so big photos never need
+        # their full resolution in memory.
+        image.draft("RGB", (bound, bound))
+        # Applying the orientation first lets every copy drop the EXIF block.
+        image = ImageOps.exif_transpose(image)
+    if image.mode not in ("RGB", "RGBA"):
+        alpha = "A" in image.getbands() or "transparency" in image.info
+        image = image.convert("RGBA" if alpha else "RGB")
+
+    storage = field.storage
+    base = os.path.splitext(field.name)[0]
+    original = _resized(image, bound)
+    original_ext = "jpg" if source_format == "JPEG" else source_format.lower()
+    original_name = _store(
+        storage,
+        f"{base}_original.{original_ext}",
+        lambda: _encode(original, original_ext, source_format),
+    )
+
+    variants = {}
+    for label, size in settings.RECIPE_IMAGE_VARIANTS.items():
+        variant = _resized(image, size)
+        variants[label] = {
+            fmt: _store(storage, f"{base}_{label}.{fmt}", lambda: _encode(variant, fmt))
+            for fmt in output_formats()
+        }
+    return original_name, variants
+
+
+def _store(storage, name, encode):
+    # Derived names are deterministic, so an existing file has this content.
+    if storage.exists(name):
+        return name
+    return storage.save(name, ContentFile(encode()))
+
+
+def _resized(image, size):
+    copy = image.copy()
+    copy.thumbnail((size, size), Image.LANCZOS)
+    return copy
+
+
+def _encode(image, ext, source_format=None):
+    image_format, options = FORMATS.get(ext, (source_format, {}))
+    if image_format == "JPEG" and image.mode != "RGB":
+        image = image.convert("RGB")
+    buffer = BytesIO()
+    # No exif= argument: the output carries no metadata from the upload.
+    image.save(buffer, format=image_format, **options)
+    return buffer.getvalue()
+
+
+def variant_names(variants):
+    return [name for formats in variants.values() for name in formats.values()]
+
+
+def source_of(name):
+    """Return the name, without extension, of the upload a file derives from"""
+    head, tail = os.path.split(os.path.splitext(name)[0])
+    return os.path.join(head, tail.split("_", 1)[0])
+
+
+def is_referenced(name):
+    """Return whether any recipe still uses the stored file"""
+    references = Q(image=name)
+    source = source_of(name)
+    if source != os.path.splitext(name)[0]:
+        # A derived file lives as long as a recipe uses its processed original.
+        references |= Q(image__startswith=f"{source}_original.")
+    return Recipe.objects.filter(references).exists()
+
+
+def release(storage, names):
+    """Delete the given files that no recipe references"""
+    for name in dict.fromkeys(names):
+        if name and not is_referenced(name):
+            storage.delete(name)
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(sender, instance, **kwargs):
+    if instance.image:
+        names = [instance.image.name, *variant_names(instance.image_variants)]
+        storage = instance.image.storage
+        transaction.on_commit(lambda: release(storage, names))
+
+
+def variant_urls(recipe, request=None):
+    """Return {label: {extension: url}} for the processed variants of recipe"""
+    if recipe.image_status != Recipe.ImageStatus.READY:
+        return {}
+    storage = recipe.image.storage
+    urls = {}
+    for label, formats in recipe.image_variants.items():
+        urls[label] = {}
+        for fmt, name in formats.items():
+            url = storage.url(name)
+            urls[label][fmt] = request.build_absolute_uri(url) if request else url
+    return urls
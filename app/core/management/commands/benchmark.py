@@ -0,0 +1,75 @@
+"""
+Django command to benchmark the recipe API
+"""
+
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+
+def recipe_payload(index, tags):
+    """Return a recipe payload carrying the given number of tags"""
+    return {
+        "title": f"Benchmark recipe {index}",
+        "time_minutes": 10 + index % 50,
+        "price": "4.50",
+        "tags": [{"name": f"tag {index % (tags * 2) + n}"} for n in range(tags)],
+    }
+
+
+class Command(BaseCommand):
+    """Django command to benchmark the recipe API"""
+
+    help = (
+        "Compare creating recipes with single POSTs against the batch endpoint. "
+        "Everything runs in a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--recipes", type=int, default=200)
+        parser.add_argument("--tags", type=int, default=5)
+
+    def handle(self, *args, **options):
+        """Entrypoint for command"""
+        payloads = [
+            recipe_payload(index, options["tags"])
+            for index in range(options["recipes"])
+        ]
+        results = {}
+        with transaction.atomic():
+            client = APIClient()
+            client.force_authenticate(
+                get_user_model().objects.create_user(
+                    "benchmark@example.com", "benchmark123"
+                )
+            )
+            results["single-create"] = self.single_create(client, payloads)
+            results["batch-create"] = self.batch_create(client, payloads)
+            transaction.set_rollback(True)
+
+        for name, seconds in results.items():
+            self.stdout.write(
+                f"{name}: {len(payloads)} recipes in {seconds:.3f}s "
+                f"({len(payloads) / seconds:.0f} recipes/s)"
+            )
+        speedup = results["single-create"] / results["batch-create"]
+        self.stdout.write(self.style.SUCCESS(f"batch speedup: {speedup:.1f}x"))
+
+    def single_create(self, client, payloads):
+        """Create every recipe with its own request"""
+        url = reverse("recipe:recipes-list")
+        start = time.perf_counter()
+        for payload in payloads:
+            client.post(url, payload, format="json")
+        return time.perf_counter() - start
+
+    def batch_create(self, client, payloads):
+        """Create every recipe with one batch request"""
+        url = reverse("recipe:recipes-batch")
+        start = time.perf_counter()
+        client.post(url, payloads, format="json")
+        return time.perf_counter() - start
@@ -0,0 +1,267 @@
+"""
+Django command to benchmark the main endpoints of the API
+"""
+
+import json
+import platform
+import random
+import statistics
+import subprocess
+import time
+
+import django
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.http import HttpResponse
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.settings import api_settings
+from rest_framework.test import APIClient
+
+from core import images
+from core.authentication import USER_KEY, tokens_for_user
+from core.management.commands.benchmark import recipe_payload
+from core.management.commands.benchmark_upload import photo
+from core.management.commands.loadtest import percentile
+from core.models import Recipe, Tag
+from core.signals import recipes_changed
+from recipe.serializers import RecipeSerializer
+
+PASSWORD = "benchmark123"
+WORDS = ["soup", "stew", "salad", "curry", "pie", "bread", "cake", "pasta"]
+
+
+class Command(BaseCommand):
+    """Django command to benchmark the API endpoints"""
+
+    help = (
+        "Seed users x recipes x tags, then report throughput and p50/p95/p99 "
+        "latency per endpoint as JSON. Runs in-process in a transaction that is "
+        "rolled back, so reports from different commits on the same machine and "
+        "database are comparable."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=5)
+        parser.add_argument("--recipes", type=int, default=200, help="Per user.")
+        parser.add_argument("--tags", type=int, default=10, help="Per user.")
+        parser.add_argument("--requests", type=int, default=100, help="Per endpoint.")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--output", help="Write the JSON report to this file.")
+        parser.add_argument("--compare", help="JSON report to compare against.")
+
+    def handle(self, *args, **options):
+        """Entrypoint for command"""
+        self.random = random.Random(options["seed"])
+        self.uploads = set()
+        with transaction.atomic():
+            users = self.seed(options["users"], options["recipes"], options["tags"])
+            results = {
+                name: self.measure(scenario, users, options["requests"])
+                for name, scenario in self.scenarios().items()
+            }
+            transaction.set_rollback(True)
+        self.clean_up(users)
+
+        report = {
+            "created": timezone.now().isoformat(),
+            "commit": self.commit(),
+            "database": connection.vendor,
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "parameters": {
+                name: options[name]
+                for name in ("users", "recipes", "tags", "requests", "seed")
+            },
+            "results": results,
+        }
+        for name, result in results.items():
+            self.stdout.write(
+                f"{name}: {result['throughput']:.0f} req/s, "
+                f"p50 {result['p50_ms']:.1f}ms p95 {result['p95_ms']:.1f}ms "
+                f"p99 {result['p99_ms']:.1f}ms, "
+                f"{result['queries']:.1f} queries/request"
+            )
+        if options["compare"]:
+            self.compare(options["compare"], results)
+        if options["output"]:
+            with open(options["output"], "w") as output:
+                json.dump(report, output, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Wrote {options['output']}"))
+        else:
+            self.stdout.write(json.dumps(report, indent=2))
+
+    def seed(self, users, recipes, tags):
+        """Create the users with their tags and tagged recipes"""
+        password = make_password(PASSWORD)
+        accounts = [
+            get_user_model().objects.create(
+                email=f"benchmark{n}@example.com", name=f"Bench {n}", password=password
+            )
+            for n in range(users)
+        ]
+        for user in accounts:
+            user.tag_names = [f"{self.random.choice(WORDS)} {n}" for n in range(tags)]
+            Tag.objects.bulk_create(
+                [Tag(user=user, name=name) for name in dict.fromkeys(user.tag_names)]
+            )
+            Recipe.objects.bulk_create(
+                [
+                    Recipe(
+                        user=user,
+                        title=f"{self.random.choice(WORDS).title()} {n}",
+                        time_minutes=self.random.randint(5, 120),
+                        price=f"{self.random.uniform(1, 50):.2f}",
+                    )
+                    for n in range(recipes)
+                ]
+            )
+
+            # Not every backend returns ids from bulk_create.
+            tag_ids = list(Tag.objects.filter(user=user).values_list("id", flat=True))
+            user.recipe_ids = list(
+                Recipe.objects.filter(user=user).values_list("id", flat=True)
+            )
+            through = Recipe.tags.through
+            through.objects.bulk_create(
+                [
+                    through(recipe_id=recipe_id, tag_id=tag_id)
+                    for recipe_id in user.recipe_ids
+                    for tag_id in self.random.sample(tag_ids, min(3, len(tag_ids)))
+                ]
+            )
+            recipes_changed.send(
+                sender=Recipe,
+                recipes=list(Recipe.objects.filter(user=user).only("id", "user")),
+                fields={"tags"},
+            )
+
+            user.client = APIClient()
+            user.client.credentials(
+                HTTP_AUTHORIZATION="Bearer " + tokens_for_user(user)["access"]
+            )
+        return accounts
+
+    def scenarios(self):
+        """Return {name: function(user) -> response} for every endpoint"""
+        recipes_url = reverse("recipe:recipes-list")
+        image = photo(0.1)
+
+        def recipe_url(user):
+            return reverse(
+                "recipe:recipes-detail",
+                kwargs={"pk": self.random.choice(user.recipe_ids)},
+            )
+
+        def upload(user):
+            pk = self.random.choice(user.recipe_ids)
+            response = user.client.post(
+                reverse("recipe:recipes-upload_image", kwargs={"pk": pk}),
+                {"image": SimpleUploadedFile("photo.jpg", image)},
+                format="multipart",
+            )
+            self.uploads.add(Recipe.objects.get(pk=pk).image.name)
+            return response
+
+        def serialize(user, rows):
+            # A list page rendered from values() rows, as the list view does,
+            # or from model instances.
+            recipes = Recipe.objects.filter(user=user).order_by("-id")
+            if rows:
+                recipes = recipes.values(*row_fields)
+            else:
+                recipes = recipes.prefetch_related("tags")
+            data = RecipeSerializer(recipes[: api_settings.PAGE_SIZE], many=True).data
+            return HttpResponse(
+                JSONRenderer().render(data), content_type="application/json"
+            )
+
+        row_fields = [
+            field for field in RecipeSerializer.Meta.fields if field != "tags"
+        ]
+        return {
+            "recipe-list": lambda user: user.client.get(recipes_url),
+            "recipe-search": lambda user: user.client.get(
+                recipes_url, {"q": self.random.choice(WORDS)}
+            ),
+            "recipe-detail": lambda user: user.client.get(recipe_url(user)),
+            "recipe-create": lambda user: user.client.post(
+                recipes_url,
+                recipe_payload(self.random.randrange(10_000), 3),
+                format="json",
+            ),
+            "tag-list": lambda user: user.client.get(reverse("recipe:tags-list")),
+            "image-upload": upload,
+            "serialize-rows": lambda user: serialize(user, rows=True),
+            "serialize-instances": lambda user: serialize(user, rows=False),
+            "login": lambda user: APIClient().post(
+                reverse("user:users-login_user"),
+                {"email": user.email, "password": PASSWORD},
+            ),
+        }
+
+    def measure(self, scenario, users, requests):
+        """Run a scenario for random users and summarize its latencies"""
+        latencies = []
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            for _ in range(requests):
+                user = self.random.choice(users)
+                request_start = time.perf_counter()
+                response = scenario(user)
+                latencies.append(time.perf_counter() - request_start)
+                if response.status_code >= 400:
+                    raise RuntimeError(
+                        f"{response.status_code} from benchmark: {response.data}"
+                    )
+            seconds = time.perf_counter() - start
+
+        latencies.sort()
+        return {
+            "requests": requests,
+            "throughput": requests / seconds,
+            "mean_ms": statistics.mean(latencies) * 1000,
+            "p50_ms": percentile(latencies, 50),
+            "p95_ms": percentile(latencies, 95),
+            "p99_ms": percentile(latencies, 99),
+            "queries": len(queries) / requests,
+        }
+
+    def clean_up(self, users):
+        """Drop the files and cache entries that outlive the rollback"""
+        images.release(default_storage, self.uploads)
+        cache.delete_many([USER_KEY.format(user.id) for user in users])
+
+    def commit(self):
+        try:
+            return subprocess.run(
+                ["git", "rev-parse", "--short", "HEAD"],
+                capture_output=True,
+                text=True,
+                check=True,
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    def compare(self, path, results):
+        """Print the change of throughput and p95 against an earlier report"""
+        with open(path) as baseline_file:
+            baseline = json.load(baseline_file)
+        self.stdout.write(f"Compared to {baseline.get('commit') or path}:")
+        for name, result in results.items():
+            before = baseline["results"].get(name)
+            if before is None:
+                continue
+            throughput = result["throughput"] / before["throughput"] - 1
+            p95 = result["p95_ms"] / before["p95_ms"] - 1
+            style = self.style.ERROR if p95 > 0.1 else self.style.SUCCESS
+            self.stdout.write(
+                style(f"{name}: throughput {throughput:+.0%}, p95 {p95:+.0%}")
+            )
@@ -0,0 +1,64 @@
+"""
+Django command to delete stored recipe images no recipe references
+"""
+
+import os
+from datetime import timedelta
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core import images
+
+UPLOAD_ROOT = os.path.join("uploads", "recipe")
+
+
+def walk(storage, path):
+    """Yield the names of every file stored below path"""
+    directories, files = storage.listdir(path)
+    for name in files:
+        yield os.path.join(path, name)
+    for directory in directories:
+        yield from walk(storage, os.path.join(path, directory))
+
+
+class Command(BaseCommand):
+    """Django command to garbage collect orphaned recipe images"""
+
+    help = "Delete recipe image files that no recipe references any more."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only list the orphaned files.",
+        )
+        parser.add_argument(
+            "--min-age",
+            type=int,
+            default=3600,
+            help="Skip files younger than this many seconds, which may belong "
+            "to uploads that have not been committed yet.",
+        )
+
+    def handle(self, *args, **options):
+        """Entrypoint for command"""
+        if not default_storage.exists(UPLOAD_ROOT):
+            self.stdout.write(self.style.SUCCESS("No stored images"))
+            return
+
+        cutoff = timezone.now() - timedelta(seconds=options["min_age"])
+        orphans = [
+            name
+            for name in walk(default_storage, UPLOAD_ROOT)
+            if default_storage.get_modified_time(name) <= cutoff
+            and not images.is_referenced(name)
+        ]
+        for name in orphans:
+            self.stdout.write(name)
+            if not options["dry_run"]:
+                default_storage.delete(name)
+
+        verb = "Found" if options["dry_run"] else "Deleted"
+        self.stdout.write(self.style.SUCCESS(f"{verb} {len(orphans)} orphaned file(s)"))
@@ -0,0 +1,263 @@
+"""
+Django command to bulk import recipes from NDJSON or CSV
+"""
+
+import csv
+import io
+import json
+import os
+import sys
+import time
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from core.models import ImportCheckpoint, Recipe, Tag
+from core.renderers import CSVRenderer, chunked
+from core.signals import post_bulk_create, recipes_changed
+
+# Recipe columns read from each row; the rest take their defaults.
+FIELDS = ["title", "time_minutes", "price", "link", "description"]
+
+
+def read_rows(stream, file_format):
+    """Yield each record of an NDJSON or CSV stream as a dict"""
+    if file_format == "csv":
+        for row in csv.DictReader(stream):
+            tags = row.get("tags") or ""
+            row["tags"] = [name for name in tags.split(CSVRenderer.separator) if name]
+            yield row
+        return
+    for number, line in enumerate(stream, start=1):
+        if line.strip():
+            try:
+                yield json.loads(line)
+            except ValueError as exc:
+                raise CommandError(f"Line {number} is not valid JSON: {exc}")
+
+
+def tag_names(tags):
+    """Return the distinct names of tags given as names or as {"name": ...}"""
+    names = (tag["name"] if isinstance(tag, dict) else tag for tag in tags)
+    return list(dict.fromkeys(str(name) for name in names))
+
+
+class Command(BaseCommand):
+    """Django command to bulk import recipes"""
+
+    help = (
+        "Import recipes from an NDJSON or CSV file (as written by the export "
+        "endpoint) in batches, resuming from the last committed batch if a "
+        "previous run of the same source failed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("source", help="File to read, or - for stdin.")
+        parser.add_argument("--format", choices=["ndjson", "csv"])
+        parser.add_argument(
+            "--user", help="Email of the owner of rows without a user column."
+        )
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--checkpoint",
+            help="Name the progress is saved under; defaults to the source path.",
+        )
+        parser.add_argument(
+            "--restart",
+            action="store_true",
+            help="Ignore a saved checkpoint and import from the first row.",
+        )
+        parser.add_argument(
+            "--no-copy",
+            action="store_true",
+            help="Use bulk_create even when PostgreSQL COPY is available.",
+        )
+
+    def handle(self, *args, **options):
+        """Entrypoint for command"""
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size must be at least 1")
+        source = options["source"]
+        file_format = options["format"] or (
+            "csv" if source.lower().endswith(".csv") else "ndjson"
+        )
+        name = options["checkpoint"] or (
+            "stdin" if source == "-" else os.path.abspath(source)
+        )
+        checkpoint, _ = ImportCheckpoint.objects.get_or_create(name=name)
+        if options["restart"]:
+            checkpoint.rows = 0
+        elif checkpoint.rows:
+            self.stdout.write(f"Resuming {name} after {checkpoint.rows} rows")
+
+        self.users = {}
+        default_user = options["user"] and self.get_user(options["user"])
+        self.use_copy = connection.vendor == "postgresql" and not options["no_copy"]
+        insert = self.copy_recipes if self.use_copy else self.create_recipes
+
+        stream = (
+            io.TextIOWrapper(sys.stdin.buffer, encoding="utf-8", newline="")
+            if source == "-"
+            else open(source, encoding="utf-8", newline="")
+        )
+        imported, start = 0, time.perf_counter()
+        with stream:
+            rows = islice(read_rows(stream, file_format), checkpoint.rows, None)
+            for batch in chunked(rows, options["batch_size"]):
+                recipes, tags = self.build(batch, checkpoint.rows, default_user)
+                with transaction.atomic():
+                    insert(recipes)
+                    self.link_tags(recipes, tags)
+                    checkpoint.rows += len(batch)
+                    checkpoint.save(update_fields=["rows", "updated_at"])
+                imported += len(batch)
+                if options["verbosity"] > 1:
+                    self.report(imported, start)
+
+        checkpoint.delete()
+        self.report(imported, start, self.style.SUCCESS)
+
+    def report(self, imported, start, style=str):
+        seconds = time.perf_counter() - start
+        self.stdout.write(
+            style(
+                f"Imported {imported} recipes in {seconds:.1f}s "
+                f"({imported / max(seconds, 1e-9):.0f} rows/s)"
+            )
+        )
+
+    def get_user(self, email):
+        """Return the id of the user with email, looked up once per run"""
+        if email not in self.users:
+            user_id = (
+                get_user_model()
+                .objects.filter(email=email)
+                .values_list("id", flat=True)
+                .first()
+            )
+            if user_id is None:
+                raise CommandError(f"No user with email {email}")
+            self.users[email] = user_id
+        return self.users[email]
+
+    def build(self, batch, offset, default_user):
+        """Return unsaved recipes for a batch of rows and their tag names"""
+        emails = {row["user"] for row in batch if row.get("user")}
+        missing = emails - set(self.users)
+        if missing:
+            self.users.update(
+                get_user_model()
+                .objects.filter(email__in=missing)
+                .values_list("email", "id")
+            )
+
+        now = timezone.now()
+        recipes, tags = [], []
+        for number, row in enumerate(batch, start=offset + 1):
+            user_id = self.users.get(row["user"]) if row.get("user") else default_user
+            if not user_id:
+                raise CommandError(
+                    f"Row {number}: unknown user {row.get('user')!r}; "
+                    "pass --user for rows without one"
+                )
+            values = {}
+            for field_name in FIELDS:
+                field = Recipe._meta.get_field(field_name)
+                raw = row.get(field_name)
+                if raw in (None, "") and field.blank:
+                    raw = ""
+                try:
+                    values[field_name] = field.clean(raw, None)
+                except ValidationError as exc:
+                    raise CommandError(
+                        f"Row {number}: {field_name}: {' '.join(exc.messages)}"
+                    )
+            recipes.append(Recipe(user_id=user_id, updated_at=now, **values))
+            tags.append(tag_names(row.get("tags") or []))
+        return recipes, tags
+
+    def create_recipes(self, recipes):
+        if connection.features.can_return_rows_from_bulk_insert:
+            Recipe.objects.bulk_create(recipes)
+        else:
+            for recipe in recipes:
+                recipe.save()
+
+    def copy_recipes(self, recipes):
+        """Insert recipes with COPY, reserving their ids from the sequence"""
+        columns = ["id", "user_id", *FIELDS, "image_status", "image_variants"]
+        columns += ["updated_at"]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT nextval(pg_get_serial_sequence(%s, 'id')) "
+                "FROM generate_series(1, %s)",
+                [Recipe._meta.db_table, len(recipes)],
+            )
+            for recipe, (pk,) in zip(recipes, cursor.fetchall()):
+                recipe.id = pk
+            self.copy(cursor, Recipe._meta.db_table, columns, recipes)
+        # COPY skips the ORM, so announce the rows like bulk_create does.
+        post_bulk_create.send(sender=Recipe, instances=recipes, ignore_conflicts=False)
+
+    def copy(self, cursor, table, columns, objects):
+        buffer = io.StringIO()
+        # Quoted strings keep "" apart from NULL, which COPY reads unquoted.
+        writer = csv.writer(buffer, quoting=csv.QUOTE_NONNUMERIC)
+        for obj in objects:
+            writer.writerow(
+                [
+                    json.dumps(value) if isinstance(value, dict) else value
+                    for value in (getattr(obj, column) for column in columns)
+                ]
+            )
+        buffer.seek(0)
+        cursor.copy_expert(
+            f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)",
+            buffer,
+        )
+
+    def link_tags(self, recipes, tags):
+        """Link recipes to their tags, creating each user's missing tags"""
+        wanted = {
+            (recipe.user_id, name)
+            for recipe, names in zip(recipes, tags)
+            for name in names
+        }
+        if not wanted:
+            return
+
+        def existing():
+            found = Tag.objects.filter(
+                user_id__in={user_id for user_id, _ in wanted},
+                name__in={name for _, name in wanted},
+            ).values_list("user_id", "name", "id")
+            return {(user_id, name): pk for user_id, name, pk in found}
+
+        tag_ids = existing()
+        missing = [
+            Tag(user_id=user_id, name=name)
+            for user_id, name in wanted
+            if (user_id, name) not in tag_ids
+        ]
+        if missing:
+            Tag.objects.bulk_create(missing, ignore_conflicts=True)
+            tag_ids = existing()
+
+        through = Recipe.tags.through
+        links = [
+            through(recipe_id=recipe.id, tag_id=tag_ids[(recipe.user_id, name)])
+            for recipe, names in zip(recipes, tags)
+            for name in names
+        ]
+        if self.use_copy:
+            with connection.cursor() as cursor:
+                self.copy(
+                    cursor, through._meta.db_table, ["recipe_id", "tag_id"], links
+                )
+        else:
+            through.objects.bulk_create(links)
+        recipes_changed.send(sender=Recipe, recipes=recipes, fields={"tags"})
@@ -0,0 +1,74 @@
+"""
+Django command to load test a running deployment of the API
+"""
+
+import statistics
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+
+def fetch(url, headers):
+    """GET url and return the status code and the latency in seconds"""
+    request = urllib.request.Request(url, headers=headers)
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request) as response:
+            response.read()
+            status = response.status
+    except urllib.error.HTTPError as error:
+        status = error.code
+    except OSError:
+        status = None
+    return status, time.perf_counter() - start
+
+
+def percentile(latencies, percent):
+    """Return the given percentile of sorted latencies, in milliseconds"""
+    index = min(len(latencies) - 1, int(len(latencies) * percent / 100))
+    return latencies[index] * 1000
+
+
+class Command(BaseCommand):
+    """Django command to load test a running deployment"""
+
+    help = (
+        "Send concurrent GETs to the given URLs of a running server and report "
+        "throughput and latency percentiles. Run it against both deployments, "
+        "e.g. `gunicorn app.wsgi` and `uvicorn app.asgi:application`, to compare "
+        "them."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("urls", nargs="+")
+        parser.add_argument("--token", help="JWT access token to send")
+        parser.add_argument("--requests", type=int, default=1000)
+        parser.add_argument("--concurrency", type=int, default=50)
+
+    def handle(self, *args, **options):
+        """Entrypoint for command"""
+        headers = {"Accept": "application/json"}
+        if options["token"]:
+            headers["Authorization"] = f"Bearer {options['token']}"
+
+        for url in options["urls"]:
+            with ThreadPoolExecutor(max_workers=options["concurrency"]) as pool:
+                start = time.perf_counter()
+                results = list(
+                    pool.map(lambda _: fetch(url, headers), range(options["requests"]))
+                )
+                seconds = time.perf_counter() - start
+
+            latencies = sorted(latency for _, latency in results)
+            errors = sum(1 for status, _ in results if status is None or status >= 400)
+            self.stdout.write(
+                f"{url}: {len(results) / seconds:.0f} req/s at concurrency "
+                f"{options['concurrency']}, p50 {percentile(latencies, 50):.1f}ms "
+                f"p95 {percentile(latencies, 95):.1f}ms "
+                f"p99 {percentile(latencies, 99):.1f}ms "
+                f"max {latencies[-1] * 1000:.1f}ms "
+                f"mean {statistics.mean(latencies) * 1000:.1f}ms, {errors} errors"
+            )
@@ -0,0 +1,41 @@
+"""
+Django command to process recipe images left pending by the worker pool
+"""
+
+from django.core.management.base import BaseCommand
+
+from core import images
+from core.models import Recipe
+
+
+class Command(BaseCommand):
+    """Django command to drain the recipe image queue"""
+
+    help = "Render variants for recipe images that are pending processing."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--retry-failed",
+            action="store_true",
+            help="Also retry images whose processing failed.",
+        )
+
+    def handle(self, *args, **options):
+        """Entrypoint for command"""
+        statuses = [Recipe.ImageStatus.PENDING]
+        if options["retry_failed"]:
+            statuses.append(Recipe.ImageStatus.FAILED)
+        pending = list(
+            Recipe.objects.filter(image_status__in=statuses).values_list(
+                "id", flat=True
+            )
+        )
+
+        for recipe_id in pending:
+            images.process(recipe_id)
+        failed = Recipe.objects.filter(image_status=Recipe.ImageStatus.FAILED)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Processed {len(pending)} image(s), {failed.count()} failed"
+            )
+        )
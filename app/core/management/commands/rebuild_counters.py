@@ -0,0 +1,52 @@
+"""
+Django command to check or rebuild the per-user recipe and tag counters
+"""
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from core import counters
+from core.models import UserCounter
+
+
+class Command(BaseCommand):
+    """Django command to rebuild UserCounter rows"""
+
+    help = "Recompute UserCounter rows from the recipe and tag tables."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="Only report users whose counters drifted; exit 1 if any did.",
+        )
+
+    def handle(self, *args, **options):
+        """Entrypoint for command"""
+        actual = counters.count()
+        stored = {
+            counter.user_id: counter for counter in UserCounter.objects.all().iterator()
+        }
+        empty = dict.fromkeys(counters.COUNTED_FIELDS.values(), 0)
+        drifted = []
+        for user_id in get_user_model().objects.values_list("id", flat=True):
+            expected = actual.get(user_id, empty)
+            counter = stored.get(user_id)
+            current = {
+                field: getattr(counter, field) if counter else None
+                for field in expected
+            }
+            if current != expected:
+                drifted.append(user_id)
+                self.stdout.write(
+                    f"user {user_id}: stored {current}, actual {expected}"
+                )
+
+        if options["check"]:
+            if drifted:
+                raise CommandError(f"{len(drifted)} user counter(s) out of sync")
+            self.stdout.write(self.style.SUCCESS("Counters are consistent"))
+            return
+
+        counters.recount(drifted)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {len(drifted)} counter(s)"))
@@ -0,0 +1,277 @@
+"""
+Per-endpoint request metrics, kept in process and exported for Prometheus
+
+MetricsMiddleware times every request and counts the database queries it
+runs, and DRF serializers report the time spent in their .data. Each
+measurement goes into a histogram labelled with the view, named after the
+viewset action like URL names are (e.g. `recipes-list`). Every worker
+process keeps its own histograms, so Prometheus should scrape each worker
+or sum them.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from rest_framework import serializers
+
+from core import cache
+
+logger = logging.getLogger(__name__)
+
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+HISTOGRAMS = {
+    "api_request_duration_seconds": ("Total request latency", SECONDS_BUCKETS),
+    "api_db_queries": ("Database queries per request", QUERY_BUCKETS),
+    "api_db_duration_seconds": ("Database time per request", SECONDS_BUCKETS),
+    "api_serializer_duration_seconds": (
+        "Serializer time per request",
+        SECONDS_BUCKETS,
+    ),
+}
+
+_current = ContextVar("request_metrics", default=None)
+_histograms = {}
+_responses = {}
+_lock = threading.Lock()
+
+
+class Histogram:
+    """Cumulative Prometheus-style histogram"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0
+
+    def observe(self, value):
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+        self.count += 1
+        self.sum += value
+
+
+def view_name(request, view_func):
+    """Return the label of a view: `<basename>-<action>` for viewsets"""
+    actions = getattr(view_func, "actions", None)
+    basename = getattr(view_func, "initkwargs", {}).get("basename")
+    if actions and basename:
+        action = actions.get(request.method.lower(), request.method.lower())
+        return f"{basename}-{action}"
+    match = request.resolver_match
+    return (match and match.url_name) or f"{view_func.__module__}.{view_func.__name__}"
+
+
+def observe(view, status, measurements):
+    with _lock:
+        for name, value in measurements.items():
+            key = (name, view)
+            if key not in _histograms:
+                _histograms[key] = Histogram(HISTOGRAMS[name][1])
+            _histograms[key].observe(value)
+        _responses[view, status] = _responses.get((view, status), 0) + 1
+
+
+def reset():
+    """Forget everything recorded so far"""
+    with _lock:
+        _histograms.clear()
+        _responses.clear()
+
+
+def export():
+    """Return all metrics in the Prometheus text exposition format"""
+    lines = []
+    with _lock:
+        for name, (help_text, _) in HISTOGRAMS.items():
+            lines += [f"# HELP {name} {help_text}.", f"# TYPE {name} histogram"]
+            for (metric, view), histogram in sorted(_histograms.items()):
+                if metric != name:
+                    continue
+                label = f'view="{view}"'
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    lines.append(f'{name}_bucket{{{label},le="{bound}"}} {count}')
+                lines += [
+                    f'{name}_bucket{{{label},le="+Inf"}} {histogram.count}',
+                    f"{name}_sum{{{label}}} {histogram.sum!r}",
+                    f"{name}_count{{{label}}} {histogram.count}",
+                ]
+        lines += [
+            "# HELP api_responses_total Responses by view and status code.",
+            "# TYPE api_responses_total counter",
+        ]
+        for (view, status), count in sorted(_responses.items()):
+            lines.append(
+                f'api_responses_total{{view="{view}",status="{status}"}} {count}'
+            )
+
+    cache_stats = cache.stats()
+    lines += [
+        "# HELP api_response_cache_requests_total Response cache lookups.",
+        "# TYPE api_response_cache_requests_total counter",
+        f'api_response_cache_requests_total{{result="hit"}} {cache_stats["hits"]}',
+        f'api_response_cache_requests_total{{result="miss"}} {cache_stats["misses"]}',
+    ]
+    return "\n".join(lines) + "\n"
+
+
+def time_query(execute, sql, params, many, context):
+    """Database execute wrapper adding each query to the current request"""
+    measurements = _current.get()
+    if measurements is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        measurements["queries"] += 1
+        measurements["db"] += time.perf_counter() - start
+
+
+@receiver(connection_created)
+def instrument_connection(sender, connection, **kwargs):
+    """Install time_query on a connection, once
+
+    Connections belong to a thread, and under ASGI sync views run in a
+    worker thread, so the wrapper stays installed instead of being added
+    around each request.
+    """
+    if time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, time_query)
+
+
+class MetricsMiddleware:
+    """Record latency, queries, database and serializer time per view
+
+    It runs natively in both the sync and the async handler, so async views
+    are not funnelled through a sync thread. Streamed responses are
+    recorded when their last chunk has been sent.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            # Marks the instance as a coroutine function for Django's handler.
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        for connection in connections.all():
+            instrument_connection(None, connection)
+        measurements = self.start(request)
+        token = _current.set(measurements)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, measurements)
+
+    async def __acall__(self, request):
+        measurements = self.start(request)
+        token = _current.set(measurements)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, measurements)
+
+    def start(self, request):
+        request.metrics_view = None
+        return {
+            "queries": 0,
+            "db": 0.0,
+            "serializer": 0.0,
+            "start": time.perf_counter(),
+        }
+
+    def finish(self, request, response, measurements):
+        if response.streaming:
+            response.streaming_content = self.stream(
+                request, response, measurements, response.streaming_content
+            )
+        else:
+            self.record(request, response, measurements)
+        return response
+
+    def stream(self, request, response, measurements, content):
+        """Yield content, counting the queries run to produce it"""
+        iterator = iter(content)
+        try:
+            while True:
+                token = _current.set(measurements)
+                try:
+                    chunk = next(iterator)
+                except StopIteration:
+                    return
+                finally:
+                    _current.reset(token)
+                yield chunk
+        finally:
+            self.record(request, response, measurements)
+
+    def record(self, request, response, measurements):
+        elapsed = time.perf_counter() - measurements["start"]
+        view = request.metrics_view or "unresolved"
+        observe(
+            view,
+            response.status_code,
+            {
+                "api_request_duration_seconds": elapsed,
+                "api_db_queries": measurements["queries"],
+                "api_db_duration_seconds": measurements["db"],
+                "api_serializer_duration_seconds": measurements["serializer"],
+            },
+        )
+        budget = settings.REQUEST_QUERY_BUDGET
+        if budget and measurements["queries"] > budget:
+            logger.warning(
+                "%s %s (%s) ran %d queries, over the budget of %d",
+                request.method,
+                request.get_full_path(),
+                view,
+                measurements["queries"],
+                budget,
+            )
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.metrics_view = view_name(request, view_func)
+
+
+def timed_data(data):
+    """Wrap a serializer .data property to add its time to the request"""
+
+    def timed(serializer):
+        measurements = _current.get()
+        if measurements is None or measurements.get("serializing"):
+            return data.fget(serializer)
+        measurements["serializing"] = True
+        start = time.perf_counter()
+        try:
+            return data.fget(serializer)
+        finally:
+            measurements["serializer"] += time.perf_counter() - start
+            measurements["serializing"] = False
+
+    return property(timed)
+
+
+def instrument_serializers():
+    """Time Serializer.data and ListSerializer.data, once per process"""
+    for cls in (serializers.Serializer, serializers.ListSerializer):
+        if not getattr(cls.data, "fget", None) or hasattr(cls, "_metrics_data"):
+            continue
+        cls._metrics_data = cls.data
+        cls.data = timed_data(cls.data)
@@ -0,0 +1,58 @@
+# Generated by Django 3.2.25 on 2026-10-18 19:29
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+import django.db.models.deletion
+
+
+def populate_counters(apps, schema_editor):
+    User = apps.get_model("core", "User")
+    Recipe = apps.get_model("core", "Recipe")
+    Tag = apps.get_model("core", "Tag")
+    UserCounter = apps.get_model("core", "UserCounter")
+
+    def totals(model):
+        rows = model.objects.order_by().values("user_id").annotate(total=Count("id"))
+        return dict(rows.values_list("user_id", "total"))
+
+    recipes, tags = totals(Recipe), totals(Tag)
+    UserCounter.objects.bulk_create(
+        [
+            UserCounter(
+                user_id=user_id,
+                recipes=recipes.get(user_id, 0),
+                tags=tags.get(user_id, 0),
+            )
+            for user_id in User.objects.values_list("id", flat=True).iterator()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0005_recipe_image"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="UserCounter",
+            fields=[
+                (
+                    "user",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="counter",
+                        serialize=False,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                ("recipes", models.IntegerField(default=0)),
+                ("tags", models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
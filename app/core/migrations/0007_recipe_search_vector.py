@@ -0,0 +1,49 @@
+# Generated by Django 3.2.25 on 2026-10-18 19:32
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute(
+        "CREATE INDEX recipe_search_vector_idx ON core_recipe "
+        "USING gin (search_vector)"
+    )
+    schema_editor.execute("""
+        UPDATE core_recipe SET search_vector =
+            setweight(to_tsvector('english', coalesce(core_recipe.title, '')), 'A') ||
+            setweight(to_tsvector('english', coalesce((
+                SELECT string_agg(core_tag.name, ' ')
+                FROM core_tag
+                INNER JOIN core_recipe_tags ON core_recipe_tags.tag_id = core_tag.id
+                WHERE core_recipe_tags.recipe_id = core_recipe.id
+            ), '')), 'B') ||
+            setweight(
+                to_tsvector('english', coalesce(core_recipe.description, '')), 'C'
+            )
+        """)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute("DROP INDEX IF EXISTS recipe_search_vector_idx")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0006_usercounter"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="recipe",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(
+                editable=False, null=True
+            ),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 3.2.25 on 2026-10-18 19:34
+
+from django.db import migrations
+from django.db.models import Count, F, Min
+
+
+def merge_duplicate_tags(apps, schema_editor):
+    """Fold tags sharing (user, name) into the oldest one before the constraint"""
+    Recipe = apps.get_model("core", "Recipe")
+    Tag = apps.get_model("core", "Tag")
+    UserCounter = apps.get_model("core", "UserCounter")
+    Through = Recipe.tags.through
+
+    duplicates = (
+        Tag.objects.order_by()
+        .values("user_id", "name")
+        .annotate(keep=Min("id"), total=Count("id"))
+        .filter(total__gt=1)
+    )
+    for group in duplicates.iterator():
+        extra = list(
+            Tag.objects.filter(user_id=group["user_id"], name=group["name"])
+            .exclude(id=group["keep"])
+            .values_list("id", flat=True)
+        )
+        linked = set(
+            Through.objects.filter(tag_id=group["keep"]).values_list(
+                "recipe_id", flat=True
+            )
+        )
+        for link in Through.objects.filter(tag_id__in=extra).order_by("id"):
+            if link.recipe_id in linked:
+                link.delete()
+            else:
+                Through.objects.filter(id=link.id).update(tag_id=group["keep"])
+                linked.add(link.recipe_id)
+        Tag.objects.filter(id__in=extra).delete()
+        UserCounter.objects.filter(user_id=group["user_id"]).update(
+            tags=F("tags") - len(extra)
+        )
+
+
+# A migration of its own: on PostgreSQL, adding the constraint in the same
+# transaction fails while the deferred foreign key checks of these writes are
+# still pending.
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0008_trigram_indexes"),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_tags, migrations.RunPython.noop),
+    ]
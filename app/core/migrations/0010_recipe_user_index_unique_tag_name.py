@@ -0,0 +1,26 @@
+# Generated by Django 3.2.25 on 2026-10-18 19:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    # Renumbered; databases that applied the old name count this as applied.
+    replaces = [("core", "0009_recipe_user_index_unique_tag_name")]
+
+    dependencies = [
+        ("core", "0009_merge_duplicate_tags"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="recipe",
+            index=models.Index(fields=["user", "-id"], name="recipe_user_id_desc_idx"),
+        ),
+        migrations.AddConstraint(
+            model_name="tag",
+            constraint=models.UniqueConstraint(
+                fields=("user", "name"), name="unique_tag_name_per_user"
+            ),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 3.2.25 on 2026-10-18 19:38
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    # Renumbered; databases that applied the old name count this as applied.
+    replaces = [("core", "0010_updated_at")]
+
+    dependencies = [
+        ("core", "0010_recipe_user_index_unique_tag_name"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="recipe",
+            name="updated_at",
+            field=models.DateTimeField(
+                auto_now=True, default=django.utils.timezone.now
+            ),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name="tag",
+            name="updated_at",
+            field=models.DateTimeField(
+                auto_now=True, default=django.utils.timezone.now
+            ),
+            preserve_default=False,
+        ),
+    ]
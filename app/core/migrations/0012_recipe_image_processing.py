@@ -0,0 +1,44 @@
+# Generated by Django 3.2.25 on 2026-10-18 19:43
+
+from django.db import migrations, models
+
+
+def queue_existing_images(apps, schema_editor):
+    """Queue images uploaded before processing existed for process_images"""
+    Recipe = apps.get_model("core", "Recipe")
+    Recipe.objects.exclude(image__isnull=True).exclude(image="").update(
+        image_status="pending"
+    )
+
+
+class Migration(migrations.Migration):
+
+    # Renumbered; databases that applied the old name count this as applied.
+    replaces = [("core", "0011_recipe_image_processing")]
+
+    dependencies = [
+        ("core", "0011_updated_at"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="recipe",
+            name="image_status",
+            field=models.CharField(
+                choices=[
+                    ("none", "None"),
+                    ("pending", "Pending"),
+                    ("ready", "Ready"),
+                    ("failed", "Failed"),
+                ],
+                default="none",
+                max_length=16,
+            ),
+        ),
+        migrations.AddField(
+            model_name="recipe",
+            name="image_variants",
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.RunPython(queue_existing_images, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 3.2.25 on 2026-10-18 19:49
+
+import core.models
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    # Renumbered; databases that applied the old name count this as applied.
+    replaces = [("core", "0012_content_addressed_images")]
+
+    dependencies = [
+        ("core", "0012_recipe_image_processing"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="recipe",
+            name="image",
+            field=core.models.RecipeImageField(
+                db_index=True, null=True, upload_to=core.models.recipe_image_file_path
+            ),
+        ),
+    ]
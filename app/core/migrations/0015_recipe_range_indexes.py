@@ -0,0 +1,26 @@
+# Generated by Django 3.2.25 on 2026-10-18 20:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    # Renumbered; databases that applied the old name count this as applied.
+    replaces = [("core", "0014_recipe_range_indexes")]
+
+    dependencies = [
+        ("core", "0014_importcheckpoint"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="recipe",
+            index=models.Index(
+                fields=["user", "time_minutes"], name="recipe_user_time_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="recipe",
+            index=models.Index(fields=["user", "price"], name="recipe_user_price_idx"),
+        ),
+    ]
@@ -1,20 +1,25 @@
 from distutils.command.upload import upload
 from django.db import models
 from django.conf import settings
+from django.contrib.postgres.search import SearchVectorField
 
 
 """
 Database models
 """
+import hashlib
 import uuid
 import os
 from django.db import models
+from django.db.models.fields.files import ImageFieldFile
 from django.contrib.auth.models import (
     AbstractBaseUser,
     BaseUserManager,
     PermissionsMixin,
 )
 
+from core.signals import post_bulk_create
+
 
 def recipe_image_file_path(instance, filename):
     """Generate file path for new recipe image"""
@@ -24,6 +29,40 @@ def recipe_image_file_path(instance, filename):
     return os.path.join("uploads", "recipe", filename)
 
 
+def recipe_image_content_path(content, filename):
+    """Generate the content-addressed file path of a recipe image"""
+    digest = hashlib.sha256()
+    for chunk in content.chunks():
+        digest.update(chunk)
+    content.seek(0)
+    digest = digest.hexdigest()
+    ext = os.path.splitext(filename)[1].lower()
+
+    return os.path.join("uploads", "recipe", digest[:2], f"{digest}{ext}")
+
+
+class RecipeImageFieldFile(ImageFieldFile):
+    """Image file stored once per distinct content when content addressing is on"""
+
+    def save(self, name, content, save=True):
+        if not settings.RECIPE_IMAGE_CONTENT_ADDRESSED:
+            return super().save(name, content, save)
+        name = recipe_image_content_path(content, name)
+        if not self.storage.exists(name):
+            name = self.storage.save(name, content, max_length=self.field.max_length)
+        self.name = name
+        setattr(self.instance, self.field.attname, self.name)
+        self._committed = True
+        if save:
+            self.instance.save()
+
+    save.alters_data = True
+
+
+class RecipeImageField(models.ImageField):
+    attr_class = RecipeImageFieldFile
+
+
 class UserManager(BaseUserManager):
     """Manager for user"""
 
@@ -61,9 +100,28 @@ class User(AbstractBaseUser, PermissionsMixin):
     REQUIRED_FIELDS = []
 
 
+class BulkSignalQuerySet(models.QuerySet):
+    """QuerySet announcing bulk inserts, which do not send post_save"""
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = super().bulk_create(objs, *args, **kwargs)
+        post_bulk_create.send(
+            sender=self.model,
+            instances=objs,
+            ignore_conflicts=kwargs.get("ignore_conflicts", False),
+        )
+        return objs
+
+
 class Recipe(models.Model):
     """Recipe object"""
 
+    class ImageStatus(models.TextChoices):
+        NONE = "none"
+        PENDING = "pending"
+        READY = "ready"
+        FAILED = "failed"
+
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     title = models.CharField(max_length=255)
     description = models.TextField(blank=True)
@@ -71,7 +129,26 @@ class Recipe(models.Model):
     price = models.DecimalField(max_digits=5, decimal_places=2)
     link = models.CharField(max_length=255, blank=True)
     tags = models.ManyToManyField("Tag")
-    image = models.ImageField(null=True, upload_to=recipe_image_file_path)
+    image = RecipeImageField(null=True, upload_to=recipe_image_file_path, db_index=True)
+    # Set by core.images once the upload has been processed in the background.
+    image_status = models.CharField(
+        max_length=16, choices=ImageStatus.choices, default=ImageStatus.NONE
+    )
+    image_variants = models.JSONField(default=dict, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    # Maintained by core.search on PostgreSQL; NULL on other backends.
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    objects = BulkSignalQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Every list request filters by user and pages on descending id.
+            models.Index(fields=["user", "-id"], name="recipe_user_id_desc_idx"),
+            # Range filters on the list compare within one user's recipes.
+            models.Index(fields=["user", "time_minutes"], name="recipe_user_time_idx"),
+            models.Index(fields=["user", "price"], name="recipe_user_price_idx"),
+        ]
 
     def __str__(self) -> str:
         return self.title
@@ -80,6 +157,40 @@ class Recipe(models.Model):
 class Tag(models.Model):
     name = models.CharField(max_length=255)
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = BulkSignalQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "name"], name="unique_tag_name_per_user"
+            ),
+        ]
 
     def __str__(self) -> str:
         return self.name
+
+
+class UserCounter(models.Model):
+    """Denormalized per-user totals, maintained by core.signals"""
+
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="counter",
+    )
+    recipes = models.IntegerField(default=0)
+    tags = models.IntegerField(default=0)
+
+
+class ImportCheckpoint(models.Model):
+    """Rows of an import_recipes source committed so far, for resuming it"""
+
+    name = models.CharField(max_length=255, unique=True)
+    rows = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self) -> str:
+        return f"{self.name}: {self.rows}"
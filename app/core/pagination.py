@@ -1,15 +1,76 @@
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.exceptions import NotFound
+from rest_framework.fields import BooleanField
+from rest_framework.pagination import (
+    CursorPagination,
+    PageNumberPagination,
+    _reverse_ordering,
+)
 from rest_framework.response import Response
+import hashlib
+import json
 import math
+from functools import reduce
+from operator import or_
 from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.paginator import Paginator as DjangoPaginator
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+
+from core.models import UserCounter
 
 DEFAULT_PAGE = 1
 
 
-class CustomPagination(PageNumberPagination):
+class CounterTotalMixin:
+    """Read list totals from UserCounter instead of running COUNT(*)
+
+    Views opt in with `counter_field` naming the UserCounter column that
+    matches their unfiltered per-user queryset. Any query parameter other
+    than the paginator's own means the list is filtered, so the caller has
+    to fall back to a real count.
+    """
+
+    unfiltered_params = {"ordering", "format", "facets"}
+
+    def get_counter_total(self, request, view):
+        field = getattr(view, "counter_field", None)
+        if field is None or not request.user.is_authenticated:
+            return None
+        own_params = {
+            getattr(self, name, None)
+            for name in (
+                "page_query_param",
+                "page_size_query_param",
+                "cursor_query_param",
+                "total_query_param",
+            )
+        }
+        if set(request.query_params) - own_params - self.unfiltered_params:
+            return None
+        return (
+            UserCounter.objects.filter(user=request.user)
+            .values_list(field, flat=True)
+            .first()
+        )
+
+
+class CustomPagination(CounterTotalMixin, PageNumberPagination):
 
     page_size_query_param = "page_size"
 
+    def paginate_queryset(self, queryset, request, view=None):
+        self.counter_total = self.get_counter_total(request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def django_paginator_class(self, object_list, per_page):
+        """Build the Django paginator, seeding its count from the counter"""
+        paginator = DjangoPaginator(object_list, per_page)
+        if self.counter_total is not None:
+            paginator.count = self.counter_total
+        return paginator
+
     def get_paginated_response(self, data):
         return Response(
             {
@@ -30,3 +91,174 @@ class StandardResultsSetPagination(PageNumberPagination):
     page_size = 100
     page_size_query_param = "page_size"
     max_page_size = 1000
+
+
+class KeysetPagination(CounterTotalMixin, CursorPagination):
+    """Cursor pagination on descending id with an opt-in, cached total
+
+    Each page is fetched with `WHERE id < <cursor>` so its cost does not grow
+    with depth, and no `COUNT(*)` runs unless the client asks for `?total=true`
+    on a filtered list.
+
+    Orderings on other fields, such as search rank, end with id, and the
+    cursor holds the values of every ordering field. Positions are therefore
+    unique, so pages never fall back to DRF's capped offsets.
+    """
+
+    ordering = "-id"
+    page_size_query_param = "page_size"
+    max_page_size = 1000
+    total_query_param = "total"
+    total_cache_timeout = 60
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.total = None
+        if request.query_params.get(self.total_query_param) in BooleanField.TRUE_VALUES:
+            self.total = self.get_total(queryset, request, view)
+
+        # CursorPagination.paginate_queryset, seeking on every ordering field
+        # instead of only the first one.
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+
+        self.cursor = self.decode_cursor(request)
+        if self.cursor is None:
+            offset, reverse, current_position = (0, False, None)
+        else:
+            offset, reverse, current_position = self.cursor
+
+        if reverse:
+            queryset = queryset.order_by(*_reverse_ordering(self.ordering))
+        else:
+            queryset = queryset.order_by(*self.ordering)
+
+        if current_position is not None:
+            queryset = queryset.filter(
+                self.position_filter(queryset, self.ordering, current_position, reverse)
+            )
+
+        results = list(queryset[offset : offset + self.page_size + 1])
+        self.page = list(results[: self.page_size])
+
+        if len(results) > len(self.page):
+            has_following_position = True
+            following_position = self._get_position_from_instance(
+                results[-1], self.ordering
+            )
+        else:
+            has_following_position = False
+            following_position = None
+
+        if reverse:
+            self.page = list(reversed(self.page))
+            self.has_next = (current_position is not None) or (offset > 0)
+            self.has_previous = has_following_position
+            if self.has_next:
+                self.next_position = current_position
+            if self.has_previous:
+                self.previous_position = following_position
+        else:
+            self.has_next = has_following_position
+            self.has_previous = (current_position is not None) or (offset > 0)
+            if self.has_next:
+                self.next_position = following_position
+            if self.has_previous:
+                self.previous_position = current_position
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
+
+    def get_ordering(self, request, queryset, view):
+        """Return the requested ordering, ending with id so it is unique"""
+        ordering = super().get_ordering(request, queryset, view)
+        if not {"id", "-id", "pk", "-pk"} & set(ordering):
+            ordering = (*ordering, "-id")
+        return ordering
+
+    def position_filter(self, queryset, ordering, position, reverse):
+        """Return a Q of the rows after position in the given ordering"""
+        try:
+            values = json.loads(position)
+        except ValueError:
+            values = position
+        if not isinstance(values, list):
+            # Cursors issued before positions covered every ordering field.
+            values = [values]
+        if len(values) > len(ordering):
+            raise NotFound(self.invalid_cursor_message)
+
+        clauses, equal = [], {}
+        for order, value in zip(ordering, values):
+            field = order.lstrip("-")
+            value = self.position_value(queryset, field, value)
+            lookup = "lt" if order.startswith("-") != reverse else "gt"
+            clauses.append(Q(**equal, **{f"{field}__{lookup}": value}))
+            equal[field] = value
+        return reduce(or_, clauses)
+
+    def position_value(self, queryset, name, value):
+        """Return a cursor value as the type of the field it orders on"""
+        if name in queryset.query.annotations:
+            field = queryset.query.annotations[name].output_field
+        else:
+            try:
+                field = queryset.model._meta.get_field(name)
+            except FieldDoesNotExist:
+                field = queryset.model._meta.pk if name == "pk" else None
+        if field is None or value is None or isinstance(value, (dict, list)):
+            raise NotFound(self.invalid_cursor_message)
+        try:
+            return field.to_python(value)
+        except (ValidationError, TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def _get_position_from_instance(self, instance, ordering):
+        values = [
+            instance[field] if isinstance(instance, dict) else getattr(instance, field)
+            for field in (order.lstrip("-") for order in ordering)
+        ]
+        return json.dumps(values, cls=DjangoJSONEncoder, separators=(",", ":"))
+
+    def get_total(self, queryset, request, view):
+        """Return the per-user counter, or a briefly cached count when filtered"""
+        total = self.get_counter_total(request, view)
+        if total is not None:
+            return total
+        sql, params = queryset.query.sql_with_params()
+        digest = hashlib.md5(f"{sql}{params}".encode()).hexdigest()
+        return cache.get_or_set(
+            f"pagination:total:{digest}", queryset.count, self.total_cache_timeout
+        )
+
+    def get_paginated_response(self, data):
+        response = {
+            "links": {
+                "next": self.get_next_link(),
+                "previous": self.get_previous_link(),
+            },
+            "page_size": self.page_size,
+            "results": data,
+        }
+        if self.total is not None:
+            response["total"] = self.total
+        return Response(response)
+
+    def get_paginated_response_schema(self, schema):
+        link = {"type": "string", "nullable": True}
+        return {
+            "type": "object",
+            "properties": {
+                "links": {
+                    "type": "object",
+                    "properties": {"next": link, "previous": link},
+                },
+                "page_size": {"type": "integer"},
+                "total": {"type": "integer"},
+                "results": schema,
+            },
+        }
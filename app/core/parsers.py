@@ -0,0 +1,40 @@
+"""
+Request parsers shared by the API apps
+"""
+
+import json
+
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser, MultiPartParser
+
+from core.uploads import StreamingImageUploadHandler
+
+
+class NDJSONParser(BaseParser):
+    """Parse a newline-delimited JSON body into a list of objects"""
+
+    media_type = "application/x-ndjson"
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get("encoding", settings.DEFAULT_CHARSET)
+        items = []
+        for number, line in enumerate(stream, start=1):
+            try:
+                line = line.decode(encoding).strip()
+                if not line:
+                    continue
+                items.append(json.loads(line))
+            except ValueError as exc:
+                raise ParseError(f"NDJSON parse error on line {number} - {exc}")
+        return items
+
+
+class StreamingMultiPartParser(MultiPartParser):
+    """Multipart parser that streams uploaded files straight to disk"""
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        request = parser_context["request"]._request
+        request.upload_handlers = [StreamingImageUploadHandler(request)]
+        return super().parse(stream, media_type, parser_context)
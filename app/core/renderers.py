@@ -0,0 +1,138 @@
+"""
+JSON rendering for the API
+
+FastJSONRenderer encodes with orjson when it is installed and otherwise
+behaves exactly like DRF's JSONRenderer. Both produce the same bytes:
+compact UTF-8, with anything orjson does not know (Decimal, lazy strings)
+and datetimes handed to DRF's encoder so their format does not change.
+
+Renderers with a stream() method also render large lists a chunk at a
+time for use with a StreamingHttpResponse, instead of building the whole
+body in memory.
+"""
+
+import csv
+import io
+from itertools import islice
+
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils import encoders
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+STREAM_CHUNK_SIZE = 500
+
+
+class FastJSONRenderer(JSONRenderer):
+    """JSONRenderer that uses orjson for compact output when available"""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        indent = self.get_indent(accepted_media_type, renderer_context or {})
+        if orjson is None or indent or self.ensure_ascii:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        rendered = orjson.dumps(
+            data,
+            default=encoders.JSONEncoder().default,
+            option=orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME,
+        )
+        # Escaped by JSONRenderer too, as they are invalid in JavaScript.
+        return rendered.replace(b"\xe2\x80\xa8", b"\\u2028").replace(
+            b"\xe2\x80\xa9", b"\\u2029"
+        )
+
+    def stream(self, items, chunk_size=STREAM_CHUNK_SIZE):
+        return stream_json(items, chunk_size)
+
+
+class NDJSONRenderer(BaseRenderer):
+    """Render a list as newline-delimited JSON, one item per line"""
+
+    media_type = "application/x-ndjson"
+    format = "ndjson"
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        return b"".join(self.stream(data if isinstance(data, list) else [data]))
+
+    def stream(self, items, chunk_size=STREAM_CHUNK_SIZE):
+        renderer = FastJSONRenderer()
+        for chunk in chunked(items, chunk_size):
+            yield b"".join(renderer.render(item) + b"\n" for item in chunk)
+
+
+class CSVRenderer(BaseRenderer):
+    """Render a list of flat objects as CSV with a header row
+
+    Nested lists, such as tags, are written as their names joined by "|".
+    """
+
+    media_type = "text/csv"
+    format = "csv"
+    charset = "utf-8"
+    separator = "|"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        return b"".join(self.stream(data if isinstance(data, list) else [data]))
+
+    def stream(self, items, chunk_size=STREAM_CHUNK_SIZE):
+        header = None
+        for chunk in chunked(items, chunk_size):
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            if header is None:
+                header = list(chunk[0])
+                writer.writerow(header)
+            writer.writerows(
+                [self.cell(item.get(name)) for name in header] for item in chunk
+            )
+            yield buffer.getvalue().encode(self.charset)
+
+    def cell(self, value):
+        if isinstance(value, list):
+            return self.separator.join(
+                str(item["name"] if isinstance(item, dict) else item) for item in value
+            )
+        return "" if value is None else value
+
+
+class PrometheusRenderer(BaseRenderer):
+    """Render metrics text as is, and anything else (errors) as JSON"""
+
+    media_type = "text/plain"
+    format = "prometheus"
+    charset = "utf-8"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, str):
+            return data.encode(self.charset)
+        return FastJSONRenderer().render(data)
+
+
+def chunked(items, size):
+    """Yield lists of up to size items from an iterable"""
+    iterator = iter(items)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def stream_json(items, chunk_size=STREAM_CHUNK_SIZE):
+    """Yield the JSON array of items, rendering chunk_size items at a time"""
+    renderer = FastJSONRenderer()
+    separator = b"["
+    for chunk in chunked(items, chunk_size):
+        yield separator + renderer.render(chunk)[1:-1]
+        separator = b","
+    yield b"[]" if separator == b"[" else b"]"
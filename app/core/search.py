@@ -0,0 +1,213 @@
+"""
+Full-text search and typeahead support for recipes and tags
+
+On PostgreSQL every recipe keeps a weighted `search_vector` built from its
+title (A), tag names (B) and description (C), indexed with GIN, and recipe
+titles and tag names carry pg_trgm indexes for prefix suggestions. Other
+backends leave the column empty and fall back to substring matches.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.postgres.search import TrigramSimilarity
+from django.db import connection
+from django.db.models import CharField, Q
+from django.db.models.lookups import IStartsWith
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete,
+)
+from django.dispatch import receiver
+
+from core.models import Recipe, Tag
+from core.signals import post_bulk_create, recipes_changed
+
+SEARCH_CONFIG = "english"
+
+UPDATE_SEARCH_VECTOR_SQL = """
+    UPDATE core_recipe SET search_vector =
+        setweight(to_tsvector(%(config)s, coalesce(core_recipe.title, '')), 'A') ||
+        setweight(to_tsvector(%(config)s, coalesce((
+            SELECT string_agg(core_tag.name, ' ')
+            FROM core_tag
+            INNER JOIN core_recipe_tags ON core_recipe_tags.tag_id = core_tag.id
+            WHERE core_recipe_tags.recipe_id = core_recipe.id
+        ), '')), 'B') ||
+        setweight(
+            to_tsvector(%(config)s, coalesce(core_recipe.description, '')), 'C'
+        )
+"""
+
+
+@CharField.register_lookup
+class TrigramIStartsWith(IStartsWith):
+    """istartswith that PostgreSQL runs as ILIKE, which pg_trgm indexes serve
+
+    Django compiles istartswith to UPPER(field) LIKE UPPER(prefix), which no
+    index on the plain column can answer.
+    """
+
+    lookup_name = "trigram_istartswith"
+
+    def as_sql(self, compiler, connection):
+        return IStartsWith(self.lhs, self.rhs).as_sql(compiler, connection)
+
+    def as_postgresql(self, compiler, connection):
+        if not self.rhs_is_direct_value():
+            return self.as_sql(compiler, connection)
+        lhs, lhs_params = compiler.compile(self.lhs)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f"{lhs} ILIKE {rhs}", [*lhs_params, *rhs_params]
+
+
+def uses_full_text_search():
+    """Return whether the database supports the tsvector search mode"""
+    return connection.vendor == "postgresql"
+
+
+def update_search_vectors(recipe_ids=None, tag_id=None):
+    """Recompute search_vector for the given recipes or the recipes of a tag"""
+    if not uses_full_text_search():
+        return
+    params = {"config": SEARCH_CONFIG}
+    if tag_id is not None:
+        where = (
+            "WHERE core_recipe.id IN (SELECT recipe_id FROM core_recipe_tags "
+            "WHERE tag_id = %(tag_id)s)"
+        )
+        params["tag_id"] = tag_id
+    else:
+        recipe_ids = list(recipe_ids)
+        if not recipe_ids:
+            return
+        where = "WHERE core_recipe.id = ANY(%(recipe_ids)s)"
+        params["recipe_ids"] = recipe_ids
+    with connection.cursor() as cursor:
+        cursor.execute(f"{UPDATE_SEARCH_VECTOR_SQL} {where}", params)
+
+
+def remember_tag_recipes(tag):
+    """Store the ids of recipes a tag is about to be detached from"""
+    if uses_full_text_search():
+        tag._search_recipe_ids = list(
+            Recipe.tags.through.objects.filter(tag_id=tag.pk).values_list(
+                "recipe_id", flat=True
+            )
+        )
+
+
+class PrefixCache:
+    """Thread-safe LRU cache with a TTL for hot suggestion prefixes"""
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires, value = item
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+suggestion_cache = PrefixCache(
+    maxsize=settings.SUGGEST_CACHE_SIZE, ttl=settings.SUGGEST_CACHE_TTL
+)
+
+
+def suggest(queryset, field, prefix, limit, scope):
+    """Return up to limit (id, value) pairs whose field matches prefix
+
+    `scope` identifies how queryset is filtered (e.g. the user id) in the
+    cache key. On PostgreSQL both the prefix match and the fuzzy `%` match
+    are served by the pg_trgm GIN indexes and results are ordered by
+    similarity.
+    """
+    key = (queryset.model._meta.label, field, scope, prefix.lower(), limit)
+    cached = suggestion_cache.get(key)
+    if cached is not None:
+        return cached
+
+    matches = Q(**{f"{field}__trigram_istartswith": prefix})
+    if uses_full_text_search():
+        matches |= Q(**{f"{field}__trigram_similar": prefix})
+        ordering = [TrigramSimilarity(field, prefix).desc(), field]
+    else:
+        ordering = [field]
+    results = list(
+        queryset.filter(matches).order_by(*ordering).values_list("id", field)[:limit]
+    )
+    suggestion_cache.set(key, results)
+    return results
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_saved(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    if update_fields is None or {"title", "description"} & set(update_fields):
+        update_search_vectors([instance.pk])
+
+
+@receiver(post_bulk_create, sender=Recipe)
+def recipes_bulk_created(sender, instances, **kwargs):
+    update_search_vectors(instance.pk for instance in instances if instance.pk)
+
+
+@receiver(recipes_changed, sender=Recipe)
+def recipes_changed_in_bulk(sender, recipes, fields, **kwargs):
+    if {"title", "description", "tags"} & set(fields):
+        update_search_vectors(recipe.id for recipe in recipes)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_tags_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if reverse and action == "pre_clear":
+        remember_tag_recipes(instance)
+    elif action in ("post_add", "post_remove", "post_clear"):
+        if not reverse:
+            update_search_vectors([instance.pk])
+        elif action == "post_clear":
+            update_search_vectors(getattr(instance, "_search_recipe_ids", []))
+        else:
+            update_search_vectors(pk_set)
+
+
+@receiver(post_save, sender=Tag)
+def tag_saved(sender, instance, created, raw=False, **kwargs):
+    if not created and not raw:
+        update_search_vectors(tag_id=instance.pk)
+
+
+@receiver(pre_delete, sender=Tag)
+def tag_deleting(sender, instance, **kwargs):
+    remember_tag_recipes(instance)
+
+
+@receiver(post_delete, sender=Tag)
+def tag_deleted(sender, instance, **kwargs):
+    update_search_vectors(getattr(instance, "_search_recipe_ids", []))
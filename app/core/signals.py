@@ -0,0 +1,11 @@
+"""
+Custom signals for the core models
+"""
+from django.dispatch import Signal
+
+# Sent by BulkSignalQuerySet.bulk_create with `instances` and `ignore_conflicts`.
+post_bulk_create = Signal()
+
+# Sent with `recipes` and the set of changed `fields` after writes that skip
+# model signals, such as bulk updates and through-table inserts.
+recipes_changed = Signal()
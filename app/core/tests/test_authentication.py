@@ -0,0 +1,88 @@
+"""
+Tests for the cached JWT authentication
+"""
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from core.authentication import USER_KEY, tokens_for_user
+
+RECIPES_URL = reverse("recipe:recipes-list")
+
+
+def user_queries(queries):
+    """Return the captured queries reading the user table"""
+    return [query for query in queries if 'FROM "core_user"' in query["sql"]]
+
+
+class CachedJWTAuthenticationTests(TestCase):
+    """Test resolving JWT users through the cache"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            "user@example.com", "testpass123", name="Test"
+        )
+        self.client = APIClient()
+        self.client.credentials(
+            HTTP_AUTHORIZATION="Bearer " + tokens_for_user(self.user)["access"]
+        )
+
+    def test_user_loaded_once(self):
+        """Test only the first request reads the user from the database"""
+        self.client.get(RECIPES_URL)
+
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(user_queries(queries), [])
+
+    def test_deactivated_user_rejected(self):
+        """Test deactivating a user takes effect on the next request"""
+        self.client.get(RECIPES_URL)
+        self.user.is_active = False
+        self.user.save()
+
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_profile_update_evicts_user(self):
+        """Test updating the user through the API evicts the cached user"""
+        self.client.get(RECIPES_URL)
+        url = reverse("user:users-detail", kwargs={"pk": self.user.id})
+
+        self.client.patch(url, {"password": "newpass123"})
+
+        self.assertIsNone(cache.get(USER_KEY.format(self.user.id)))
+
+    @override_settings(AUTH_TRUST_TOKEN_CLAIMS=True)
+    def test_trusted_claims_skip_database(self):
+        """Test trusted claims authenticate without reading the user"""
+        payload = {"title": "Soup", "time_minutes": 5, "price": "1.00"}
+
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.post(RECIPES_URL, payload, format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(user_queries(queries), [])
+        self.assertEqual(self.user.recipe_set.get().title, "Soup")
+
+    @override_settings(AUTH_TRUST_TOKEN_CLAIMS=True)
+    def test_trusted_claims_need_claims(self):
+        """Test tokens minted without user claims fall back to the cache"""
+        access = RefreshToken.for_user(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {access}")
+        cache.delete(USER_KEY.format(self.user.id))
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(RECIPES_URL)
+
+        self.assertEqual(len(user_queries(queries)), 1)
@@ -0,0 +1,34 @@
+"""
+Tests for the system checks of the core app
+"""
+
+from django.core.checks import run_checks
+from django.test import SimpleTestCase, override_settings
+
+from core.checks import check_shared_cache
+
+LOCMEM = "django.core.cache.backends.locmem.LocMemCache"
+FILE_BASED = "django.core.cache.backends.filebased.FileBasedCache"
+
+
+class SharedCacheCheckTests(SimpleTestCase):
+    """Test deployments are required to share their cache"""
+
+    @override_settings(CACHES={"default": {"BACKEND": LOCMEM}})
+    def test_process_local_cache_rejected(self):
+        """Test a per-process cache fails the deploy checks"""
+        errors = run_checks(include_deployment_checks=True)
+
+        self.assertIn("core.E001", [error.id for error in errors])
+
+    @override_settings(CACHES={"default": {"BACKEND": LOCMEM}})
+    def test_not_run_outside_deploy_checks(self):
+        """Test development and test runs keep their local cache"""
+        self.assertNotIn("core.E001", [error.id for error in run_checks()])
+
+    @override_settings(
+        CACHES={"default": {"BACKEND": FILE_BASED, "LOCATION": "/tmp/cache"}}
+    )
+    def test_shared_cache_accepted(self):
+        """Test a cache all workers can reach passes"""
+        self.assertEqual(check_shared_cache(None), [])
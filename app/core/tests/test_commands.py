@@ -3,13 +3,29 @@ Test custom Django managment command
 """
 
 
+import json
+import os
+import tempfile
+from decimal import Decimal
+from io import BytesIO, StringIO
 from unittest.mock import patch
 
 from psycopg2 import OperationalError as Psycopg2Error
 
 from django.core.management import call_command
+from django.core.management.base import CommandError
 from django.db.utils import OperationalError
-from django.test import SimpleTestCase
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+from rest_framework.test import APIClient
+
+from core import images
+
+from core.models import ImportCheckpoint, Recipe, Tag, UserCounter
 
 
 @patch("core.management.commands.wait_for_db.Command.check")
@@ -39,3 +55,407 @@ class CommandTests(SimpleTestCase):
 
         self.assertEqual(patched_check.call_count, 6)
         patched_check.assert_called_with(databases=["default"])
+
+
+class BenchmarkCommandTests(TestCase):
+    """Test the benchmark command"""
+
+    def test_benchmark_batch_create(self):
+        """Test benchmark reports both strategies and leaves no data behind"""
+        out = StringIO()
+
+        call_command("benchmark", recipes=5, tags=2, stdout=out)
+
+        self.assertIn("single-create: 5 recipes", out.getvalue())
+        self.assertIn("batch-create: 5 recipes", out.getvalue())
+        self.assertFalse(Recipe.objects.exists())
+        self.assertFalse(get_user_model().objects.exists())
+
+
+class RebuildCountersCommandTests(TestCase):
+    """Test the rebuild_counters command"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            "user@example.com", "testpass123"
+        )
+        Recipe.objects.create(
+            user=self.user, title="Soup", time_minutes=5, price=Decimal("1.00")
+        )
+        UserCounter.objects.filter(user=self.user).update(recipes=7)
+
+    def test_check_reports_drift(self):
+        """Test --check fails when counters are out of sync"""
+        with self.assertRaises(CommandError):
+            call_command("rebuild_counters", check=True, stdout=StringIO())
+
+    def test_rebuild_fixes_drift(self):
+        """Test rebuilding resets counters to the real totals"""
+        call_command("rebuild_counters", stdout=StringIO())
+
+        self.assertEqual(UserCounter.objects.get(user=self.user).recipes, 1)
+        call_command("rebuild_counters", check=True, stdout=StringIO())
+
+
+class BenchmarkAuthCommandTests(TestCase):
+    """Test the benchmark_auth command"""
+
+    def test_benchmark_auth(self):
+        """Test every authentication scenario is reported"""
+        out = StringIO()
+
+        call_command("benchmark_auth", requests=5, stdout=out)
+
+        self.assertIn("jwt: 5 requests", out.getvalue())
+        self.assertIn("cached-jwt: 5 requests", out.getvalue())
+        self.assertIn("trusted-claims: 5 requests", out.getvalue())
+
+
+class LoadtestCommandTests(SimpleTestCase):
+    """Test the loadtest command"""
+
+    @patch("core.management.commands.loadtest.fetch")
+    def test_loadtest_reports_percentiles(self, patched_fetch):
+        """Test latencies and errors are reported for every URL"""
+        patched_fetch.side_effect = [(200, 0.01)] * 9 + [(500, 0.1)]
+        out = StringIO()
+
+        call_command(
+            "loadtest", "http://wsgi/api/", requests=10, concurrency=2, stdout=out
+        )
+
+        self.assertIn("http://wsgi/api/:", out.getvalue())
+        self.assertIn("p50 10.0ms", out.getvalue())
+        self.assertIn("p99 100.0ms", out.getvalue())
+        self.assertIn("1 errors", out.getvalue())
+
+
+class BenchmarkUploadCommandTests(SimpleTestCase):
+    """Test the benchmark_upload command"""
+
+    def test_benchmark_upload(self):
+        """Test the upload benchmark reports the peak memory of both paths"""
+        out = StringIO()
+
+        call_command("benchmark_upload", megapixels=0.1, stdout=out)
+
+        self.assertIn("imagefield: peak RSS", out.getvalue())
+        self.assertIn("streaming: peak RSS", out.getvalue())
+
+
+class BenchmarkSuiteCommandTests(TestCase):
+    """Test the benchmark_suite command"""
+
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        media_settings = self.settings(MEDIA_ROOT=media_root.name)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+        self.media_root = media_root.name
+
+        output = tempfile.NamedTemporaryFile(suffix=".json", delete=False)
+        output.close()
+        self.addCleanup(os.remove, output.name)
+        self.output = output.name
+
+    def run_suite(self, **options):
+        out = StringIO()
+        call_command(
+            "benchmark_suite",
+            users=2,
+            recipes=5,
+            tags=3,
+            requests=3,
+            output=self.output,
+            stdout=out,
+            **options,
+        )
+        with open(self.output) as report:
+            return json.load(report), out.getvalue()
+
+    def test_benchmark_suite_report(self):
+        """Test every endpoint is reported and no data or files are left"""
+        report, out = self.run_suite()
+
+        self.assertEqual(
+            set(report["results"]),
+            {
+                "recipe-list",
+                "recipe-search",
+                "recipe-detail",
+                "recipe-create",
+                "tag-list",
+                "image-upload",
+                "serialize-rows",
+                "serialize-instances",
+                "login",
+            },
+        )
+        for result in report["results"].values():
+            self.assertEqual(result["requests"], 3)
+            self.assertLessEqual(result["p50_ms"], result["p99_ms"])
+            self.assertGreater(result["queries"], 0)
+        self.assertEqual(report["parameters"]["recipes"], 5)
+        self.assertIn("tag-list:", out)
+        self.assertFalse(get_user_model().objects.exists())
+        self.assertFalse(Recipe.objects.exists())
+        self.assertEqual(
+            [files for _, _, files in os.walk(self.media_root) if files], []
+        )
+
+    def test_benchmark_suite_compare(self):
+        """Test a run is compared to an earlier report"""
+        self.run_suite()
+
+        _, out = self.run_suite(compare=self.output)
+
+        self.assertIn("Compared to", out)
+        self.assertIn("recipe-list: throughput", out)
+
+
+@override_settings(IMAGE_PROCESSING_MODE="sync")
+class ProcessImagesCommandTests(TestCase):
+    """Test the process_images command"""
+
+    def setUp(self):
+        user = get_user_model().objects.create_user("user@example.com", "pass123")
+        self.recipe = Recipe.objects.create(
+            user=user, title="Soup", time_minutes=5, price=Decimal("1.00")
+        )
+
+    def tearDown(self):
+        # Deleting the recipe releases its stored files.
+        with self.captureOnCommitCallbacks(execute=True):
+            self.recipe.delete()
+
+    def store_image(self, content):
+        self.recipe.image.save("photo.png", ContentFile(content), save=False)
+        self.recipe.image_status = Recipe.ImageStatus.PENDING
+        self.recipe.save()
+
+    def test_process_pending_images(self):
+        """Test pending images are processed"""
+        buffer = BytesIO()
+        Image.new("RGBA", (400, 300)).save(buffer, format="PNG")
+        self.store_image(buffer.getvalue())
+        out = StringIO()
+
+        call_command("process_images", stdout=out)
+
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.image_status, Recipe.ImageStatus.READY)
+        self.assertTrue(self.recipe.image.name.endswith("_original.png"))
+        self.assertIn("Processed 1 image(s), 0 failed", out.getvalue())
+
+    def test_unreadable_image_fails(self):
+        """Test an image Pillow cannot read is marked failed, not retried"""
+        self.store_image(b"not an image")
+
+        with self.assertLogs("core.images", "ERROR"):
+            call_command("process_images", stdout=StringIO())
+        out = StringIO()
+        call_command("process_images", stdout=out)
+
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.image_status, Recipe.ImageStatus.FAILED)
+        self.assertIn("Processed 0 image(s), 1 failed", out.getvalue())
+
+    @patch("core.images.render", side_effect=KeyError("PSD"))
+    def test_unexpected_render_error_fails(self, patched_render):
+        """Test any error while rendering marks the image failed"""
+        self.store_image(b"an image Pillow cannot write")
+
+        with self.assertLogs("core.images", "ERROR"):
+            call_command("process_images", stdout=StringIO())
+
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.image_status, Recipe.ImageStatus.FAILED)
+
+
+class GcImagesCommandTests(TestCase):
+    """Test the gc_images command"""
+
+    def setUp(self):
+        # An empty media root, so files left by other tests are not collected.
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        media_settings = self.settings(MEDIA_ROOT=media_root.name)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+
+        user = get_user_model().objects.create_user("user@example.com", "pass123")
+        self.recipe = Recipe.objects.create(
+            user=user, title="Soup", time_minutes=5, price=Decimal("1.00")
+        )
+        self.recipe.image.save("kept.jpg", ContentFile(b"kept"))
+        self.orphan = default_storage.save(
+            "uploads/recipe/00/orphan.jpg", ContentFile(b"orphan")
+        )
+
+    def tearDown(self):
+        self.recipe.image.delete()
+        default_storage.delete(self.orphan)
+
+    def test_gc_deletes_unreferenced_files(self):
+        """Test only files no recipe references are deleted"""
+        out = StringIO()
+
+        call_command("gc_images", min_age=0, stdout=out)
+
+        self.assertFalse(default_storage.exists(self.orphan))
+        self.assertTrue(default_storage.exists(self.recipe.image.name))
+        self.assertIn("Deleted 1 orphaned file(s)", out.getvalue())
+
+    def test_gc_skips_recent_files(self):
+        """Test files younger than the grace period are kept"""
+        call_command("gc_images", stdout=StringIO())
+
+        self.assertTrue(default_storage.exists(self.orphan))
+
+    def test_gc_dry_run(self):
+        """Test a dry run only lists orphans"""
+        out = StringIO()
+
+        call_command("gc_images", min_age=0, dry_run=True, stdout=out)
+
+        self.assertTrue(default_storage.exists(self.orphan))
+        self.assertIn(self.orphan, out.getvalue())
+
+
+class ImportRecipesCommandTests(TestCase):
+    """Test the import_recipes command"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user("user@example.com", "pass")
+        self.other = get_user_model().objects.create_user("other@example.com", "pass")
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def write(self, name, content):
+        path = os.path.join(self.directory, name)
+        with open(path, "w") as source:
+            source.write(content)
+        return path
+
+    def ndjson(self, *rows):
+        return "".join(json.dumps(row) + "\n" for row in rows)
+
+    def recipe(self, title, **fields):
+        return {"title": title, "time_minutes": 10, "price": "2.50", **fields}
+
+    def test_import_ndjson(self):
+        """Test rows are imported with their owners and tags"""
+        Tag.objects.create(user=self.user, name="Vegan")
+        path = self.write(
+            "recipes.ndjson",
+            self.ndjson(
+                self.recipe("Soup", tags=[{"name": "Vegan"}, {"name": "Quick"}]),
+                self.recipe("Stew", user="other@example.com", tags=["Vegan"]),
+            ),
+        )
+        out = StringIO()
+
+        call_command("import_recipes", path, user="user@example.com", stdout=out)
+
+        soup = Recipe.objects.get(title="Soup")
+        self.assertEqual(soup.user, self.user)
+        self.assertEqual(soup.price, Decimal("2.50"))
+        self.assertEqual(
+            sorted(soup.tags.values_list("name", flat=True)), ["Quick", "Vegan"]
+        )
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 2)
+        stew = Recipe.objects.get(title="Stew")
+        self.assertEqual(stew.user, self.other)
+        self.assertEqual(stew.tags.get().user, self.other)
+        self.assertEqual(UserCounter.objects.get(user=self.user).recipes, 1)
+        self.assertIn("Imported 2 recipes", out.getvalue())
+        self.assertIn("rows/s", out.getvalue())
+        self.assertFalse(ImportCheckpoint.objects.exists())
+
+    def test_import_csv_export(self):
+        """Test a CSV export of one user imports into another"""
+        client = APIClient()
+        client.force_authenticate(self.user)
+        for title in ("Soup", "Stew"):
+            recipe = Recipe.objects.create(
+                user=self.user, title=title, time_minutes=5, price=Decimal("1.25")
+            )
+            recipe.tags.add(Tag.objects.get_or_create(user=self.user, name="Hot")[0])
+        export = client.get(reverse("recipe:recipes-export"), {"format": "csv"})
+        path = self.write("recipes.csv", b"".join(export.streaming_content).decode())
+
+        call_command(
+            "import_recipes", path, user="other@example.com", stdout=StringIO()
+        )
+
+        imported = Recipe.objects.filter(user=self.other).order_by("title")
+        self.assertEqual([recipe.title for recipe in imported], ["Soup", "Stew"])
+        self.assertEqual(Tag.objects.get(user=self.other).recipe_set.count(), 2)
+
+    def test_resume_from_checkpoint(self):
+        """Test a failed import resumes after its last committed batch"""
+        rows = [self.recipe(f"Recipe {n}") for n in range(5)]
+        rows[3]["price"] = "not a price"
+        path = self.write("recipes.ndjson", self.ndjson(*rows))
+
+        with self.assertRaisesMessage(CommandError, "Row 4: price"):
+            call_command(
+                "import_recipes",
+                path,
+                user="user@example.com",
+                batch_size=2,
+                stdout=StringIO(),
+            )
+        self.assertEqual(Recipe.objects.count(), 2)
+        self.assertEqual(ImportCheckpoint.objects.get().rows, 2)
+
+        rows[3]["price"] = "3.00"
+        self.write("recipes.ndjson", self.ndjson(*rows))
+        out = StringIO()
+        call_command(
+            "import_recipes", path, user="user@example.com", batch_size=2, stdout=out
+        )
+
+        self.assertIn("after 2 rows", out.getvalue())
+        self.assertEqual(
+            sorted(Recipe.objects.values_list("title", flat=True)),
+            [f"Recipe {n}" for n in range(5)],
+        )
+        self.assertFalse(ImportCheckpoint.objects.exists())
+
+    def test_restart_ignores_checkpoint(self):
+        """Test --restart imports from the first row again"""
+        path = self.write("recipes.ndjson", self.ndjson(self.recipe("Soup")))
+        ImportCheckpoint.objects.create(name=path, rows=1)
+
+        call_command(
+            "import_recipes",
+            path,
+            user="user@example.com",
+            restart=True,
+            stdout=StringIO(),
+        )
+
+        self.assertTrue(Recipe.objects.filter(title="Soup").exists())
+
+    def test_unknown_owner(self):
+        """Test rows need a known owner"""
+        path = self.write("recipes.ndjson", self.ndjson(self.recipe("Soup")))
+
+        with self.assertRaisesMessage(CommandError, "Row 1: unknown user"):
+            call_command("import_recipes", path, stdout=StringIO())
+
+    def test_batch_size_must_be_positive(self):
+        """Test a batch size below 1 is rejected before the checkpoint is used"""
+        path = self.write("recipes.ndjson", self.ndjson(self.recipe("Soup")))
+
+        for batch_size in (0, -1):
+            with self.assertRaisesMessage(CommandError, "--batch-size"):
+                call_command(
+                    "import_recipes", path, batch_size=batch_size, stdout=StringIO()
+                )
+
+        self.assertFalse(Recipe.objects.exists())
+        self.assertFalse(ImportCheckpoint.objects.exists())
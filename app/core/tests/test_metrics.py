@@ -0,0 +1,163 @@
+"""
+Tests for the request metrics middleware and endpoint
+"""
+
+import asyncio
+import time
+from decimal import Decimal
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core import metrics
+from core.models import Recipe, Tag
+
+METRICS_URL = reverse("metrics")
+RECIPES_URL = reverse("recipe:recipes-list")
+
+
+class MetricsTests(TestCase):
+    """Test per-view request metrics"""
+
+    def setUp(self):
+        metrics.reset()
+        self.user = get_user_model().objects.create_user(
+            "user@example.com", "testpass123"
+        )
+        self.admin = get_user_model().objects.create_superuser(
+            "admin@example.com", "testpass123"
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def scrape(self):
+        self.client.force_authenticate(self.admin)
+        res = self.client.get(METRICS_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return res.content.decode()
+
+    def test_records_viewset_action(self):
+        """Test requests are labelled with their viewset action"""
+        Recipe.objects.create(
+            user=self.user, title="Soup", time_minutes=5, price=Decimal("1.00")
+        )
+        self.client.get(RECIPES_URL)
+
+        body = self.scrape()
+
+        self.assertIn('api_request_duration_seconds_count{view="recipes-list"} 1', body)
+        self.assertIn('api_db_queries_count{view="recipes-list"} 1', body)
+        self.assertIn('api_responses_total{view="recipes-list",status="200"} 1', body)
+        self.assertIn('api_response_cache_requests_total{result="miss"}', body)
+
+    def test_records_extra_actions(self):
+        """Test extra actions such as login get their own label"""
+        self.client.post(
+            reverse("user:users-login_user"),
+            {"email": "user@example.com", "password": "testpass123"},
+        )
+
+        body = self.scrape()
+
+        self.assertIn('view="users-login_user"', body)
+
+    def test_records_queries_and_serializer_time(self):
+        """Test the query count and serializer time of a request are kept"""
+        Tag.objects.create(user=self.user, name="Vegan")
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse("recipe:tags-list"))
+        histograms = {
+            name: metrics._histograms[name, "tags-list"]
+            for name in ("api_db_queries", "api_serializer_duration_seconds")
+        }
+
+        self.assertEqual(histograms["api_db_queries"].sum, len(queries))
+        self.assertGreater(histograms["api_serializer_duration_seconds"].sum, 0)
+
+    def test_endpoint_requires_admin(self):
+        """Test only admins can read the metrics"""
+        res = self.client.get(METRICS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_prometheus_format(self):
+        """Test metrics are served as Prometheus text"""
+        self.client.force_authenticate(self.admin)
+
+        res = self.client.get(METRICS_URL)
+
+        self.assertTrue(res["Content-Type"].startswith("text/plain; version=0.0.4"))
+        self.assertIn(
+            "# TYPE api_request_duration_seconds histogram", res.content.decode()
+        )
+
+    @override_settings(REQUEST_QUERY_BUDGET=1)
+    def test_logs_requests_over_budget(self):
+        """Test requests running more queries than the budget are logged"""
+        Tag.objects.create(user=self.user, name="Vegan")
+        with self.assertLogs("core.metrics", "WARNING") as logs:
+            self.client.get(reverse("recipe:tags-list"))
+
+        self.assertIn("over the budget of 1", logs.output[0])
+
+    def test_streamed_response_recorded_when_finished(self):
+        """Test a streamed response is timed, with its queries, once sent"""
+        Recipe.objects.create(
+            user=self.user, title="Soup", time_minutes=5, price=Decimal("1.00")
+        )
+        res = self.client.get(reverse("recipe:recipes-export"))
+        key = ("api_db_queries", "recipes-export")
+        self.assertNotIn(key, metrics._histograms)
+
+        with CaptureQueriesContext(connection) as queries:
+            b"".join(res.streaming_content)
+
+        self.assertEqual(metrics._histograms[key].count, 1)
+        self.assertGreaterEqual(metrics._histograms[key].sum, len(queries))
+        self.assertGreater(len(queries), 0)
+
+    def test_sum_keeps_full_precision(self):
+        """Test histogram sums are exported without rounding"""
+        metrics.observe("tags-list", 200, {"api_db_duration_seconds": 0.1234567891})
+
+        self.assertIn(
+            'api_db_duration_seconds_sum{view="tags-list"} 0.1234567891',
+            metrics.export(),
+        )
+
+
+class AsyncMetricsMiddlewareTests(TestCase):
+    """Test the middleware in the async handler"""
+
+    def setUp(self):
+        metrics.reset()
+
+    def test_async_requests_run_concurrently(self):
+        """Test async views wrapped by the middleware are not serialized"""
+
+        async def view(request):
+            await asyncio.sleep(0.2)
+            return HttpResponse("ok")
+
+        middleware = metrics.MetricsMiddleware(view)
+        self.assertTrue(asyncio.iscoroutinefunction(middleware))
+
+        async def send_requests():
+            requests = [RequestFactory().get("/") for _ in range(5)]
+            return await asyncio.gather(*map(middleware, requests))
+
+        start = time.perf_counter()
+        responses = async_to_sync(send_requests)()
+
+        self.assertLess(time.perf_counter() - start, 0.6)
+        self.assertEqual([res.status_code for res in responses], [200] * 5)
+        self.assertEqual(
+            metrics._histograms["api_request_duration_seconds", "unresolved"].count, 5
+        )
@@ -2,8 +2,14 @@
 """Test for models"""
 
 
+import hashlib
 import uuid
-from django.test import TestCase
+from unittest import skipUnless
+from django.contrib.postgres.search import SearchQuery
+from django.core.files.base import ContentFile
+from django.db import IntegrityError, connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase
 from decimal import Decimal
 from core import models
 from django.contrib.auth import get_user_model
@@ -78,3 +84,184 @@ class ModelTests(TestCase):
         file_path = models.recipe_image_file_path(None, "example.jpg")
 
         self.assertEqual(file_path, f"uploads/recipe/{uuid}.jpg")
+
+    def test_recipe_content_file_path(self):
+        """Test content-addressed image paths are derived from the bytes"""
+        content = ContentFile(b"image bytes")
+        digest = hashlib.sha256(b"image bytes").hexdigest()
+
+        file_path = models.recipe_image_content_path(content, "Photo.JPG")
+
+        self.assertEqual(file_path, f"uploads/recipe/{digest[:2]}/{digest}.jpg")
+
+    def test_user_counter_tracks_recipes_and_tags(self):
+        """Test the per-user counter follows creates, bulk creates and deletes"""
+        user = create_user()
+        recipe = models.Recipe.objects.create(
+            user=user, title="Soup", time_minutes=5, price=Decimal("1.00")
+        )
+        models.Tag.objects.bulk_create(
+            [models.Tag(user=user, name=f"tag{i}") for i in range(3)]
+        )
+        models.Tag.objects.filter(name="tag0").delete()
+
+        counter = models.UserCounter.objects.get(user=user)
+        self.assertEqual(counter.recipes, 1)
+        self.assertEqual(counter.tags, 2)
+
+        recipe.delete()
+        counter.refresh_from_db()
+        self.assertEqual(counter.recipes, 0)
+
+    def test_user_counter_recreated_when_missing(self):
+        """Test a missing counter row is rebuilt from the source tables"""
+        user = create_user()
+        models.Tag.objects.create(user=user, name="Existing")
+        models.UserCounter.objects.filter(user=user).delete()
+
+        models.Tag.objects.create(user=user, name="New")
+
+        self.assertEqual(models.UserCounter.objects.get(user=user).tags, 2)
+
+    def test_delete_user_with_recipes(self):
+        """Test deleting a user cascades without recreating its counter"""
+        user = create_user()
+        models.Recipe.objects.create(
+            user=user, title="Soup", time_minutes=5, price=Decimal("1.00")
+        )
+
+        user.delete()
+
+        self.assertFalse(models.UserCounter.objects.exists())
+
+    def test_tag_name_unique_per_user(self):
+        """Test a user cannot own two tags with the same name"""
+        user = create_user()
+        other = create_user(email="other@example.com")
+        models.Tag.objects.create(user=user, name="Vegan")
+        models.Tag.objects.create(user=other, name="Vegan")
+
+        with self.assertRaises(IntegrityError):
+            models.Tag.objects.create(user=user, name="Vegan")
+
+
+class QueryPlanTests(TestCase):
+    """Guard the indexes used by the hot recipe and tag queries"""
+
+    def setUp(self):
+        self.user = create_user()
+        with connection.cursor() as cursor:
+            if connection.vendor == "postgresql":
+                # Tiny test tables would otherwise always be sequentially scanned.
+                cursor.execute("SET LOCAL enable_seqscan = off")
+            elif connection.vendor == "sqlite":
+                cursor.execute("ANALYZE")
+
+    def assertUsesIndex(self, queryset, index_name):
+        plan = queryset.explain()
+        self.assertIn(index_name, plan, plan)
+        self.assertNotIn("TEMP B-TREE FOR ORDER BY", plan, plan)
+        self.assertNotIn("Sort", plan, plan)
+
+    def test_recipe_list_uses_user_id_index(self):
+        """Test the per-user recipe list is served in index order"""
+        queryset = models.Recipe.objects.filter(user=self.user).order_by("-id")[:100]
+
+        self.assertUsesIndex(queryset, "recipe_user_id_desc_idx")
+
+    def test_recipe_list_page_uses_user_id_index(self):
+        """Test a keyset page seeks into the index instead of offsetting"""
+        queryset = models.Recipe.objects.filter(user=self.user, id__lt=1000).order_by(
+            "-id"
+        )[:100]
+
+        self.assertUsesIndex(queryset, "recipe_user_id_desc_idx")
+
+    def test_tag_lookup_by_name_uses_unique_index(self):
+        """Test resolving tag names uses the (user, name) unique index"""
+        queryset = models.Tag.objects.filter(user=self.user, name__in=["a", "b"])
+
+        plan = queryset.explain()
+        if connection.vendor == "postgresql":
+            self.assertIn("unique_tag_name_per_user", plan, plan)
+        else:
+            self.assertRegex(
+                plan, r"USING (COVERING )?INDEX \S+ \(user_id=\? AND name=\?\)"
+            )
+
+    def test_recipe_time_range_uses_index(self):
+        """Test ?time_minutes__gte/lte ranges seek into (user, time_minutes)"""
+        queryset = models.Recipe.objects.filter(
+            user=self.user, time_minutes__gte=10, time_minutes__lte=30
+        )
+
+        self.assertIn("recipe_user_time_idx", queryset.explain())
+
+    def test_recipe_price_range_uses_index(self):
+        """Test ?price__gte/lte ranges seek into (user, price)"""
+        queryset = models.Recipe.objects.filter(
+            user=self.user, price__gte=Decimal("5"), price__lte=Decimal("10")
+        )
+
+        self.assertIn("recipe_user_price_idx", queryset.explain())
+
+    @skipUnless(connection.vendor == "postgresql", "requires PostgreSQL")
+    def test_full_text_search_uses_gin_index(self):
+        """Test ?q= searches are served by the search_vector GIN index"""
+        query = SearchQuery("curry", config="english", search_type="websearch")
+        queryset = models.Recipe.objects.filter(user=self.user, search_vector=query)
+
+        self.assertIn("recipe_search_vector_idx", queryset.explain())
+
+    @skipUnless(connection.vendor == "postgresql", "requires PostgreSQL")
+    def test_tag_prefix_uses_trigram_index(self):
+        """Test tag name prefix lookups are served by the trigram index"""
+        queryset = models.Tag.objects.filter(name__trigram_istartswith="veg")
+
+        self.assertIn("tag_name_trgm_idx", queryset.explain())
+
+    @skipUnless(connection.vendor == "postgresql", "requires PostgreSQL")
+    def test_recipe_title_prefix_uses_trigram_index(self):
+        """Test recipe title prefix lookups are served by the trigram index"""
+        queryset = models.Recipe.objects.filter(title__trigram_istartswith="sou")
+
+        self.assertIn("recipe_title_trgm_idx", queryset.explain())
+
+
+class MergeDuplicateTagsMigrationTests(TransactionTestCase):
+    """Test duplicate tags are merged before the unique constraint is added"""
+
+    before = [("core", "0008_trigram_indexes")]
+    after = [("core", "0010_recipe_user_index_unique_tag_name")]
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_duplicates_merged_into_oldest_tag(self):
+        """Test recipe links of duplicate tags move to the oldest one"""
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.before)
+        apps = executor.loader.project_state(self.before).apps
+        user = apps.get_model("core", "User").objects.create(email="u@example.com")
+        Tag = apps.get_model("core", "Tag")
+        Recipe = apps.get_model("core", "Recipe")
+        kept, *duplicates = [Tag.objects.create(user=user, name="Vegan") for _ in "abc"]
+        soup, stew = [
+            Recipe.objects.create(user=user, title=title, time_minutes=5, price=1)
+            for title in ("Soup", "Stew")
+        ]
+        soup.tags.add(kept, duplicates[0])
+        stew.tags.add(duplicates[1])
+
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(self.after)
+        apps = executor.loader.project_state(self.after).apps
+        Tag = apps.get_model("core", "Tag")
+        Recipe = apps.get_model("core", "Recipe")
+
+        self.assertEqual(list(Tag.objects.values_list("id", flat=True)), [kept.id])
+        links = Recipe.tags.through.objects.values_list("recipe_id", "tag_id")
+        self.assertEqual(set(links), {(soup.id, kept.id), (stew.id, kept.id)})
@@ -0,0 +1,121 @@
+"""
+Tests for the JSON renderers
+"""
+
+import datetime
+from collections import OrderedDict
+from decimal import Decimal
+from unittest.mock import patch
+
+from django.test import SimpleTestCase
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+from rest_framework.renderers import JSONRenderer
+
+from core.renderers import (
+    CSVRenderer,
+    FastJSONRenderer,
+    NDJSONRenderer,
+    stream_json,
+)
+
+SAMPLE = OrderedDict(
+    [
+        ("id", 1),
+        ("title", "Crème brûlée\u2028\u2029"),
+        ("price", Decimal("5.25")),
+        ("created", datetime.datetime(2024, 1, 2, 3, 4, 5, 678901, timezone.utc)),
+        ("day", datetime.date(2024, 1, 2)),
+        ("message", gettext_lazy("This field is required.")),
+        ("variants", {1: {"jpg": "a.jpg"}}),
+        ("tags", [{"id": 2, "name": "Vegan"}]),
+        ("link", None),
+    ]
+)
+
+
+class FastJSONRendererTests(SimpleTestCase):
+    """Test FastJSONRenderer renders exactly like JSONRenderer"""
+
+    def test_same_bytes_as_json_renderer(self):
+        """Test orjson output matches DRF's renderer byte for byte"""
+        self.assertEqual(
+            FastJSONRenderer().render(SAMPLE), JSONRenderer().render(SAMPLE)
+        )
+
+    def test_falls_back_without_orjson(self):
+        """Test the renderer works when orjson is not installed"""
+        with patch("core.renderers.orjson", None):
+            rendered = FastJSONRenderer().render(SAMPLE)
+
+        self.assertEqual(rendered, JSONRenderer().render(SAMPLE))
+
+    def test_indented_output(self):
+        """Test indentation requested by the client is honoured"""
+        rendered = FastJSONRenderer().render(
+            {"id": 1}, "application/json; indent=2", {}
+        )
+
+        self.assertEqual(rendered, b'{\n  "id": 1\n}')
+
+    def test_none_renders_empty(self):
+        """Test empty responses have an empty body"""
+        self.assertEqual(FastJSONRenderer().render(None), b"")
+
+
+class StreamJSONTests(SimpleTestCase):
+    """Test rendering JSON arrays in chunks"""
+
+    def test_chunks_join_to_array(self):
+        """Test the chunks form the same array as rendering it at once"""
+        items = [{"id": n, "price": Decimal(n) / 4} for n in range(7)]
+
+        chunks = list(stream_json(iter(items), chunk_size=3))
+
+        self.assertEqual(len(chunks), 4)
+        self.assertEqual(b"".join(chunks), FastJSONRenderer().render(items))
+
+    def test_empty_array(self):
+        """Test an empty iterable streams an empty array"""
+        self.assertEqual(b"".join(stream_json(iter([]))), b"[]")
+
+
+class NDJSONRendererTests(SimpleTestCase):
+    """Test rendering newline-delimited JSON"""
+
+    def test_one_line_per_item(self):
+        """Test every item is rendered on its own line"""
+        items = [{"id": 1, "price": Decimal("1.50")}, {"id": 2, "price": None}]
+
+        rendered = b"".join(NDJSONRenderer().stream(iter(items), chunk_size=1))
+
+        self.assertEqual(rendered, b'{"id":1,"price":1.5}\n{"id":2,"price":null}\n')
+
+    def test_error_renders_single_line(self):
+        """Test a non-list response, such as an error, is one line"""
+        rendered = NDJSONRenderer().render({"detail": "Not found."})
+
+        self.assertEqual(rendered, b'{"detail":"Not found."}\n')
+
+
+class CSVRendererTests(SimpleTestCase):
+    """Test rendering CSV"""
+
+    def test_header_and_rows(self):
+        """Test the header comes once and nested tags are joined by name"""
+        items = [
+            {"id": n, "title": f"Soup, {n}", "link": None, "tags": [{"name": "A"}]}
+            for n in range(3)
+        ]
+
+        rendered = b"".join(CSVRenderer().stream(iter(items), chunk_size=2))
+
+        self.assertEqual(
+            rendered.decode().splitlines(),
+            [
+                "id,title,link,tags",
+                '0,"Soup, 0",,A',
+                '1,"Soup, 1",,A',
+                '2,"Soup, 2",,A',
+            ],
+        )
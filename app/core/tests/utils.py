@@ -0,0 +1,21 @@
+"""Helpers shared by the API tests"""
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+
+class QueryBudgetMixin:
+    """Assert that an endpoint stays within a fixed number of queries"""
+
+    def assertQueryBudget(self, budget, method, url, **kwargs):
+        """Call url with the test client and fail if it runs > budget queries"""
+        with CaptureQueriesContext(connection) as context:
+            response = getattr(self.client, method)(url, **kwargs)
+
+        queries = "\n".join(query["sql"] for query in context.captured_queries)
+        self.assertLessEqual(
+            len(context),
+            budget,
+            f"{method.upper()} {url} ran {len(context)} queries:\n{queries}",
+        )
+        return response
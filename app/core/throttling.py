@@ -0,0 +1,67 @@
+"""
+Token-bucket throttling of failed logins, stored in the cache
+
+Every failed attempt takes a token from the bucket of the client IP and from
+the bucket of the email it tried; while either is empty further attempts are
+answered with 429 before any password is hashed. Successful logins are free,
+so a load test with valid credentials is never throttled.
+"""
+
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.throttling import BaseThrottle
+
+BUCKET_KEY = "throttle:login:{}:{}"
+
+
+class TokenBucket:
+    """A bucket of `capacity` tokens refilled at `rate` tokens per second"""
+
+    def __init__(self, scope, ident, capacity, rate):
+        ident = hashlib.md5(ident.encode()).hexdigest()
+        self.key = BUCKET_KEY.format(scope, ident)
+        self.capacity = capacity
+        self.rate = rate
+
+    def tokens(self, now):
+        tokens, updated = cache.get(self.key, (self.capacity, now))
+        return min(self.capacity, tokens + (now - updated) * self.rate)
+
+    def wait(self, now):
+        """Return the seconds until a token is available, 0 if one is"""
+        return max(0, (1 - self.tokens(now)) / self.rate)
+
+    def consume(self, now):
+        timeout = self.capacity / self.rate
+        cache.set(self.key, (max(0, self.tokens(now) - 1), now), timeout)
+
+
+class LoginThrottle(BaseThrottle):
+    """Reject login attempts once failures emptied the IP or email bucket"""
+
+    def buckets(self, request):
+        idents = {
+            "ip": self.get_ident(request),
+            "email": str(request.data.get("email", "")).strip().lower(),
+        }
+        return [
+            TokenBucket(scope, idents[scope], **params)
+            for scope, params in settings.LOGIN_THROTTLE_BUCKETS.items()
+        ]
+
+    def allow_request(self, request, view):
+        now = time.time()
+        self.delay = max(bucket.wait(now) for bucket in self.buckets(request))
+        return self.delay == 0
+
+    def wait(self):
+        return self.delay
+
+    def failed(self, request):
+        """Take a token from every bucket of a failed login attempt"""
+        now = time.time()
+        for bucket in self.buckets(request):
+            bucket.consume(now)
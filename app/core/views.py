@@ -0,0 +1,24 @@
+"""
+Operational endpoints of the API
+"""
+
+from rest_framework.decorators import (
+    api_view,
+    permission_classes,
+    renderer_classes,
+)
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+
+from core import metrics
+from core.renderers import PrometheusRenderer
+
+
+@api_view(["GET"])
+@permission_classes([IsAdminUser])
+@renderer_classes([PrometheusRenderer])
+def metrics_view(request):
+    """Export the request metrics of this process for Prometheus"""
+    return Response(
+        metrics.export(), content_type="text/plain; version=0.0.4; charset=utf-8"
+    )
@@ -0,0 +1,131 @@
+"""
+Facet counts of recipe search results
+
+Every requested facet is one grouped SELECT over the ids of the filtered
+recipes; they are combined with UNION ALL, so a facet panel costs a single
+query. Rows are (facet, bucket, label, count): tags group by tag id and
+name, ranges by the index of the bucket a value falls into. Results are
+cached under the user's data version, so they expire with any change to
+the user's recipes or tags, and are shared by every page of one search.
+"""
+
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache as django_cache
+from django.db.models import Case, CharField, Count, F, IntegerField, Value, When
+from rest_framework.exceptions import ValidationError
+
+from core import cache
+from core.models import Recipe
+
+FACETS_PARAM = "facets"
+# Query parameters that change the page, not the matching recipes.
+PAGE_PARAMS = {"cursor", "page_size", "ordering", "total", "format", FACETS_PARAM}
+
+
+def requested_facets(request):
+    """Return the facet names listed in ?facets=, in a stable order"""
+    names = [
+        name.strip()
+        for name in request.query_params.get(FACETS_PARAM, "").split(",")
+        if name.strip()
+    ]
+    unknown = set(names) - {"tags", *settings.RECIPE_FACET_BUCKETS}
+    if unknown:
+        raise ValidationError(
+            {FACETS_PARAM: [f"Unknown facet: {', '.join(sorted(unknown))}."]}
+        )
+    return sorted(set(names))
+
+
+def _tag_counts(ids):
+    return (
+        Recipe.tags.through.objects.filter(recipe_id__in=ids)
+        .annotate(
+            facet=Value("tags", output_field=CharField()),
+            bucket=F("tag_id"),
+            label=F("tag__name"),
+        )
+        .values("facet", "bucket", "label")
+        .annotate(count=Count("recipe_id"))
+        .order_by()
+    )
+
+
+def _range_counts(ids, field, bounds):
+    bucket = Case(
+        *[
+            When(**{f"{field}__lt": bound}, then=Value(index))
+            for index, bound in enumerate(bounds)
+        ],
+        default=Value(len(bounds)),
+        output_field=IntegerField(),
+    )
+    return (
+        Recipe.objects.filter(id__in=ids)
+        .annotate(
+            facet=Value(field, output_field=CharField()),
+            bucket=bucket,
+            label=Value("", output_field=CharField()),
+        )
+        .values("facet", "bucket", "label")
+        .annotate(count=Count("id"))
+        .order_by()
+    )
+
+
+def count_facets(queryset, names):
+    """Return {facet: [...]} counts for the recipes matching queryset"""
+    ids = queryset.order_by().values("id")
+    bounds = settings.RECIPE_FACET_BUCKETS
+    queries = [
+        _tag_counts(ids) if name == "tags" else _range_counts(ids, name, bounds[name])
+        for name in names
+    ]
+    rows = queries[0].union(*queries[1:], all=True) if len(queries) > 1 else queries[0]
+
+    counts = {name: {} for name in names}
+    for row in rows:
+        counts[row["facet"]][row["bucket"]] = row
+    facets = {}
+    for name in names:
+        if name == "tags":
+            tags = sorted(
+                counts[name].values(), key=lambda row: (-row["count"], row["label"])
+            )
+            facets[name] = [
+                {"id": row["bucket"], "name": row["label"], "count": row["count"]}
+                for row in tags
+            ]
+            continue
+        edges = [0, *bounds[name], None]
+        facets[name] = [
+            {
+                "min": edges[index],
+                "max": edges[index + 1],
+                "count": counts[name].get(index, {}).get("count", 0),
+            }
+            for index in range(len(edges) - 1)
+        ]
+    return facets
+
+
+def get_facets(request, queryset):
+    """Return the facets requested by ?facets= for queryset, or None"""
+    names = requested_facets(request)
+    if not names:
+        return None
+    params = sorted(
+        (name, value)
+        for name, value in request.query_params.lists()
+        if name not in PAGE_PARAMS
+    )
+    digest = hashlib.md5(repr([names, params]).encode()).hexdigest()
+    user_id = request.user.id
+    key = f"facets:{user_id}:{cache.get_version(user_id)}:{digest}"
+    facets = django_cache.get(key)
+    if facets is None:
+        facets = count_facets(queryset, names)
+        django_cache.set(key, facets, settings.RESPONSE_CACHE_TIMEOUT)
+    return facets
@@ -0,0 +1,122 @@
+"""Filter backends for the recipe API"""
+
+import django_filters
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db.models import Count, F, IntegerField, Q, Value
+from django.db.models.functions import Cast
+from rest_framework import filters
+
+from core import search
+from core.models import Recipe
+
+
+class FullTextSearchFilter(filters.BaseFilterBackend):
+    """Ranked full-text search over recipe title, tags and description
+
+    Matches are annotated with an integer `rank` so cursor pagination can
+    compare positions exactly. Without PostgreSQL every search term has to
+    appear in the title, description or a tag name and all ranks are equal.
+    """
+
+    search_param = "q"
+    rank_scale = 1000000
+
+    def get_search_terms(self, request):
+        return request.query_params.get(self.search_param, "").strip()
+
+    def filter_queryset(self, request, queryset, view):
+        terms = self.get_search_terms(request)
+        if not terms:
+            return queryset
+
+        if search.uses_full_text_search():
+            query = SearchQuery(
+                terms, config=search.SEARCH_CONFIG, search_type="websearch"
+            )
+            rank = SearchRank(F("search_vector"), query) * self.rank_scale
+            return queryset.filter(search_vector=query).annotate(
+                rank=Cast(rank, IntegerField())
+            )
+
+        matches = Recipe.objects.all()
+        for term in terms.split():
+            matches = matches.filter(
+                Q(title__icontains=term)
+                | Q(description__icontains=term)
+                | Q(tags__name__icontains=term)
+            )
+        return queryset.filter(id__in=matches.values("id")).annotate(
+            rank=Value(0, IntegerField())
+        )
+
+
+class RecipeOrderingFilter(filters.OrderingFilter):
+    """Ordering filter that sorts full-text matches by rank by default"""
+
+    def get_ordering(self, request, queryset, view):
+        if not request.query_params.get(self.ordering_param) and (
+            FullTextSearchFilter().get_search_terms(request)
+        ):
+            return ["-rank", "-id"]
+        return super().get_ordering(request, queryset, view)
+
+
+class TagOrderingFilter(filters.OrderingFilter):
+    """Ordering filter that breaks ties by id, so pages never overlap"""
+
+    def get_ordering(self, request, queryset, view):
+        ordering = super().get_ordering(request, queryset, view)
+        if ordering and not {"id", "-id"} & set(ordering):
+            ordering = [*ordering, "id"]
+        return ordering
+
+
+class NumberInFilter(django_filters.BaseInFilter, django_filters.NumberFilter):
+    pass
+
+
+class RecipeFilter(django_filters.FilterSet):
+    """Filters of the recipe list
+
+    `?tags=1,2` matches recipes with any of the tags, or all of them with
+    `&tags_match=all`. Both are a single subquery on the recipe-tag table,
+    grouped with HAVING COUNT for all, so the number of tags never adds
+    joins. Ranges use `time_minutes__gte/lte` and `price__gte/lte`.
+    """
+
+    tags = NumberInFilter(method="filter_tags")
+    tags_match = django_filters.ChoiceFilter(
+        choices=[("any", "any"), ("all", "all")], method="filter_tags_match"
+    )
+    has_image = django_filters.BooleanFilter(method="filter_has_image")
+
+    class Meta:
+        model = Recipe
+        fields = {
+            "user": ["exact"],
+            "time_minutes": ["gte", "lte"],
+            "price": ["gte", "lte"],
+        }
+
+    def filter_tags(self, queryset, name, value):
+        tag_ids = set(value)
+        if not tag_ids:
+            return queryset
+        links = Recipe.tags.through.objects.filter(tag_id__in=tag_ids)
+        if self.form.cleaned_data.get("tags_match") == "all":
+            links = (
+                links.values("recipe_id")
+                .annotate(matched=Count("tag_id"))
+                .filter(matched=len(tag_ids))
+            )
+        return queryset.filter(id__in=links.values("recipe_id"))
+
+    def filter_tags_match(self, queryset, name, value):
+        # Read by filter_tags.
+        return queryset
+
+    def filter_has_image(self, queryset, name, value):
+        if value is None:
+            return queryset
+        no_image = Q(image__isnull=True) | Q(image="")
+        return queryset.exclude(no_image) if value else queryset.filter(no_image)
@@ -0,0 +1,137 @@
+"""Viewset mixins for the recipe API"""
+
+import hashlib
+
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
+from rest_framework.response import Response
+
+from core import cache
+
+VALIDATORS = ["ETag", "Last-Modified"]
+
+
+def make_etag(*parts):
+    """Return a strong ETag derived from the given parts"""
+    digest = hashlib.md5(":".join(map(str, parts)).encode()).hexdigest()
+    return quote_etag(digest)
+
+
+def not_modified(request, headers):
+    """Return a 304 response if request is satisfied by the given validators"""
+    last_modified = parse_http_date_safe(headers.get("Last-Modified", ""))
+    response = get_conditional_response(
+        request, etag=headers.get("ETag"), last_modified=last_modified
+    )
+    if response is not None:
+        for name, value in headers.items():
+            response[name] = value
+    return response
+
+
+class CachedResponseMixin:
+    """Serve list and retrieve from the per-user versioned response cache
+
+    Entries keep the validators of the response, so cache hits answer
+    conditional requests without running the rest of the view.
+    """
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(super().retrieve, request, *args, **kwargs)
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        scope = f"{self.basename}-{self.action}-{request.accepted_renderer.format}"
+        key = cache.response_key(request, scope)
+        entry = cache.get_response(key)
+        if entry is not None:
+            response = not_modified(request, entry["headers"])
+            if response is None:
+                response = Response(entry["data"], headers=entry["headers"])
+            response["X-Cache"] = "HIT"
+            return response
+
+        response = handler(request, *args, **kwargs)
+        if response.status_code == 200:
+            headers = {name: response[name] for name in VALIDATORS if name in response}
+            cache.set_response(key, {"data": response.data, "headers": headers})
+        response["X-Cache"] = "MISS"
+        return response
+
+
+class ConditionalResponseMixin:
+    """Strong ETag and Last-Modified validators, checked before serializing
+
+    Lists are validated against the per-user data version, single objects
+    against their updated_at, which also guards PUT and PATCH via If-Match.
+    """
+
+    def list(self, request, *args, **kwargs):
+        version = self.get_list_version(request)
+        etag = self.make_etag(request, version, request.get_full_path())
+        return self.conditional_response(
+            super().list, etag, version // 10**9, request, *args, **kwargs
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        updated_at = self.get_object_updated_at()
+        if updated_at is None:
+            return super().retrieve(request, *args, **kwargs)
+        etag = self.object_etag(request, updated_at)
+        return self.conditional_response(
+            super().retrieve,
+            etag,
+            int(updated_at.timestamp()),
+            request,
+            *args,
+            **kwargs,
+        )
+
+    def update(self, request, *args, **kwargs):
+        updated_at = self.get_object_updated_at()
+        if updated_at is not None and "HTTP_IF_MATCH" in request.META:
+            etag = self.object_etag(request, updated_at)
+            response = get_conditional_response(request, etag=etag)
+            if response is not None:
+                return response
+
+        response = super().update(request, *args, **kwargs)
+        if response.status_code == 200:
+            updated_at = self.get_object_updated_at()
+            response["ETag"] = self.object_etag(request, updated_at)
+            response["Last-Modified"] = http_date(updated_at.timestamp())
+        return response
+
+    def get_list_version(self, request):
+        return cache.get_version(request.user.id)
+
+    def get_object_updated_at(self):
+        """Return updated_at of the requested object without loading it"""
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        queryset = self.get_queryset().prefetch_related(None)
+        return (
+            queryset.filter(**{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+            .values_list("updated_at", flat=True)
+            .first()
+        )
+
+    def object_etag(self, request, updated_at):
+        return self.make_etag(request, updated_at.isoformat(), self.kwargs)
+
+    def make_etag(self, request, *parts):
+        return make_etag(*parts, self.basename, request.accepted_renderer.format)
+
+    def conditional_response(
+        self, handler, etag, last_modified, request, *args, **kwargs
+    ):
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if response is None:
+            response = handler(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            response["ETag"] = etag
+            response["Last-Modified"] = http_date(last_modified)
+        return response
@@ -4,8 +4,64 @@
 from dataclasses import fields
 from pyexpat import model
 import re
+from django.db import connection, models
+from django.utils import timezone
 from rest_framework import serializers
+from core import images
 from core.models import Recipe, Tag
+from core.signals import recipes_changed
+from core.uploads import StreamedImageField
+
+# Fields whose representation of a database value is the value itself.
+PLAIN_FIELDS = (
+    serializers.BooleanField,
+    serializers.CharField,
+    serializers.IntegerField,
+)
+
+
+class RowListSerializer(serializers.ListSerializer):
+    """List serializer that also renders values() rows, without per-field dispatch
+
+    List views hand it dicts holding every column of the child's fields, and
+    only fields that change a value's JSON form (e.g. DecimalField) have
+    their to_representation() called, so the output is identical to that of
+    model instances. Nested lists come from related_rows(). Model instances
+    are serialized as usual.
+    """
+
+    def to_representation(self, data):
+        rows = list(data.all() if isinstance(data, models.Manager) else data)
+        if not rows or not isinstance(rows[0], dict):
+            return super().to_representation(rows)
+
+        converters = {}
+        for name, field in self.child.fields.items():
+            if field.write_only:
+                continue
+            if isinstance(field, serializers.ListSerializer):
+                related = self.related_rows(name, rows)
+                converters[name] = lambda row, related=related: related.get(
+                    row["id"], []
+                )
+            elif isinstance(field, PLAIN_FIELDS):
+                converters[name] = None
+            else:
+                converters[name] = lambda row, field=field, name=name: (
+                    None if row[name] is None else field.to_representation(row[name])
+                )
+
+        return [
+            {
+                name: row[name] if convert is None else convert(row)
+                for name, convert in converters.items()
+            }
+            for row in rows
+        ]
+
+    def related_rows(self, name, rows):
+        """Return {id: [item, ...]} of the nested field name for the rows"""
+        raise NotImplementedError(f"{type(self).__name__} cannot render {name}")
 
 
 class TagSerializer(serializers.ModelSerializer):
@@ -15,6 +71,61 @@ class TagSerializer(serializers.ModelSerializer):
         model = Tag
         fields = ["id", "name"]
         read_only_fields = ["id"]
+        list_serializer_class = RowListSerializer
+
+
+class TagListSerializer(TagSerializer):
+    """Serializer for listed tags, with how many of the user's recipes use them"""
+
+    recipe_count = serializers.IntegerField(read_only=True)
+
+    class Meta(TagSerializer.Meta):
+        fields = TagSerializer.Meta.fields + ["recipe_count"]
+        read_only_fields = ["id", "recipe_count"]
+
+
+class RecipeListSerializer(RowListSerializer):
+    """Bulk create and update for lists of recipes"""
+
+    def related_rows(self, name, rows):
+        if name != "tags":
+            return super().related_rows(name, rows)
+        # The same join as prefetching recipe tags, so tags keep their order.
+        tags = Tag.objects.filter(recipe__id__in=[row["id"] for row in rows])
+        by_recipe = {}
+        for recipe_id, tag_id, tag_name in tags.values_list("recipe__id", "id", "name"):
+            by_recipe.setdefault(recipe_id, []).append({"id": tag_id, "name": tag_name})
+        return by_recipe
+
+    def create(self, validated_data):
+        tag_lists = [attrs.pop("tags", []) for attrs in validated_data]
+        recipes = [Recipe(**attrs) for attrs in validated_data]
+        if connection.features.can_return_rows_from_bulk_insert:
+            Recipe.objects.bulk_create(recipes)
+        else:
+            for recipe in recipes:
+                recipe.save()
+        self.child._set_tags(recipes, tag_lists)
+        return recipes
+
+    def update(self, instances, validated_data):
+        fields = set()
+        tagged, tag_lists = [], []
+        now = timezone.now()
+        for recipe, attrs in zip(instances, validated_data):
+            # bulk_update() bypasses auto_now.
+            recipe.updated_at = now
+            if "tags" in attrs:
+                tagged.append(recipe)
+                tag_lists.append(attrs.pop("tags"))
+            for attr, value in attrs.items():
+                setattr(recipe, attr, value)
+                fields.add(attr)
+        Recipe.objects.bulk_update(instances, fields | {"updated_at"})
+        if fields:
+            recipes_changed.send(sender=Recipe, recipes=instances, fields=fields)
+        self.child._set_tags(tagged, tag_lists, replace=True)
+        return instances
 
 
 class RecipeSerializer(serializers.ModelSerializer):
@@ -26,41 +137,119 @@ class RecipeSerializer(serializers.ModelSerializer):
         model = Recipe
         fields = ["id", "title", "time_minutes", "price", "link", "tags"]
         read_only_fields = ["id"]
+        list_serializer_class = RecipeListSerializer
 
-    def _get_or_create_tags(self, tags, recipe):
+    def _get_or_create_tags(self, tags):
+        """Return the user's tags for the payload, creating missing ones in bulk"""
         auth_user = self.context["request"].user
-        for tag in tags:
-            tag_obj, created = Tag.objects.get_or_create(user=auth_user, **tag)
-            recipe.tags.add(tag_obj)
+        names = list(dict.fromkeys(tag["name"] for tag in tags))
+        if not names:
+            return []
+
+        existing = {
+            tag.name: tag for tag in Tag.objects.filter(user=auth_user, name__in=names)
+        }
+
+        missing = [
+            Tag(user=auth_user, name=name) for name in names if name not in existing
+        ]
+        if missing:
+            # Concurrent writers may insert the same names; the unique
+            # (user, name) constraint makes the losers skip their rows.
+            Tag.objects.bulk_create(missing, ignore_conflicts=True)
+            created = Tag.objects.filter(
+                user=auth_user, name__in=[tag.name for tag in missing]
+            )
+            for tag in created:
+                existing[tag.name] = tag
+
+        return [existing[name] for name in names]
+
+    def _set_tags(self, recipes, tag_lists, replace=False):
+        """Link each recipe to its tags using bulk writes on the through table"""
+        tag_objs = self._get_or_create_tags([tag for tags in tag_lists for tag in tags])
+        by_name = {tag.name: tag for tag in tag_objs}
+        through = Recipe.tags.through
+
+        current = {}
+        if replace:
+            links = through.objects.filter(
+                recipe_id__in=[recipe.id for recipe in recipes]
+            ).values_list("id", "recipe_id", "tag_id")
+            for link_id, recipe_id, tag_id in links:
+                current.setdefault(recipe_id, {})[tag_id] = link_id
+
+        stale, new_links = [], []
+        for recipe, tags in zip(recipes, tag_lists):
+            existing = current.get(recipe.id, {})
+            wanted = dict.fromkeys(by_name[tag["name"]].id for tag in tags)
+            stale += [
+                link_id for tag_id, link_id in existing.items() if tag_id not in wanted
+            ]
+            new_links += [
+                through(recipe_id=recipe.id, tag_id=tag_id)
+                for tag_id in wanted
+                if tag_id not in existing
+            ]
+
+        if stale:
+            through.objects.filter(id__in=stale).delete()
+        if new_links:
+            through.objects.bulk_create(new_links)
+        if stale or new_links:
+            recipes_changed.send(sender=Recipe, recipes=recipes, fields={"tags"})
 
     def create(self, validated_data):
         """Create a recipe"""
         tags = validated_data.pop("tags", [])
         recipe = Recipe.objects.create(**validated_data)
-        self._get_or_create_tags(tags, recipe)
+        self._set_tags([recipe], [tags])
         return recipe
 
     def update(self, instance, validated_data):
         tags = validated_data.pop("tags", None)
         if tags is not None:
-            instance.tags.clear()
-            self._get_or_create_tags(tags, instance)
+            self._set_tags([instance], [tags], replace=True)
         for attr, value in validated_data.items():
             setattr(instance, attr, value)
         instance.save()
         return instance
 
 
-class RecipeDetailSerializer(RecipeSerializer):
+class RecipeExportSerializer(RecipeSerializer):
+    """Serializer for exported recipes, rendered from values() rows"""
+
     class Meta(RecipeSerializer.Meta):
         fields = RecipeSerializer.Meta.fields + ["description"]
 
 
+class ImageVariantsField(serializers.SerializerMethodField):
+    """URLs of the processed variants of a recipe image, by label and format"""
+
+    def to_representation(self, recipe):
+        return images.variant_urls(recipe, self.context.get("request"))
+
+
+class RecipeDetailSerializer(RecipeSerializer):
+    image_variants = ImageVariantsField()
+
+    class Meta(RecipeSerializer.Meta):
+        fields = RecipeSerializer.Meta.fields + [
+            "description",
+            "image",
+            "image_status",
+            "image_variants",
+        ]
+        read_only_fields = ["id", "image", "image_status"]
+
+
 class RecipeImageSerializer(serializers.ModelSerializer):
     """Serializer for uploading images to recipes"""
 
+    image = StreamedImageField(required=True)
+    image_variants = ImageVariantsField()
+
     class Meta:
         model = Recipe
-        fields = ["id", "image"]
-        read_only_fields = ["id"]
-        extra_kwargs = {"image": {"required": "True"}}
+        fields = ["id", "image", "image_status", "image_variants"]
+        read_only_fields = ["id", "image_status"]
@@ -0,0 +1,197 @@
+"""
+Tests for the async read paths of the ASGI deployment
+"""
+
+import json
+from decimal import Decimal
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.signals import request_started
+from django.db import close_old_connections, connection
+from django.test import AsyncClient, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+
+from core.authentication import tokens_for_user
+from core.handlers import ASGIHandler
+from core.models import Recipe
+
+RECIPES_URL = "/api/v1/recipes/"
+TAGS_URL = "/api/v1/recipes/tags/"
+EXPORT_URL = "/api/v1/recipes/export/"
+
+
+def detail_url(recipe_id):
+    return f"/api/v1/recipes/{recipe_id}/"
+
+
+@override_settings(ROOT_URLCONF="app.urls_async")
+class AsyncReadViewTests(TestCase):
+    """Test the async views serve reads like the sync viewsets"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            "user@example.com", "testpass123"
+        )
+        self.recipe = Recipe.objects.create(
+            user=self.user, title="Soup", time_minutes=10, price=Decimal("2.50")
+        )
+        self.client = AsyncClient()
+        self.authorization = "Bearer " + tokens_for_user(self.user)["access"]
+
+    def request(self, method, url, headers=None, **kwargs):
+        """Send a request through the ASGI handler, returning the response
+
+        AsyncClient takes raw header names, e.g. {"if-none-match": etag}.
+        """
+        headers = {"authorization": self.authorization, **(headers or {})}
+
+        async def send():
+            return await getattr(self.client, method)(url, **kwargs, **headers)
+
+        return async_to_sync(send)()
+
+    def test_routes_resolve_to_async_views(self):
+        """Test the async URL configuration keeps the regular route names"""
+        self.assertEqual(reverse("recipe:recipes-list"), RECIPES_URL)
+
+    def test_list_hit_without_queries(self):
+        """Test a cached list is served on the event loop without queries"""
+        first = self.request("get", RECIPES_URL)
+        with CaptureQueriesContext(connection) as context:
+            second = self.request("get", RECIPES_URL)
+
+        self.assertEqual(len(context), 0)
+        self.assertEqual(first["X-Cache"], "MISS")
+        self.assertEqual(second["X-Cache"], "HIT")
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(first["ETag"], second["ETag"])
+        self.assertEqual(second["Content-Type"], "application/json")
+
+    def test_detail_not_modified_without_queries(self):
+        """Test a conditional detail request is answered from the cache"""
+        first = self.request("get", detail_url(self.recipe.id))
+        with CaptureQueriesContext(connection) as context:
+            again = self.request(
+                "get",
+                detail_url(self.recipe.id),
+                headers={"if-none-match": first["ETag"]},
+            )
+
+        self.assertEqual(len(context), 0)
+        self.assertEqual(again.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(again["ETag"], first["ETag"])
+
+    def test_tags_not_modified_without_queries(self):
+        """Test an unchanged tag list returns 304 without queries"""
+        first = self.request("get", TAGS_URL)
+        with CaptureQueriesContext(connection) as context:
+            again = self.request(
+                "get", TAGS_URL, headers={"if-none-match": first["ETag"]}
+            )
+
+        self.assertEqual(len(context), 0)
+        self.assertEqual(again.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_browsable_api_delegated(self):
+        """Test HTML requests are rendered by the viewset, not the cache"""
+        self.request("get", RECIPES_URL)
+
+        res = self.request("get", RECIPES_URL, headers={"accept": "text/html"})
+
+        self.assertEqual(res["X-Cache"], "MISS")
+        self.assertTrue(res["Content-Type"].startswith("text/html"))
+
+    def test_unauthenticated_delegated(self):
+        """Test requests without a known user get the viewset's 401"""
+        res = self.request("get", RECIPES_URL, {"authorization": ""})
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_malformed_authorization_delegated(self):
+        """Test a malformed Authorization header gets the viewset's 401"""
+        for url in (RECIPES_URL, TAGS_URL):
+            res = self.request("get", url, {"authorization": "Bearer a b"})
+
+            self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_writes_delegated(self):
+        """Test writes on the async routes go through the viewset"""
+        self.request("get", RECIPES_URL)
+        payload = {"title": "Stew", "time_minutes": 30, "price": "4.00"}
+
+        created = self.request(
+            "post", RECIPES_URL, data=payload, content_type="application/json"
+        )
+        res = self.request("get", RECIPES_URL)
+
+        self.assertEqual(created.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(res["X-Cache"], "MISS")
+        self.assertEqual(len(res.json()["results"]), 2)
+
+    def test_tag_write_changes_etag(self):
+        """Test creating a tag invalidates the tag list ETag"""
+        first = self.request("get", TAGS_URL)
+        self.request(
+            "post", TAGS_URL, data={"name": "Vegan"}, content_type="application/json"
+        )
+
+        res = self.request("get", TAGS_URL, headers={"if-none-match": first["ETag"]})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.json()["results"][0]["name"], "Vegan")
+
+
+@override_settings(ROOT_URLCONF="app.urls_async")
+class ASGIHandlerTests(TestCase):
+    """Test the ASGI handler the deployment serves the API with"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            "user@example.com", "testpass123"
+        )
+        Recipe.objects.create(
+            user=self.user, title="Soup", time_minutes=10, price=Decimal("2.50")
+        )
+        self.authorization = "Bearer " + tokens_for_user(self.user)["access"]
+
+    def send_request(self, path):
+        """Run a GET through the handler, returning the ASGI messages it sent"""
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": "GET",
+            "scheme": "http",
+            "path": path,
+            "query_string": b"",
+            "headers": [(b"authorization", self.authorization.encode())],
+            "server": ("testserver", 80),
+        }
+        messages = []
+
+        async def receive():
+            return {"type": "http.request", "body": b"", "more_body": False}
+
+        async def send(message):
+            messages.append(message)
+
+        # As the test client does, keep the test transaction's connection.
+        request_started.disconnect(close_old_connections)
+        try:
+            async_to_sync(ASGIHandler())(scope, receive, send)
+        finally:
+            request_started.connect(close_old_connections)
+        return messages
+
+    def test_export_streams_off_the_event_loop(self):
+        """Test a streamed export runs its queries without failing under ASGI"""
+        start, *body = self.send_request(EXPORT_URL)
+
+        self.assertEqual(start["status"], status.HTTP_200_OK)
+        lines = b"".join(message.get("body", b"") for message in body).splitlines()
+        self.assertEqual([json.loads(line)["title"] for line in lines], ["Soup"])
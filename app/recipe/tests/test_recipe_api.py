@@ -1,24 +1,44 @@
 """Test for recipe APIS"""
 from decimal import Decimal
+from io import BytesIO
+import json
 from email.mime import image
 import imp
 import os
+import struct
+import tracemalloc
+from base64 import b64encode
+from urllib.parse import parse_qs, urlencode, urlparse
+import zlib
 
 
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.test import TestCase, override_settings
+from unittest import mock, skipUnless
 from django.urls import reverse
 from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 import tempfile
 import os
 from PIL import Image
 
 
 from rest_framework import status
+from rest_framework.renderers import JSONRenderer
 from rest_framework.test import APIClient
 
-from core.models import Recipe
-from recipe.serializers import RecipeDetailSerializer, RecipeSerializer
+from core import cache, images, search
+from core.models import Recipe, Tag, UserCounter
+from core.tests.utils import QueryBudgetMixin
+from recipe.filters import RecipeFilter
+from recipe.serializers import (
+    PLAIN_FIELDS,
+    RecipeDetailSerializer,
+    RecipeSerializer,
+    TagSerializer,
+)
 
 
 RECIPES_URL = reverse("recipe:recipes-list")
@@ -57,7 +77,7 @@ class PublicRecipeAPITests(TestCase):
         self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
 
 
-class PrivateRecipeApiTests(TestCase):
+class PrivateRecipeApiTests(QueryBudgetMixin, TestCase):
     """Test authenticated API request"""
 
     def setUp(self):
@@ -203,6 +223,212 @@ class PrivateRecipeApiTests(TestCase):
         self.assertTrue(Recipe.objects.filter(id=self.recipe.id).exists())
 
 
+    def test_list_query_budget_independent_of_page_size(self):
+        """Test listing recipes runs a fixed number of queries"""
+        tags = [Tag.objects.create(user=self.user, name=f"tag{i}") for i in range(3)]
+        for _ in range(3):
+            create_recipe(user=self.user).tags.set(tags)
+        self.user_authenticator()
+        self.assertQueryBudget(3, "get", RECIPES_URL, format="json")
+
+        for _ in range(20):
+            create_recipe(user=self.user).tags.set(tags)
+        res = self.assertQueryBudget(3, "get", RECIPES_URL, format="json")
+        self.assertEqual(len(res.json().get("results")), 23)
+        self.assertEqual(len(res.json().get("results")[0]["tags"]), 3)
+
+    def test_list_pages_with_cursor(self):
+        """Test following cursor links walks every recipe exactly once"""
+        recipes = [create_recipe(user=self.user) for _ in range(5)]
+        self.user_authenticator()
+
+        seen, url = [], f"{RECIPES_URL}?page_size=2"
+        while url:
+            with CaptureQueriesContext(connection) as context:
+                res = self.client.get(url, format="json")
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            self.assertFalse(
+                any("COUNT(" in query["sql"] for query in context.captured_queries)
+            )
+            self.assertNotIn("total", res.json())
+            seen += [recipe["id"] for recipe in res.json()["results"]]
+            url = res.json()["links"]["next"]
+
+        self.assertEqual(seen, sorted((recipe.id for recipe in recipes), reverse=True))
+
+    def test_tampered_cursor_not_found(self):
+        """Test cursors with values of the wrong type are rejected with a 404"""
+        create_recipe(user=self.user)
+        self.user_authenticator()
+
+        for position in ('{"a":1}', "[[1]]", "abc", "[null]", '["x","y"]'):
+            cursor = b64encode(urlencode({"p": position}).encode()).decode()
+            res = self.client.get(RECIPES_URL, {"cursor": cursor})
+
+            self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND, position)
+
+        cursor = b64encode(urlencode({"p": '[{"a":1},1]'}).encode()).decode()
+        res = self.client.get(RECIPES_URL, {"cursor": cursor, "ordering": "price"})
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_list_total_is_opt_in(self):
+        """Test the total count is only computed when requested"""
+        for _ in range(3):
+            create_recipe(user=self.user)
+        self.user_authenticator()
+
+        res = self.client.get(RECIPES_URL, {"page_size": 2, "total": "true"})
+
+        self.assertEqual(res.json()["total"], 3)
+        self.assertEqual(len(res.json()["results"]), 2)
+
+    def test_list_total_uses_counter_unless_filtered(self):
+        """Test unfiltered totals come from the per-user counter"""
+        create_recipe(user=self.user, title="Soup")
+        create_recipe(user=self.user, title="Salad")
+        self.user_authenticator()
+
+        # Out of sync on purpose to tell the counter apart from a COUNT(*).
+        UserCounter.objects.filter(user=self.user).update(recipes=5)
+
+        with CaptureQueriesContext(connection) as context:
+            res = self.client.get(RECIPES_URL, {"total": "true"})
+        self.assertEqual(res.json()["total"], 5)
+        self.assertFalse(
+            any("COUNT(" in query["sql"] for query in context.captured_queries)
+        )
+
+        res = self.client.get(RECIPES_URL, {"total": "true", "user": self.user.id})
+        self.assertEqual(res.json()["total"], 2)
+
+    def test_full_text_search(self):
+        """Test ?q= matches title, description and tag names"""
+        by_title = create_recipe(user=self.user, title="Thai curry")
+        by_description = create_recipe(
+            user=self.user, title="Stew", description="A mild curry stew"
+        )
+        by_tag = create_recipe(user=self.user, title="Rice", description="")
+        by_tag.tags.add(Tag.objects.create(user=self.user, name="Curry"))
+        create_recipe(user=self.user, title="Pancakes", description="Sweet")
+        self.user_authenticator()
+
+        res = self.client.get(RECIPES_URL, {"q": "curry"})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            {recipe["id"] for recipe in res.json()["results"]},
+            {by_title.id, by_description.id, by_tag.id},
+        )
+
+    def test_full_text_search_pages_with_cursor(self):
+        """Test ranked search results can be walked page by page"""
+        recipes = [create_recipe(user=self.user, title="Curry") for _ in range(3)]
+        self.user_authenticator()
+
+        seen, url = [], f"{RECIPES_URL}?q=curry&page_size=1"
+        while url:
+            res = self.client.get(url, format="json")
+            seen += [recipe["id"] for recipe in res.json()["results"]]
+            url = res.json()["links"]["next"]
+
+        self.assertEqual(sorted(seen), sorted(recipe.id for recipe in recipes))
+
+    def test_search_pages_past_offset_cutoff_with_tied_ranks(self):
+        """Test every match is reached once even when all ranks are equal"""
+        Recipe.objects.bulk_create(
+            Recipe(user=self.user, title="Curry", time_minutes=5, price=Decimal("1"))
+            for _ in range(1300)
+        )
+        self.user_authenticator()
+
+        seen, url = [], f"{RECIPES_URL}?q=curry&page_size=100"
+        while url:
+            res = self.client.get(url)
+            seen += [recipe["id"] for recipe in res.json()["results"]]
+            url = res.json()["links"]["next"]
+            self.assertLessEqual(len(seen), 1300)
+        back = self.client.get(res.json()["links"]["previous"]).json()["results"]
+
+        self.assertEqual(len(set(seen)), 1300)
+        self.assertEqual([recipe["id"] for recipe in back], seen[-200:-100])
+
+    def test_ordered_list_pages_on_unique_position(self):
+        """Test ?ordering= on a non-unique field pages by (field, id)"""
+        for minutes in [5, 5, 5, 10, 10]:
+            create_recipe(user=self.user, time_minutes=minutes)
+        self.user_authenticator()
+
+        seen, url = [], f"{RECIPES_URL}?ordering=time_minutes&page_size=2"
+        while url:
+            res = self.client.get(url)
+            seen += [recipe["id"] for recipe in res.json()["results"]]
+            url = res.json()["links"]["next"]
+
+        expected = Recipe.objects.order_by("time_minutes", "-id")
+        self.assertEqual(seen, list(expected.values_list("id", flat=True)))
+
+    @skipUnless(connection.vendor == "postgresql", "requires PostgreSQL")
+    def test_full_text_search_ranks_title_first(self):
+        """Test title matches rank above description matches"""
+        in_description = create_recipe(
+            user=self.user, title="Stew", description="Served with noodles"
+        )
+        in_title = create_recipe(user=self.user, title="Noodles", description="")
+        self.user_authenticator()
+
+        res = self.client.get(RECIPES_URL, {"q": "noodles"})
+
+        self.assertEqual(
+            [recipe["id"] for recipe in res.json()["results"]],
+            [in_title.id, in_description.id],
+        )
+
+    def test_search_by_tag_name(self):
+        """Test ?search= looks into tag names"""
+        recipe = create_recipe(user=self.user, title="Rice")
+        recipe.tags.add(Tag.objects.create(user=self.user, name="Vegan"))
+        create_recipe(user=self.user, title="Steak")
+        self.user_authenticator()
+
+        res = self.client.get(RECIPES_URL, {"search": "vegan"})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([item["id"] for item in res.json()["results"]], [recipe.id])
+
+    def test_suggest_recipe_titles(self):
+        """Test recipe title suggestions are bounded and scoped to the user"""
+        search.suggestion_cache.clear()
+        for title in ["Pad thai", "Pancakes", "Paella", "Risotto"]:
+            create_recipe(user=self.user, title=title)
+        other = get_user_model().objects.create_user("other@example.com", "pass123")
+        create_recipe(user=other, title="Pasta")
+        self.user_authenticator()
+
+        res = self.client.get(
+            reverse("recipe:recipes-suggest"), {"prefix": "pa", "limit": 100}
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [recipe["title"] for recipe in res.json()["results"]],
+            ["Pad thai", "Paella", "Pancakes"],
+        )
+
+    def test_detail_query_budget(self):
+        """Test retrieving a recipe loads its tags in a single query
+
+        The fourth query reads updated_at for the conditional request check.
+        """
+        recipe = create_recipe(user=self.user)
+        tags = [Tag.objects.create(user=self.user, name=f"t{i}") for i in range(5)]
+        recipe.tags.set(tags)
+        url = reverse("recipe:recipes-detail", kwargs={"pk": recipe.id})
+        self.user_authenticator()
+        res = self.assertQueryBudget(4, "get", url, format="json")
+        self.assertEqual(res.json(), RecipeDetailSerializer(recipe).data)
+
+
 class ImageUploadTests(TestCase):
     """Tests for the image upload API"""
 
@@ -250,3 +476,845 @@ class ImageUploadTests(TestCase):
 
         res = self.client.post(url, payload, format="multipart")
         self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+def png_header(width, height):
+    """Return a PNG that declares the given size but carries no pixels"""
+
+    def chunk(kind, data):
+        checksum = zlib.crc32(kind + data).to_bytes(4, "big")
+        return len(data).to_bytes(4, "big") + kind + data + checksum
+
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"IEND", b"")
+
+
+def upload_photo(client, recipe, size=(3000, 2000)):
+    """Upload a JPEG carrying EXIF metadata to recipe"""
+    exif = Image.Exif()
+    exif[0x0110] = "Phone model"
+    exif[0x0112] = 6  # Rotated 90 degrees
+    with tempfile.NamedTemporaryFile(suffix=".jpg") as image_file:
+        Image.new("RGB", size).save(image_file, format="JPEG", exif=exif)
+        image_file.seek(0)
+        return client.post(
+            image_upload_url(recipe.id), {"image": image_file}, format="multipart"
+        )
+
+
+class ImageUploadLimitTests(TestCase):
+    """Tests for the streaming upload checks"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            "user@example.com", "testpass123"
+        )
+        self.client.force_authenticate(self.user)
+        self.recipe = create_recipe(user=self.user)
+        self.url = image_upload_url(self.recipe.id)
+
+    def test_decompression_bomb_rejected_from_header(self):
+        """Test an image declaring a huge size is rejected without decoding"""
+        bomb = SimpleUploadedFile("bomb.png", png_header(100_000, 100_000))
+
+        res = self.client.post(self.url, {"image": bomb}, format="multipart")
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("pixels", res.json()["image"][0])
+        self.recipe.refresh_from_db()
+        self.assertFalse(self.recipe.image)
+
+    @override_settings(RECIPE_IMAGE_MAX_PIXELS=10_000)
+    def test_too_many_pixels_rejected(self):
+        """Test images over the configured pixel limit are rejected"""
+        image = SimpleUploadedFile("big.png", png_header(200, 100))
+
+        res = self.client.post(self.url, {"image": image}, format="multipart")
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(RECIPE_IMAGE_MAX_UPLOAD_SIZE=1024)
+    def test_upload_too_large(self):
+        """Test uploads past the size limit are abandoned with a 413"""
+        content = SimpleUploadedFile("large.png", png_header(10, 10) + bytes(2048))
+
+        res = self.client.post(self.url, {"image": content}, format="multipart")
+
+        self.assertEqual(res.status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        self.recipe.refresh_from_db()
+        self.assertFalse(self.recipe.image)
+
+
+@override_settings(IMAGE_PROCESSING_MODE="sync")
+class ImageProcessingTests(TestCase):
+    """Tests for background processing of uploaded images"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            "user@example.com", "testpass123"
+        )
+        self.client.force_authenticate(self.user)
+        self.recipe = create_recipe(user=self.user)
+
+    def tearDown(self):
+        # Deleting the recipe releases its stored files.
+        with self.captureOnCommitCallbacks(execute=True):
+            self.recipe.delete()
+
+    def test_upload_returns_before_processing(self):
+        """Test the upload response does not wait for the variants"""
+        res = upload_photo(self.client, self.recipe)
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(res.json()["image_status"], "pending")
+        self.assertEqual(res.json()["image_variants"], {})
+
+    def test_variants_rendered(self):
+        """Test processing strips metadata, bounds sizes and renders variants"""
+        with self.captureOnCommitCallbacks(execute=True):
+            upload_photo(self.client, self.recipe)
+
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.image_status, Recipe.ImageStatus.READY)
+        with Image.open(self.recipe.image.path) as original:
+            self.assertEqual(original.size, (1365, 2048))
+            self.assertEqual(len(original.getexif()), 0)
+        for label, bound in settings.RECIPE_IMAGE_VARIANTS.items():
+            formats = self.recipe.image_variants[label]
+            self.assertEqual(list(formats), images.output_formats())
+            for name in formats.values():
+                with Image.open(self.recipe.image.storage.path(name)) as variant:
+                    self.assertEqual(max(variant.size), bound)
+                    self.assertEqual(len(variant.getexif()), 0)
+
+    def test_upload_replaces_raw_file(self):
+        """Test the unprocessed upload is removed once processed"""
+        with self.captureOnCommitCallbacks(execute=True):
+            res = upload_photo(self.client, self.recipe)
+        raw = res.json()["image"].split(settings.MEDIA_URL)[1]
+
+        self.assertFalse(self.recipe.image.storage.exists(raw))
+
+    def test_upload_named_after_detected_format(self):
+        """Test an image uploaded as HTML is stored with its real extension"""
+        content = BytesIO()
+        Image.new("RGB", (10, 10)).save(content, format="PNG")
+        upload = SimpleUploadedFile("x.html", content.getvalue())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            res = self.client.post(
+                image_upload_url(self.recipe.id), {"image": upload}, format="multipart"
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(res.json()["image"].endswith(".png"))
+        self.recipe.refresh_from_db()
+        self.assertTrue(self.recipe.image.name.endswith(".png"))
+
+    def test_detail_exposes_variant_urls(self):
+        """Test the recipe detail links to the processed variants"""
+        with self.captureOnCommitCallbacks(execute=True):
+            upload_photo(self.client, self.recipe)
+
+        url = reverse("recipe:recipes-detail", kwargs={"pk": self.recipe.id})
+        res = self.client.get(url)
+
+        self.assertEqual(res.json()["image_status"], "ready")
+        thumbnail = res.json()["image_variants"]["thumbnail"]["jpg"]
+        self.assertTrue(thumbnail.startswith("http://testserver/static/media/"))
+
+    def test_identical_uploads_share_files(self):
+        """Test the same photo is stored once until its last recipe is gone"""
+        other = create_recipe(user=self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            upload_photo(self.client, self.recipe)
+        with self.captureOnCommitCallbacks(execute=True):
+            upload_photo(self.client, other)
+        self.recipe.refresh_from_db()
+        other.refresh_from_db()
+        storage = self.recipe.image.storage
+        names = [
+            self.recipe.image.name,
+            *images.variant_names(self.recipe.image_variants),
+        ]
+
+        self.assertEqual(other.image.name, self.recipe.image.name)
+        self.assertEqual(other.image_variants, self.recipe.image_variants)
+        with self.captureOnCommitCallbacks(execute=True):
+            other.delete()
+        self.assertTrue(all(storage.exists(name) for name in names))
+        with self.captureOnCommitCallbacks(execute=True):
+            Recipe.objects.get(id=self.recipe.id).delete()
+        self.assertFalse(any(storage.exists(name) for name in names))
+
+    @override_settings(RECIPE_IMAGE_CONTENT_ADDRESSED=False)
+    def test_uuid_names_without_content_addressing(self):
+        """Test every upload gets its own file when content addressing is off"""
+        other = create_recipe(user=self.user)
+        upload_photo(self.client, self.recipe)
+        upload_photo(self.client, other)
+        self.recipe.refresh_from_db()
+        other.refresh_from_db()
+
+        self.assertNotEqual(other.image.name, self.recipe.image.name)
+        other.image.delete()
+
+    def test_new_upload_discards_old_variants(self):
+        """Test uploading a new image deletes the previous variants"""
+        with self.captureOnCommitCallbacks(execute=True):
+            upload_photo(self.client, self.recipe)
+        self.recipe.refresh_from_db()
+        old = images.variant_names(self.recipe.image_variants)
+        old_original = self.recipe.image
+
+        with self.captureOnCommitCallbacks(execute=True):
+            upload_photo(self.client, self.recipe, size=(100, 100))
+
+        storage = old_original.storage
+        self.assertFalse(any(storage.exists(name) for name in old))
+        old_original.delete(save=False)
+
+
+class BatchRecipeApiTests(TestCase):
+    """Tests for the batch recipe API"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            "user@example.com", "testpass123"
+        )
+        self.client.force_authenticate(self.user)
+        self.url = reverse("recipe:recipes-batch")
+
+    def test_batch_create(self):
+        """Test creating many recipes with shared tags in one request"""
+        payload = [
+            {
+                "title": f"Recipe {i}",
+                "time_minutes": 10,
+                "price": "2.50",
+                "tags": [{"name": "Shared"}, {"name": f"Own {i}"}],
+            }
+            for i in range(5)
+        ]
+        res = self.client.post(self.url, payload, format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        results = res.json()["results"]
+        self.assertEqual([item["status"] for item in results], [201] * 5)
+        self.assertEqual(Recipe.objects.filter(user=self.user).count(), 5)
+        self.assertEqual(Tag.objects.filter(user=self.user, name="Shared").count(), 1)
+        recipe = Recipe.objects.get(id=results[3]["data"]["id"])
+        self.assertEqual(recipe.title, "Recipe 3")
+        self.assertEqual(
+            set(recipe.tags.values_list("name", flat=True)), {"Shared", "Own 3"}
+        )
+
+    def test_batch_create_reports_item_errors(self):
+        """Test invalid items are reported while valid items are created"""
+        payload = [
+            {"title": "Good", "time_minutes": 10, "price": "2.50"},
+            {"title": "Bad", "price": "2.50"},
+            {"title": "Also good", "time_minutes": 5, "price": "1.00"},
+        ]
+        res = self.client.post(self.url, payload, format="json")
+
+        results = res.json()["results"]
+        self.assertEqual([item["status"] for item in results], [201, 400, 201])
+        self.assertIn("time_minutes", results[1]["errors"])
+        self.assertEqual(results[2]["data"]["title"], "Also good")
+        self.assertEqual(Recipe.objects.filter(user=self.user).count(), 2)
+
+    def test_batch_create_ndjson(self):
+        """Test the batch endpoint accepts newline-delimited JSON"""
+        body = "\n".join(
+            json.dumps({"title": f"Recipe {i}", "time_minutes": 1, "price": "1.00"})
+            for i in range(3)
+        )
+        res = self.client.post(self.url, body, content_type="application/x-ndjson")
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.json()["results"]), 3)
+        self.assertEqual(Recipe.objects.filter(user=self.user).count(), 3)
+
+    def test_batch_update(self):
+        """Test partially updating many recipes and their tags"""
+        first = create_recipe(user=self.user, title="First")
+        second = create_recipe(user=self.user, title="Second")
+        first.tags.add(Tag.objects.create(user=self.user, name="Old"))
+        other = create_recipe(
+            user=get_user_model().objects.create_user("other@example.com", "pass123")
+        )
+        payload = [
+            {"id": first.id, "title": "First updated", "tags": [{"name": "New"}]},
+            {"id": second.id, "price": "9.99"},
+            {"id": other.id, "title": "Not mine"},
+        ]
+        res = self.client.patch(self.url, payload, format="json")
+
+        results = res.json()["results"]
+        self.assertEqual([item["status"] for item in results], [200, 200, 404])
+        first.refresh_from_db()
+        second.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual(first.title, "First updated")
+        self.assertEqual(list(first.tags.values_list("name", flat=True)), ["New"])
+        self.assertEqual(second.title, "Second")
+        self.assertEqual(second.price, Decimal("9.99"))
+        self.assertNotEqual(other.title, "Not mine")
+
+    def test_batch_delete(self):
+        """Test deleting many recipes only touches the user's own recipes"""
+        mine = [create_recipe(user=self.user) for _ in range(3)]
+        other = create_recipe(
+            user=get_user_model().objects.create_user("other@example.com", "pass123")
+        )
+        payload = [recipe.id for recipe in mine] + [other.id]
+        res = self.client.delete(self.url, payload, format="json")
+
+        results = res.json()["results"]
+        self.assertEqual([item["status"] for item in results], [204, 204, 204, 404])
+        self.assertFalse(Recipe.objects.filter(user=self.user).exists())
+        self.assertTrue(Recipe.objects.filter(id=other.id).exists())
+
+    def test_batch_delete_duplicate_id(self):
+        """Test a repeated id is deleted once and reported as a duplicate"""
+        recipe = create_recipe(user=self.user)
+        res = self.client.delete(self.url, [recipe.id, recipe.id], format="json")
+
+        self.assertEqual(
+            res.json()["results"],
+            [
+                {"status": 204, "id": recipe.id},
+                {"status": 400, "id": recipe.id, "errors": {"id": ["Duplicate id."]}},
+            ],
+        )
+        self.assertFalse(Recipe.objects.filter(id=recipe.id).exists())
+
+    def test_batch_delete_invalid_ids(self):
+        """Test ids that are not usable primary keys fail on their own"""
+        recipe = create_recipe(user=self.user)
+        payload = [[1], {"id": {}}, 2**63, "1", recipe.id]
+        res = self.client.delete(self.url, payload, format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        results = res.json()["results"]
+        self.assertEqual([item["status"] for item in results], [400] * 4 + [204])
+        self.assertEqual(results[2]["id"], 2**63)
+        self.assertFalse(Recipe.objects.filter(id=recipe.id).exists())
+
+    def test_batch_update_invalid_ids(self):
+        """Test updates without a usable id fail on their own"""
+        recipe = create_recipe(user=self.user)
+        payload = [{"id": 2**63}, {"title": "No id"}, {"id": recipe.id, "title": "Ok"}]
+        res = self.client.patch(self.url, payload, format="json")
+
+        results = res.json()["results"]
+        self.assertEqual([item["status"] for item in results], [400, 400, 200])
+        self.assertIn("id", results[0]["errors"])
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.title, "Ok")
+
+    def test_batch_ndjson_invalid_encoding(self):
+        """Test an NDJSON body that is not UTF-8 is a parse error"""
+        res = self.client.post(
+            self.url, b'{"title": "\xff"}\n', content_type="application/x-ndjson"
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_batch_rejects_non_list(self):
+        """Test the batch endpoint requires a list of items"""
+        res = self.client.post(self.url, {"title": "x"}, format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ResponseCacheTests(QueryBudgetMixin, TestCase):
+    """Tests for the recipe response cache"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            "user@example.com", "testpass123"
+        )
+        self.client.force_authenticate(self.user)
+
+    def test_list_served_from_cache(self):
+        """Test a repeated list request is served without touching recipes"""
+        create_recipe(user=self.user)
+        before = cache.stats()
+
+        first = self.client.get(RECIPES_URL)
+        second = self.assertQueryBudget(0, "get", RECIPES_URL)
+
+        self.assertEqual(first["X-Cache"], "MISS")
+        self.assertEqual(second["X-Cache"], "HIT")
+        self.assertEqual(first.json(), second.json())
+        self.assertEqual(cache.stats()["hits"], before["hits"] + 1)
+        self.assertEqual(cache.stats()["misses"], before["misses"] + 1)
+
+    def test_write_invalidates_list(self):
+        """Test creating a recipe invalidates the cached list"""
+        self.client.get(RECIPES_URL)
+        payload = {"title": "New", "time_minutes": 5, "price": "1.00"}
+        self.client.post(RECIPES_URL, payload, format="json")
+
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res["X-Cache"], "MISS")
+        self.assertEqual(len(res.json()["results"]), 1)
+
+    def test_batch_update_invalidates_detail(self):
+        """Test bulk updates invalidate cached details"""
+        recipe = create_recipe(user=self.user, title="Old")
+        url = reverse("recipe:recipes-detail", kwargs={"pk": recipe.id})
+        self.client.get(url)
+        payload = [{"id": recipe.id, "tags": [{"name": "Fresh"}]}]
+        self.client.patch(reverse("recipe:recipes-batch"), payload, format="json")
+
+        res = self.client.get(url)
+
+        self.assertEqual([tag["name"] for tag in res.json()["tags"]], ["Fresh"])
+
+    def test_cache_is_per_user(self):
+        """Test cached responses are never shared between users"""
+        create_recipe(user=self.user)
+        self.client.get(RECIPES_URL)
+        other = get_user_model().objects.create_user("other@example.com", "pass123")
+        self.client.force_authenticate(other)
+
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res["X-Cache"], "MISS")
+        self.assertEqual(res.json()["results"], [])
+
+
+class ConditionalRequestTests(QueryBudgetMixin, TestCase):
+    """Tests for ETag and Last-Modified handling"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            "user@example.com", "testpass123"
+        )
+        self.client.force_authenticate(self.user)
+
+    def test_list_not_modified(self):
+        """Test an unchanged list returns 304 without querying recipes"""
+        create_recipe(user=self.user)
+        res = self.client.get(RECIPES_URL)
+
+        again = self.assertQueryBudget(
+            0, "get", RECIPES_URL, HTTP_IF_NONE_MATCH=res["ETag"]
+        )
+
+        self.assertEqual(again.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(again["ETag"], res["ETag"])
+        self.assertIn("Last-Modified", res)
+
+    def test_list_etag_changes_after_write(self):
+        """Test writing a recipe changes the list ETag"""
+        res = self.client.get(RECIPES_URL)
+        create_recipe(user=self.user)
+
+        again = self.client.get(RECIPES_URL, HTTP_IF_NONE_MATCH=res["ETag"])
+
+        self.assertEqual(again.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(again["ETag"], res["ETag"])
+        self.assertEqual(len(again.json()["results"]), 1)
+
+    def test_list_etag_depends_on_query(self):
+        """Test different pages of the list have different ETags"""
+        first = self.client.get(RECIPES_URL)
+        second = self.client.get(RECIPES_URL, {"page_size": 1})
+
+        self.assertNotEqual(first["ETag"], second["ETag"])
+
+    def test_detail_not_modified(self):
+        """Test an unchanged recipe returns 304"""
+        recipe = create_recipe(user=self.user)
+        url = reverse("recipe:recipes-detail", kwargs={"pk": recipe.id})
+        res = self.client.get(url)
+
+        again = self.client.get(url, HTTP_IF_NONE_MATCH=res["ETag"])
+
+        self.assertEqual(again.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_detail_etag_changes_with_tags(self):
+        """Test adding a tag to a recipe changes its ETag"""
+        recipe = create_recipe(user=self.user)
+        url = reverse("recipe:recipes-detail", kwargs={"pk": recipe.id})
+        res = self.client.get(url)
+        recipe.tags.add(Tag.objects.create(user=self.user, name="Vegan"))
+
+        again = self.client.get(url, HTTP_IF_NONE_MATCH=res["ETag"])
+
+        self.assertEqual(again.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(again.json()["tags"]), 1)
+
+    def test_patch_if_match(self):
+        """Test a PATCH with the current ETag succeeds and returns a new one"""
+        recipe = create_recipe(user=self.user)
+        url = reverse("recipe:recipes-detail", kwargs={"pk": recipe.id})
+        etag = self.client.get(url)["ETag"]
+
+        res = self.client.patch(url, {"title": "New"}, HTTP_IF_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(res["ETag"], etag)
+        self.assertEqual(self.client.get(url)["ETag"], res["ETag"])
+
+    def test_patch_stale_etag(self):
+        """Test a PATCH with a stale ETag is rejected"""
+        recipe = create_recipe(user=self.user)
+        url = reverse("recipe:recipes-detail", kwargs={"pk": recipe.id})
+        etag = self.client.get(url)["ETag"]
+        self.client.patch(url, {"title": "Other"})
+
+        res = self.client.put(
+            url,
+            {"title": "New", "time_minutes": 5, "price": "1.00"},
+            HTTP_IF_MATCH=etag,
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_412_PRECONDITION_FAILED)
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.title, "Other")
+
+    def test_batch_update_changes_etag(self):
+        """Test bulk updates change the ETag of the updated recipes"""
+        recipe = create_recipe(user=self.user)
+        url = reverse("recipe:recipes-detail", kwargs={"pk": recipe.id})
+        etag = self.client.get(url)["ETag"]
+        payload = [{"id": recipe.id, "tags": [{"name": "Fresh"}]}]
+        self.client.patch(reverse("recipe:recipes-batch"), payload, format="json")
+
+        res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+
+class RowSerializationTests(TestCase):
+    """Tests for serializing list pages from values() rows"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            "user@example.com", "testpass123"
+        )
+        tags = [Tag.objects.create(user=self.user, name=f"Tag {n}") for n in range(5)]
+        for n in range(100):
+            recipe = create_recipe(
+                user=self.user,
+                title=f"Recipe {n}",
+                price=Decimal(n) / 4,
+                link="" if n % 2 else f"http://example.com/{n}",
+            )
+            recipe.tags.set(tags[n % 3 : n % 3 + 3])
+        self.fields = [
+            field for field in RecipeSerializer.Meta.fields if field != "tags"
+        ]
+
+    def serialize_instances(self):
+        recipes = Recipe.objects.order_by("-id").prefetch_related("tags")
+        return JSONRenderer().render(RecipeSerializer(recipes, many=True).data)
+
+    def serialize_rows(self):
+        rows = Recipe.objects.order_by("-id").values(*self.fields)
+        return JSONRenderer().render(RecipeSerializer(rows, many=True).data)
+
+    def test_rows_render_identical_json(self):
+        """Test rows and model instances produce byte-identical JSON"""
+        self.assertEqual(self.serialize_rows(), self.serialize_instances())
+
+    def test_tag_rows_render_identical_json(self):
+        """Test tag rows and tag instances produce byte-identical JSON"""
+        rows = TagSerializer(Tag.objects.values("id", "name"), many=True).data
+        instances = TagSerializer(Tag.objects.all(), many=True).data
+
+        self.assertEqual(JSONRenderer().render(rows), JSONRenderer().render(instances))
+
+    def test_rows_skip_plain_field_dispatch(self):
+        """Test rows render plain fields without calling to_representation()"""
+        plain = [
+            mock.patch.object(field_class, "to_representation")
+            for field_class in PLAIN_FIELDS
+        ]
+        mocks = [patcher.start() for patcher in plain]
+        for patcher in plain:
+            self.addCleanup(patcher.stop)
+
+        with self.assertNumQueries(2):
+            self.serialize_rows()
+
+        for to_representation in mocks:
+            to_representation.assert_not_called()
+
+
+EXPORT_URL = reverse("recipe:recipes-export")
+
+
+class ExportTests(TestCase):
+    """Tests for streaming exports of a user's recipes"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            "user@example.com", "testpass123"
+        )
+        self.client.force_authenticate(self.user)
+
+    def export(self, **params):
+        """Request an export and return the response and its full body"""
+        res = self.client.get(EXPORT_URL, params)
+        return res, b"".join(res.streaming_content)
+
+    def test_export_ndjson(self):
+        """Test recipes are exported one JSON object per line by default"""
+        recipe = create_recipe(user=self.user, title="Soup")
+        recipe.tags.add(Tag.objects.create(user=self.user, name="Vegan"))
+        create_recipe(user=get_user_model().objects.create_user("o@example.com"))
+
+        res, body = self.export()
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res["Content-Type"].startswith("application/x-ndjson"))
+        self.assertIn('filename="recipes.ndjson"', res["Content-Disposition"])
+        lines = body.decode().splitlines()
+        self.assertEqual(len(lines), 1)
+        expected = dict(RecipeSerializer(recipe).data, description=recipe.description)
+        self.assertEqual(json.loads(lines[0]), expected)
+
+    def test_export_csv(self):
+        """Test the CSV export has a header row and joins tag names"""
+        recipe = create_recipe(user=self.user, title="Soup, hot")
+        recipe.tags.add(
+            Tag.objects.create(user=self.user, name="Vegan"),
+            Tag.objects.create(user=self.user, name="Quick"),
+        )
+
+        res, body = self.export(format="csv")
+
+        self.assertTrue(res["Content-Type"].startswith("text/csv"))
+        header, row = body.decode().splitlines()
+        self.assertEqual(header, "id,title,time_minutes,price,link,tags,description")
+        self.assertIn('"Soup, hot",22,5.25', row)
+        self.assertIn("Vegan|Quick", row)
+
+    def test_export_json(self):
+        """Test a JSON export streams a single array"""
+        create_recipe(user=self.user)
+        create_recipe(user=self.user)
+
+        res, body = self.export(format="json")
+
+        self.assertEqual(len(json.loads(body)), 2)
+
+    @override_settings(RECIPE_EXPORT_CHUNK_SIZE=2)
+    def test_export_fetches_tags_per_chunk(self):
+        """Test tags are joined with one query per chunk of recipes"""
+        tag = Tag.objects.create(user=self.user, name="Vegan")
+        for _ in range(5):
+            create_recipe(user=self.user).tags.add(tag)
+
+        with CaptureQueriesContext(connection) as context:
+            res, body = self.export()
+
+        self.assertEqual(len(body.splitlines()), 5)
+        # The recipe rows, then the tags of three chunks.
+        self.assertEqual(len(context), 4)
+
+    def test_export_memory_is_flat(self):
+        """Test exporting 100k recipes needs no more memory than 10k"""
+        peaks = []
+        for total in (10_000, 100_000):
+            Recipe.objects.bulk_create(
+                [
+                    Recipe(
+                        user=self.user,
+                        title=f"Recipe {n}",
+                        time_minutes=5,
+                        price=Decimal("1.50"),
+                    )
+                    for n in range(total - Recipe.objects.count())
+                ],
+                batch_size=5000,
+            )
+            tracemalloc.start()
+            res = self.client.get(EXPORT_URL)
+            size = sum(len(chunk) for chunk in res.streaming_content)
+            peaks.append(tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+
+        self.assertGreater(size, 5 * 2**20)
+        self.assertLess(peaks[1], peaks[0] * 1.5)
+
+
+class FacetTests(TestCase):
+    """Tests for ?facets= counts on the recipe list"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            "user@example.com", "testpass123"
+        )
+        self.client.force_authenticate(self.user)
+        vegan = Tag.objects.create(user=self.user, name="Vegan")
+        quick = Tag.objects.create(user=self.user, name="Quick")
+        for title, minutes, price, tags in [
+            ("Curry", 40, "12.00", [vegan]),
+            ("Salad", 10, "4.00", [vegan, quick]),
+            ("Green curry", 25, "8.50", [vegan, quick]),
+            ("Steak", 20, "30.00", []),
+        ]:
+            recipe = create_recipe(
+                user=self.user, title=title, time_minutes=minutes, price=price
+            )
+            recipe.tags.add(*tags)
+        other = get_user_model().objects.create_user("other@example.com")
+        create_recipe(user=other, title="Curry").tags.add(
+            Tag.objects.create(user=other, name="Vegan")
+        )
+
+    def test_facets_of_search_results(self):
+        """Test facets count only the recipes matching the filters"""
+        res = self.client.get(
+            RECIPES_URL, {"q": "curry", "facets": "tags,time_minutes,price"}
+        )
+
+        facets = res.json()["facets"]
+        self.assertEqual(
+            [(tag["name"], tag["count"]) for tag in facets["tags"]],
+            [("Vegan", 2), ("Quick", 1)],
+        )
+        self.assertEqual(
+            [bucket["count"] for bucket in facets["time_minutes"]], [0, 1, 1, 0, 0]
+        )
+        self.assertEqual(facets["time_minutes"][0], {"min": 0, "max": 15, "count": 0})
+        self.assertEqual(facets["price"][-1], {"min": 50, "max": None, "count": 0})
+        self.assertEqual(
+            [bucket["count"] for bucket in facets["price"]], [0, 1, 1, 0, 0]
+        )
+
+    def test_facets_run_in_one_query(self):
+        """Test every facet is computed by one query, and then cached"""
+        params = {"facets": "tags,time_minutes,price", "page_size": 2}
+        with CaptureQueriesContext(connection) as without_facets:
+            self.client.get(RECIPES_URL, {"page_size": 2})
+        with CaptureQueriesContext(connection) as with_facets:
+            first = self.client.get(RECIPES_URL, params)
+        params["cursor"] = parse_qs(urlparse(first.json()["links"]["next"]).query)[
+            "cursor"
+        ][0]
+        with CaptureQueriesContext(connection) as next_page:
+            second = self.client.get(RECIPES_URL, params)
+
+        self.assertEqual(len(with_facets), len(without_facets) + 1)
+        self.assertEqual(len(next_page), len(without_facets))
+        self.assertEqual(second.json()["facets"], first.json()["facets"])
+        self.assertEqual(
+            sum(bucket["count"] for bucket in first.json()["facets"]["price"]), 4
+        )
+
+    def test_facets_follow_changes(self):
+        """Test cached facets are recomputed once the user's recipes change"""
+        self.client.get(RECIPES_URL, {"facets": "tags"})
+        Recipe.objects.filter(user=self.user, title="Steak").get().tags.add(
+            Tag.objects.get(user=self.user, name="Quick")
+        )
+
+        res = self.client.get(RECIPES_URL, {"facets": "tags"})
+
+        self.assertEqual(
+            [(tag["name"], tag["count"]) for tag in res.json()["facets"]["tags"]],
+            [("Quick", 3), ("Vegan", 3)],
+        )
+
+    def test_unknown_facet(self):
+        """Test an unknown facet name is rejected"""
+        res = self.client.get(RECIPES_URL, {"facets": "tags,calories"})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("facets", res.json())
+
+
+class RecipeFilterTests(TestCase):
+    """Tests for the tag, range and image filters of the recipe list"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            "user@example.com", "testpass123"
+        )
+        self.client.force_authenticate(self.user)
+        self.vegan = Tag.objects.create(user=self.user, name="Vegan")
+        self.quick = Tag.objects.create(user=self.user, name="Quick")
+        self.salad = create_recipe(
+            user=self.user, title="Salad", time_minutes=10, price=Decimal("4.00")
+        )
+        self.salad.tags.add(self.vegan, self.quick)
+        self.curry = create_recipe(
+            user=self.user, title="Curry", time_minutes=45, price=Decimal("12.00")
+        )
+        self.curry.tags.add(self.vegan)
+        self.steak = create_recipe(
+            user=self.user, title="Steak", time_minutes=20, price=Decimal("30.00")
+        )
+        self.steak.image = "uploads/recipe/steak.jpg"
+        self.steak.save()
+
+    def titles(self, **params):
+        res = self.client.get(RECIPES_URL, params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK, res.content)
+        return {recipe["title"] for recipe in res.json()["results"]}
+
+    def test_filter_any_tag(self):
+        """Test ?tags= matches recipes with any of the tags"""
+        tags = f"{self.vegan.id},{self.quick.id}"
+
+        self.assertEqual(self.titles(tags=tags), {"Salad", "Curry"})
+        self.assertEqual(self.titles(tags=self.quick.id), {"Salad"})
+
+    def test_filter_all_tags(self):
+        """Test ?tags_match=all only matches recipes with every tag"""
+        tags = f"{self.vegan.id},{self.quick.id}"
+
+        self.assertEqual(self.titles(tags=tags, tags_match="all"), {"Salad"})
+        self.assertEqual(
+            self.titles(tags=self.vegan.id, tags_match="all"), {"Salad", "Curry"}
+        )
+
+    def test_filter_ranges(self):
+        """Test time and price ranges include their bounds"""
+        self.assertEqual(
+            self.titles(time_minutes__gte=10, time_minutes__lte=20), {"Salad", "Steak"}
+        )
+        self.assertEqual(self.titles(price__gte="12.00"), {"Curry", "Steak"})
+        self.assertEqual(
+            self.titles(price__lte="12.00", time_minutes__gte=15), {"Curry"}
+        )
+
+    def test_filter_has_image(self):
+        """Test ?has_image= splits recipes with and without an image"""
+        self.assertEqual(self.titles(has_image="true"), {"Steak"})
+        self.assertEqual(self.titles(has_image="false"), {"Salad", "Curry"})
+
+    def test_invalid_filter(self):
+        """Test malformed filter values are rejected"""
+        res = self.client.get(RECIPES_URL, {"tags_match": "some"})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_all_tags_is_one_grouped_subquery(self):
+        """Test matching all tags joins the tag links once, whatever their count"""
+        queryset = RecipeFilter(
+            {"tags": "1,2,3,4", "tags_match": "all"},
+            queryset=Recipe.objects.filter(user=self.user),
+        ).qs
+
+        sql = str(queryset.query)
+        self.assertEqual(sql.count(Recipe.tags.through._meta.db_table), 1, sql)
+        self.assertIn("HAVING COUNT", sql)
+        self.assertNotIn("JOIN", sql)
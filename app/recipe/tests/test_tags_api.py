@@ -9,7 +9,9 @@ from django.conf import settings
 from rest_framework import status
 from rest_framework.test import APIClient
 
+from core import search
 from core.models import Recipe, Tag
+from core.tests.utils import QueryBudgetMixin
 from recipe.serializers import RecipeDetailSerializer, RecipeSerializer, TagSerializer
 
 
@@ -31,7 +33,7 @@ class PublicTagApiTest(TestCase):
         self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
 
 
-class PrivateTagsApiTests(TestCase):
+class PrivateTagsApiTests(QueryBudgetMixin, TestCase):
     """Test authorized API requests"""
 
     def setUp(self) -> None:
@@ -103,3 +105,201 @@ class PrivateTagsApiTests(TestCase):
         for tag in payload["tags"]:
             exists = recipe.tags.filter(name=tag["name"], user=self.user).exists()
             self.assertTrue(exists)
+
+    def test_create_recipe_tags_query_budget(self):
+        """Test tags are resolved in bulk regardless of how many are sent"""
+        Tag.objects.create(user=self.user, name="Existing")
+        payload = {
+            "title": "Importer recipe",
+            "time_minutes": 10,
+            "price": Decimal("1.00"),
+            "tags": [{"name": "Existing"}] + [{"name": f"tag{i}"} for i in range(30)],
+        }
+        self.user_authenticator()
+        url = reverse("recipe:recipes-list")
+        res = self.assertQueryBudget(10, "post", url, data=payload, format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        recipe = Recipe.objects.get(id=res.json().get("id"))
+        self.assertEqual(recipe.tags.count(), 31)
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 31)
+
+    def test_update_recipe_tags_diffs_existing(self):
+        """Test updating tags keeps shared links and removes stale ones"""
+        recipe = Recipe.objects.create(
+            user=self.user, title="Soup", time_minutes=5, price=Decimal("1.00")
+        )
+        lunch = Tag.objects.create(user=self.user, name="Lunch")
+        dinner = Tag.objects.create(user=self.user, name="Dinner")
+        recipe.tags.add(lunch, dinner)
+        link_id = Recipe.tags.through.objects.get(recipe=recipe, tag=lunch).id
+
+        payload = {"tags": [{"name": "Lunch"}, {"name": "Starter"}]}
+        self.user_authenticator()
+        url = reverse("recipe:recipes-detail", kwargs={"pk": recipe.id})
+        res = self.client.patch(url, payload, format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            set(recipe.tags.values_list("name", flat=True)), {"Lunch", "Starter"}
+        )
+        self.assertTrue(Recipe.tags.through.objects.filter(id=link_id).exists())
+        self.assertTrue(Tag.objects.filter(id=dinner.id).exists())
+
+    def test_clear_recipe_tags(self):
+        """Test sending an empty tag list removes all tags from a recipe"""
+        recipe = Recipe.objects.create(
+            user=self.user, title="Soup", time_minutes=5, price=Decimal("1.00")
+        )
+        recipe.tags.add(Tag.objects.create(user=self.user, name="Lunch"))
+
+        self.user_authenticator()
+        url = reverse("recipe:recipes-detail", kwargs={"pk": recipe.id})
+        res = self.client.patch(url, {"tags": []}, format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(recipe.tags.count(), 0)
+
+    def test_suggest_tags(self):
+        """Test tag suggestions match the prefix and are scoped to the user"""
+        search.suggestion_cache.clear()
+        for name in ["Dinner", "Dessert", "Dip", "Breakfast"]:
+            Tag.objects.create(user=self.user, name=name)
+        other = create_user(email="other@example.com")
+        Tag.objects.create(user=other, name="Dumplings")
+        self.user_authenticator()
+        url = reverse("recipe:tags-suggest")
+
+        res = self.client.get(url, {"prefix": "d", "limit": 2})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [tag["name"] for tag in res.json()["results"]], ["Dessert", "Dinner"]
+        )
+
+    def test_suggest_tags_cached(self):
+        """Test a repeated prefix is served without querying tags"""
+        search.suggestion_cache.clear()
+        Tag.objects.create(user=self.user, name="Vegan")
+        self.user_authenticator()
+        url = reverse("recipe:tags-suggest")
+        self.client.get(url, {"prefix": "veg"})
+
+        res = self.assertQueryBudget(1, "get", url, data={"prefix": "veg"})
+
+        self.assertEqual(res.json()["results"][0]["name"], "Vegan")
+
+    def test_suggest_requires_prefix(self):
+        """Test suggestions require a prefix"""
+        self.user_authenticator()
+
+        res = self.client.get(reverse("recipe:tags-suggest"))
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_create_duplicate_tag_name(self):
+        """Test creating a tag with a name the user already has fails cleanly"""
+        Tag.objects.create(user=self.user, name="Vegan")
+        self.user_authenticator()
+
+        res = self.client.post(reverse("recipe:tags-list"), {"name": "Vegan"})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("name", res.json())
+
+    def test_tags_not_modified(self):
+        """Test an unchanged tag list returns 304 and a rename invalidates it"""
+        tag = Tag.objects.create(user=self.user, name="Vegan")
+        self.user_authenticator()
+        url = reverse("recipe:tags-list")
+        etag = self.client.get(url)["ETag"]
+
+        unchanged = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        tag.name = "Vegetarian"
+        tag.save()
+        renamed = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(unchanged.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(renamed.status_code, status.HTTP_200_OK)
+
+    def test_rename_tag_changes_recipe_etag(self):
+        """Test renaming a tag changes the ETag of recipes using it"""
+        tag = Tag.objects.create(user=self.user, name="Vegan")
+        recipe = Recipe.objects.create(
+            user=self.user, title="Salad", time_minutes=5, price=Decimal("2.00")
+        )
+        recipe.tags.add(tag)
+        self.user_authenticator()
+        url = reverse("recipe:recipes-detail", kwargs={"pk": recipe.id})
+        etag = self.client.get(url)["ETag"]
+        tag.name = "Vegetarian"
+        tag.save()
+
+        res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.json()["tags"][0]["name"], "Vegetarian")
+
+    def create_recipe(self, *tags):
+        recipe = Recipe.objects.create(
+            user=self.user, title="Soup", time_minutes=5, price=Decimal("1.00")
+        )
+        recipe.tags.add(*tags)
+        return recipe
+
+    def test_tags_limited_to_user(self):
+        """Test only the authenticated user's tags are listed or retrievable"""
+        other = create_user(email="other@example.com")
+        foreign = Tag.objects.create(user=other, name="Fruity")
+        tag = Tag.objects.create(user=self.user, name="Comfort")
+        self.user_authenticator()
+
+        res = self.client.get(reverse("recipe:tags-list"))
+        detail = self.client.get(
+            reverse("recipe:tags-detail", kwargs={"pk": foreign.id})
+        )
+
+        self.assertEqual(
+            res.json()["results"], [{"id": tag.id, "name": tag.name, "recipe_count": 0}]
+        )
+        self.assertEqual(res.json()["total"], 1)
+        self.assertEqual(detail.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_tags_recipe_count_and_assigned_only(self):
+        """Test tags carry their recipe count and can be limited to used ones"""
+        breakfast = Tag.objects.create(user=self.user, name="Breakfast")
+        lunch = Tag.objects.create(user=self.user, name="Lunch")
+        Tag.objects.create(user=self.user, name="Unused")
+        self.create_recipe(breakfast, lunch)
+        self.create_recipe(lunch)
+        self.user_authenticator()
+        url = reverse("recipe:tags-list")
+
+        res = self.client.get(url)
+        assigned = self.client.get(url, {"assigned_only": 1})
+
+        self.assertEqual(
+            [(tag["name"], tag["recipe_count"]) for tag in res.json()["results"]],
+            [("Breakfast", 1), ("Lunch", 2), ("Unused", 0)],
+        )
+        self.assertEqual(
+            [tag["name"] for tag in assigned.json()["results"]], ["Breakfast", "Lunch"]
+        )
+        self.assertEqual(assigned.json()["total"], 2)
+
+    def test_tags_ordered_by_popularity(self):
+        """Test ?ordering=-recipe_count lists the most used tags first"""
+        tags = [Tag.objects.create(user=self.user, name=name) for name in "ABCD"]
+        for count, tag in enumerate(tags):
+            for _ in range(count):
+                self.create_recipe(tag)
+        self.user_authenticator()
+        url = reverse("recipe:tags-list")
+
+        res = self.assertQueryBudget(
+            4, "get", url, data={"ordering": "-recipe_count", "page_size": 3}
+        )
+
+        self.assertEqual(
+            [tag["name"] for tag in res.json()["results"]], ["D", "C", "B"]
+        )
@@ -6,38 +6,133 @@ from core.models import Recipe, Tag
 from .serializers import (
     RecipeSerializer,
     RecipeDetailSerializer,
+    RecipeExportSerializer,
     TagSerializer,
+    TagListSerializer,
     RecipeImageSerializer,
 )
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.authentication import TokenAuthentication
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.fields import BooleanField
 from rest_framework.response import Response
+from rest_framework.parsers import JSONParser
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Prefetch
+from django.http import StreamingHttpResponse
+from core import cache, images, search
+from core.pagination import KeysetPagination
+from core.parsers import NDJSONParser, StreamingMultiPartParser
+from core.renderers import CSVRenderer, FastJSONRenderer, NDJSONRenderer, chunked
+from .facets import get_facets
+from .filters import (
+    FullTextSearchFilter,
+    RecipeFilter,
+    RecipeOrderingFilter,
+    TagOrderingFilter,
+)
+from .mixins import CachedResponseMixin, ConditionalResponseMixin
+
+
+def suggestions(request, queryset, field):
+    """Respond with typeahead matches of ?prefix= on field of queryset"""
+    prefix = request.query_params.get("prefix", "").strip()
+    if not prefix:
+        return Response(
+            data={"message": "The prefix parameter is required"},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    try:
+        limit = int(request.query_params.get("limit", 10))
+    except ValueError:
+        limit = 10
+    limit = max(1, min(limit, settings.SUGGEST_MAX_RESULTS))
+
+    matches = search.suggest(queryset, field, prefix, limit, scope=request.user.id)
+    return Response(
+        data={"results": [{"id": pk, field: value} for pk, value in matches]},
+        status=status.HTTP_200_OK,
+    )
+
+
+# Primary keys are BigAutoFields, signed 64-bit integers on every backend.
+MAX_ID = 2**63 - 1
+
+
+def is_id(value):
+    """Return whether a batch item carries a usable primary key"""
+    return (
+        isinstance(value, int) and not isinstance(value, bool) and 0 < value <= MAX_ID
+    )
+
 
+def invalid_id(**result):
+    """Return the batch result of an item without a usable primary key"""
+    return {
+        "status": status.HTTP_400_BAD_REQUEST,
+        **result,
+        "errors": {"id": ["A valid integer is required."]},
+    }
 
-class RecipeViewSets(viewsets.ModelViewSet):
+
+class RecipeViewSets(
+    CachedResponseMixin, ConditionalResponseMixin, viewsets.ModelViewSet
+):
     """view for manage recipe APIs ."""
 
     serializer_class = RecipeDetailSerializer
     queryset = Recipe.objects.all()
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
+    counter_field = "recipes"
     filter_backends = [
         DjangoFilterBackend,
+        FullTextSearchFilter,
         filters.SearchFilter,
-        filters.OrderingFilter,
+        RecipeOrderingFilter,
     ]
-    filterset_fields = ["user"]
-    search_fields = ["title", "tags", "user__name", "link"]
+    filterset_class = RecipeFilter
+    ordering = ["-id"]
+    search_fields = ["title", "tags__name", "user__name", "link"]
 
     def get_queryset(self):
         """Retrieve recipes for authenticated user"""
-        return self.queryset.filter(user=self.request.user).order_by("-id")
+        queryset = self.queryset.filter(user=self.request.user).order_by("-id")
+        if self.action in ["list", "retrieve"]:
+            # Load only the columns the serializer renders and fetch every
+            # page's tags in one extra query instead of one per recipe.
+            fields = [
+                field
+                for field in self.get_serializer_class().Meta.fields
+                if field != "tags"
+            ]
+            if self.action == "list":
+                # RecipeListSerializer renders the rows and fetches the tags.
+                return queryset.values(*fields)
+            queryset = queryset.only(*fields).prefetch_related(
+                Prefetch("tags", queryset=Tag.objects.only("id", "name"))
+            )
+        return queryset
+
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+        if self.action == "list":
+            # The filters are lazy, so this only builds the facets query.
+            queryset = self.filter_queryset(self.get_queryset())
+            facets = get_facets(self.request, queryset)
+            if facets is not None:
+                response.data["facets"] = facets
+        return response
 
     def get_serializer_class(self):
         if self.action == "list":
             return RecipeSerializer
         if self.action == "upload_image":
             return RecipeImageSerializer
+        if self.action == "export":
+            return RecipeExportSerializer
 
         return RecipeDetailSerializer
 
@@ -46,25 +141,238 @@ class RecipeViewSets(viewsets.ModelViewSet):
         serializer.save(user=self.request.user)
 
     @action(
-        methods=["POST"], detail=True, url_name="upload_image", url_path="upload-image"
+        methods=["POST", "PATCH", "DELETE"],
+        detail=False,
+        url_path="batch",
+        url_name="batch",
+        parser_classes=[JSONParser, NDJSONParser],
+    )
+    def batch(self, request):
+        """Create (POST), update (PATCH) or delete (DELETE) many recipes at once"""
+        items = request.data
+        if not isinstance(items, list):
+            return Response(
+                data={"message": "Expected a list of items"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if len(items) > settings.RECIPE_BATCH_MAX_SIZE:
+            return Response(
+                data={
+                    "message": f"At most {settings.RECIPE_BATCH_MAX_SIZE} items "
+                    "are allowed per batch"
+                },
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        if request.method == "DELETE":
+            results = self._batch_delete(items)
+        elif request.method == "PATCH":
+            results = self._batch_update(items)
+        else:
+            results = self._batch_write(items, [None] * len(items))
+
+        return Response(data={"results": results}, status=status.HTTP_200_OK)
+
+    def _batch_serializer(self, items, indexes, instances=None):
+        """Return a list serializer for the items at the given indexes"""
+        return self.get_serializer(
+            [instances[index] for index in indexes] if instances else None,
+            data=[items[index] for index in indexes],
+            many=True,
+            partial=instances is not None,
+        )
+
+    def _batch_write(self, items, results, instances=None):
+        """Validate items with one list serializer and save the valid ones"""
+        pending = [index for index, result in enumerate(results) if result is None]
+        serializer = self._batch_serializer(items, pending, instances)
+        if not serializer.is_valid():
+            for index, errors in zip(pending, serializer.errors):
+                if errors:
+                    results[index] = {
+                        "status": status.HTTP_400_BAD_REQUEST,
+                        "errors": errors,
+                    }
+            pending = [index for index in pending if results[index] is None]
+            serializer = self._batch_serializer(items, pending, instances)
+            serializer.is_valid(raise_exception=True)
+
+        if not pending:
+            return results
+
+        with transaction.atomic():
+            recipes = serializer.save(user=self.request.user)
+
+        reloaded = Recipe.objects.prefetch_related("tags").in_bulk(
+            [recipe.id for recipe in recipes]
+        )
+        data = self.get_serializer(
+            [reloaded[recipe.id] for recipe in recipes], many=True
+        ).data
+        success = status.HTTP_200_OK if instances else status.HTTP_201_CREATED
+        for index, item in zip(pending, data):
+            results[index] = {"status": success, "data": item}
+        return results
+
+    def _batch_update(self, items):
+        """Partially update the authenticated user's recipes by id"""
+        ids = [item.get("id") if isinstance(item, dict) else None for item in items]
+        ids = [pk if is_id(pk) else None for pk in ids]
+        found = self.get_queryset().in_bulk(filter(None, ids))
+        results, seen = [], set()
+        for pk in ids:
+            if pk is None:
+                results.append(invalid_id())
+            elif pk not in found:
+                results.append({"status": status.HTTP_404_NOT_FOUND})
+            elif pk in seen:
+                results.append(
+                    {
+                        "status": status.HTTP_400_BAD_REQUEST,
+                        "errors": {"id": ["Duplicate id."]},
+                    }
+                )
+            else:
+                results.append(None)
+                seen.add(pk)
+        return self._batch_write(items, results, [found.get(pk) for pk in ids])
+
+    def _batch_delete(self, items):
+        """Delete the authenticated user's recipes by id"""
+        ids = [item.get("id") if isinstance(item, dict) else item for item in items]
+        queryset = self.get_queryset().filter(id__in=list(filter(is_id, ids)))
+        found = set(queryset.values_list("id", flat=True))
+        with transaction.atomic():
+            queryset.delete()
+        results, seen = [], set()
+        for pk in ids:
+            if not is_id(pk):
+                results.append(invalid_id(id=pk))
+            elif pk not in found:
+                results.append({"status": status.HTTP_404_NOT_FOUND, "id": pk})
+            elif pk in seen:
+                results.append(
+                    {
+                        "status": status.HTTP_400_BAD_REQUEST,
+                        "id": pk,
+                        "errors": {"id": ["Duplicate id."]},
+                    }
+                )
+            else:
+                results.append({"status": status.HTTP_204_NO_CONTENT, "id": pk})
+                seen.add(pk)
+        return results
+
+    @action(
+        methods=["GET"],
+        detail=False,
+        url_path="export",
+        url_name="export",
+        renderer_classes=[NDJSONRenderer, CSVRenderer, FastJSONRenderer],
+    )
+    def export(self, request):
+        """Stream all of the user's recipes as NDJSON, CSV or a JSON array"""
+        fields = [
+            field for field in RecipeExportSerializer.Meta.fields if field != "tags"
+        ]
+        size = settings.RECIPE_EXPORT_CHUNK_SIZE
+        # A server-side cursor on PostgreSQL; rows are never all in memory.
+        rows = self.filter_queryset(self.get_queryset()).values(*fields)
+        rows = rows.iterator(chunk_size=size)
+        # One serializer for every chunk: serializers form reference cycles,
+        # so a new one per chunk would hold its rows until the next full GC.
+        serializer = self.get_serializer(many=True)
+        recipes = (
+            recipe
+            for chunk in chunked(rows, size)
+            # Renders the chunk and fetches its tags with one query.
+            for recipe in serializer.to_representation(chunk)
+        )
+
+        renderer = request.accepted_renderer
+        response = StreamingHttpResponse(
+            renderer.stream(recipes, size),
+            content_type=f"{renderer.media_type}; charset=utf-8",
+        )
+        response["Content-Disposition"] = (
+            f'attachment; filename="recipes.{renderer.format}"'
+        )
+        return response
+
+    @action(methods=["GET"], detail=False, url_path="suggest", url_name="suggest")
+    def suggest(self, request):
+        """Suggest the user's recipe titles matching ?prefix="""
+        return suggestions(request, Recipe.objects.filter(user=request.user), "title")
+
+    @action(
+        methods=["POST"],
+        detail=True,
+        url_name="upload_image",
+        url_path="upload-image",
+        parser_classes=[StreamingMultiPartParser],
     )
     def upload_image(self, request, pk=None):
         recipe = self.get_object()
         serializer = self.get_serializer(recipe, data=request.data)
 
         if serializer.is_valid():
-            serializer.save()
+            stale = images.variant_names(recipe.image_variants)
+            if recipe.image:
+                stale.append(recipe.image.name)
+            serializer.save(image_status=Recipe.ImageStatus.PENDING, image_variants={})
+            # Variants are rendered in the background; poll the recipe for them.
+            images.schedule(recipe, stale)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
-class TagViewSet(viewsets.ModelViewSet):
+class TagViewSet(ConditionalResponseMixin, viewsets.ModelViewSet):
     """Manage tags in the database"""
 
     serializer_class = TagSerializer
     queryset = Tag.objects.all()
     permission_classes = [IsAuthenticated]
+    counter_field = "tags"
+    filter_backends = [TagOrderingFilter]
+    ordering_fields = ["name", "recipe_count", "id"]
+    ordering = ["name"]
+
+    def get_queryset(self):
+        """Retrieve tags for authenticated user"""
+        queryset = self.queryset.filter(user=self.request.user)
+        if self.action != "list":
+            return queryset
+
+        # One grouped query counts the recipes of every tag on the page.
+        queryset = queryset.values(*TagSerializer.Meta.fields).annotate(
+            recipe_count=Count("recipe")
+        )
+        assigned_only = self.request.query_params.get("assigned_only")
+        if assigned_only in BooleanField.TRUE_VALUES:
+            queryset = queryset.filter(recipe_count__gt=0)
+        return queryset
+
+    def get_serializer_class(self):
+        if self.action == "list":
+            return TagListSerializer
+        return self.serializer_class
 
     def perform_create(self, serializer):
         """Create user"""
-        serializer.save(user=self.request.user)
+        self._save_unique(serializer, user=self.request.user)
+
+    def perform_update(self, serializer):
+        self._save_unique(serializer)
+
+    def _save_unique(self, serializer, **kwargs):
+        """Save the tag, reporting a clash with the user's existing names"""
+        try:
+            with transaction.atomic():
+                serializer.save(**kwargs)
+        except IntegrityError:
+            raise ValidationError({"name": ["You already have a tag with this name."]})
+
+    @action(methods=["GET"], detail=False, url_path="suggest", url_name="suggest")
+    def suggest(self, request):
+        """Suggest the user's tag names matching ?prefix="""
+        return suggestions(request, Tag.objects.filter(user=request.user), "name")
@@ -9,7 +9,12 @@ from http import client
 from urllib import request, response
 
 from webbrowser import get
-from django.test import TestCase
+import importlib.util
+from unittest import skipUnless
+from unittest.mock import patch
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.test import TestCase, override_settings
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 from rest_framework.test import APIClient, APITestCase, force_authenticate
@@ -152,3 +157,126 @@ class PrivateUserApiTest(APITestCase):
         self.user_authenticator()
         response = self.client.delete(url, format="json")
         self.assertNotEquals(response.status_code, status.HTTP_204_NO_CONTENT)
+
+
+LOGIN_URL = reverse("user:users-login_user")
+
+
+@override_settings(
+    LOGIN_THROTTLE_BUCKETS={
+        "ip": {"capacity": 5, "rate": 0.01},
+        "email": {"capacity": 2, "rate": 0.01},
+    }
+)
+class LoginThrottleTests(APITestCase):
+    """Test throttling and hashing of login attempts"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = create_user(email="user@example.com", password="password123")
+
+    def login(self, email="user@example.com", password="password123"):
+        return self.client.post(
+            LOGIN_URL, {"email": email, "password": password}, format="json"
+        )
+
+    def test_failures_throttled_per_email(self):
+        """Test an email is throttled after its failed attempts run out"""
+        self.login(password="wrong")
+        self.login(password="wrong")
+
+        response = self.login()
+
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertIn("Retry-After", response)
+        self.assertEqual(self.login(email="other@example.com").status_code, 401)
+
+    def test_failures_throttled_per_ip(self):
+        """Test a client is throttled after failing with many emails"""
+        for number in range(5):
+            self.login(email=f"user{number}@example.com")
+
+        response = self.login()
+
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_successful_logins_not_throttled(self):
+        """Test valid credentials never drain the buckets"""
+        for _ in range(10):
+            self.assertEqual(self.login().status_code, status.HTTP_200_OK)
+
+    def test_throttled_attempt_not_hashed(self):
+        """Test throttled attempts are rejected before hashing the password"""
+        self.login(password="wrong")
+        self.login(password="wrong")
+
+        with patch("django.contrib.auth.base_user.check_password") as checked:
+            self.login()
+
+        checked.assert_not_called()
+
+    def test_unknown_email_hashes_password(self):
+        """Test unknown emails cost a password hash like wrong passwords do"""
+        with patch(
+            "django.contrib.auth.base_user.make_password", wraps=make_password
+        ) as hashed:
+            response = self.login(email="nobody@example.com")
+
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        hashed.assert_called_once_with("password123")
+
+
+class PasswordHasherTests(APITestCase):
+    """Test configurable password hashing"""
+
+    def setUp(self):
+        cache.clear()
+
+    def test_login_upgrades_hasher(self):
+        """Test a hash from a non-preferred hasher is replaced on login"""
+        with override_settings(
+            PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"]
+        ):
+            user = create_user(email="user@example.com", password="password123")
+        self.assertTrue(user.password.startswith("md5$"))
+
+        with override_settings(
+            PASSWORD_HASHERS=[
+                *settings.PASSWORD_HASHERS,
+                "django.contrib.auth.hashers.MD5PasswordHasher",
+            ]
+        ):
+            self.client.post(
+                LOGIN_URL,
+                {"email": "user@example.com", "password": "password123"},
+                format="json",
+            )
+
+        user.refresh_from_db()
+        self.assertTrue(user.password.startswith("pbkdf2_sha256$"))
+
+    def test_login_applies_tuned_iterations(self):
+        """Test changing the PBKDF2 cost re-hashes on the next login"""
+        user = create_user(email="user@example.com", password="password123")
+
+        with override_settings(PASSWORD_PBKDF2_ITERATIONS=1000):
+            self.client.post(
+                LOGIN_URL,
+                {"email": "user@example.com", "password": "password123"},
+                format="json",
+            )
+
+        user.refresh_from_db()
+        self.assertTrue(user.password.startswith("pbkdf2_sha256$1000$"))
+
+    @skipUnless(importlib.util.find_spec("argon2"), "requires argon2-cffi")
+    @override_settings(
+        PASSWORD_HASHERS=["core.hashers.TunedArgon2PasswordHasher"],
+        PASSWORD_ARGON2={"time_cost": 1, "memory_cost": 1024, "parallelism": 1},
+    )
+    def test_argon2_uses_tuned_costs(self):
+        """Test the Argon2 hasher takes its costs from settings"""
+        user = create_user(email="user@example.com", password="password123")
+
+        self.assertIn("m=1024,t=1,p=1", user.password)
+        self.assertTrue(user.check_password("password123"))
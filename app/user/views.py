@@ -13,7 +13,8 @@ from rest_framework.settings import api_settings
 from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated, AllowAny, IsAdminUser
 from rest_framework.response import Response
-from rest_framework_simplejwt.tokens import RefreshToken
+from core.authentication import tokens_for_user
+from core.throttling import LoginThrottle
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import status, filters, viewsets
 
@@ -53,38 +54,29 @@ class UserViewSet(viewsets.ModelViewSet):
         serializer_class=loginSerializer,
         url_path="login-user",
         url_name="login_user",
+        throttle_classes=[LoginThrottle],
     )
     def login_user(self, request, *args, **kwargs):
         """User login and get the tokenpair of of access-token and refresh token"""
-
-        def get_tokens_for_user(user):
-            refresh = RefreshToken.for_user(user)
-
-            return {
-                "refresh": str(refresh),
-                "access": str(refresh.access_token),
-            }
-
+        password = request.data.get("password", "")
         user = (
-            get_user_model().objects.all().filter(email=request.data["email"]).first()
+            get_user_model()
+            .objects.all()
+            .filter(email=request.data.get("email", ""))
+            .first()
         )
         if not user:
-            return Response(
-                data={"message": "Authentication Failed"},
-                status=status.HTTP_401_UNAUTHORIZED,
-            )
-
-        passwordFlag = user.check_password(request.data["password"])
-
-        if passwordFlag:
-
-            tokens = get_tokens_for_user(user=user)
-            serializer = self.serializer_class(instance=user)
+            # Hash anyway, so unknown emails cost as much as wrong passwords.
+            get_user_model()().set_password(password)
+        elif user.check_password(password):
+            # check_password() re-hashes if the hasher or its costs changed.
+            tokens = tokens_for_user(user)
             return Response(
                 data={"message": "login successful", "token": tokens},
                 status=status.HTTP_200_OK,
             )
 
+        LoginThrottle().failed(request)
         return Response(
             data={"message": "Authentication Failed"},
             status=status.HTTP_401_UNAUTHORIZED,